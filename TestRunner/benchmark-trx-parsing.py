@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+TRX Parsing Micro-Benchmark
+Compares the legacy per-result XPath lookup of UnitTest definitions with the prebuilt testId index
+"""
+
+import os
+import sys
+import time
+import argparse
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import results_model
+from results_model import TRX_NS
+
+# The legacy lookup is quadratic, so it is timed on a sample of results and extrapolated
+LEGACY_SAMPLE_SIZE = 500
+
+def build_synthetic_trx(test_count):
+    """Build an in-memory TRX document with the given number of results and definitions"""
+    lines = [
+        '<?xml version="1.0" encoding="utf-8"?>',
+        '<TestRun id="benchmark" xmlns="http://microsoft.com/schemas/VisualStudio/TeamTest/2010">',
+        '<Times start="2025-10-24T09:56:03.1234567-04:00" finish="2025-10-24T09:58:03.1234567-04:00" />',
+        '<Results>'
+    ]
+    for i in range(test_count):
+        lines.append(
+            f'<UnitTestResult executionId="e{i}" testId="t{i}" '
+            f'testName="VaxCareApiTests.Tests.InventoryApiTests.GetInventory_ShouldReturnInventoryProducts_{i}" '
+            f'duration="00:00:00.1234567" outcome="Passed" />'
+        )
+    lines.append('</Results>')
+    lines.append('<TestDefinitions>')
+    for i in range(test_count):
+        lines.append(f'<UnitTest name="GetInventory_ShouldReturnInventoryProducts_{i}" id="t{i}" />')
+    lines.append('</TestDefinitions>')
+    lines.append('<TestEntries>')
+    for i in range(test_count):
+        lines.append(f'<TestEntry testId="t{i}" executionId="e{i}" />')
+    lines.append('</TestEntries>')
+    lines.append('</TestRun>')
+    return ET.fromstring('\n'.join(lines))
+
+def time_legacy_join(root, results):
+    """Time the legacy root.find per result, extrapolated from a sample"""
+    sample = results[:LEGACY_SAMPLE_SIZE]
+    start = time.perf_counter()
+    for result in sample:
+        root.find(f'.//{TRX_NS}UnitTest[@id="{result.get("testId")}"]')
+    elapsed = time.perf_counter() - start
+    return elapsed * len(results) / len(sample)
+
+def time_indexed_join(root, results):
+    """Time the indexing pass plus one dictionary lookup per result"""
+    start = time.perf_counter()
+    definitions_by_id, test_ids_by_execution = results_model.index_test_definitions(root)
+    for result in results:
+        definitions_by_id.get(results_model.resolve_test_id(result, test_ids_by_execution))
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the TRX result/definition join')
+    parser.add_argument('--sizes', default='1000,10000,50000', help='Comma-separated test counts')
+
+    args = parser.parse_args()
+
+    print("TRX result/definition join benchmark")
+    print(f"(legacy lookup timed on {LEGACY_SAMPLE_SIZE} results and extrapolated)")
+    print("=" * 60)
+    print(f"{'Tests':>8} {'Legacy (s)':>14} {'Indexed (s)':>14} {'Speedup':>12}")
+
+    for size in [int(s) for s in args.sizes.split(',') if s.strip()]:
+        root = build_synthetic_trx(size)
+        results = root.findall(f'.//{TRX_NS}UnitTestResult')
+
+        legacy = time_legacy_join(root, results)
+        indexed = time_indexed_join(root, results)
+        speedup = legacy / indexed if indexed > 0 else float('inf')
+
+        print(f"{size:>8} {legacy:>14.3f} {indexed:>14.4f} {speedup:>11.0f}x")
+
+if __name__ == "__main__":
+    main()
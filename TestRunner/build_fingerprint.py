@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Build Fingerprint Cache
+Lets the test runner skip `dotnet restore` / `dotnet build` when nothing that affects the
+build has changed since the last successful build.
+
+The fingerprint is a hash of every *.cs file, the project file(s), appsettings*.json and the
+optional MSBuild/NuGet config files. It is stored under obj/ (next to the restore output)
+and only counts as current while the built test assembly still exists under bin/.
+"""
+
+import os
+import glob
+import json
+import hashlib
+
+FINGERPRINT_FILE = os.path.join('obj', 'testrunner.build-fingerprint.json')
+
+# Files whose content affects restore or build, relative to the project root
+SOURCE_PATTERNS = ('**/*.cs', '*.csproj', 'appsettings*.json',
+                   'Directory.Build.props', 'Directory.Build.targets', 'NuGet.config', 'global.json')
+RESTORE_PATTERNS = ('*.csproj', 'Directory.Build.props', 'NuGet.config', 'global.json')
+
+# Directories never scanned for sources
+EXCLUDED_DIRS = ('bin', 'obj', 'TestReports', 'TestResults', '.git')
+
+
+def matching_files(project_root, patterns):
+    """Sorted relative paths of the files matching patterns, outside EXCLUDED_DIRS"""
+    files = set()
+    for pattern in patterns:
+        for path in glob.glob(os.path.join(project_root, pattern), recursive=True):
+            relative = os.path.relpath(path, project_root)
+            if relative.split(os.sep, 1)[0] in EXCLUDED_DIRS or not os.path.isfile(path):
+                continue
+            files.add(relative)
+    return sorted(files)
+
+def compute_fingerprint(project_root, patterns=SOURCE_PATTERNS):
+    """Hash of the relative paths and contents of all files matching patterns"""
+    digest = hashlib.sha256()
+    for relative in matching_files(project_root, patterns):
+        digest.update(relative.replace(os.sep, '/').encode('utf-8') + b'\0')
+        with open(os.path.join(project_root, relative), 'rb') as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+def _read_recorded(project_root):
+    try:
+        with open(os.path.join(project_root, FINGERPRINT_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def build_output_exists(project_root):
+    """True when the test assembly of every project file is present under bin/"""
+    projects = glob.glob(os.path.join(project_root, '*.csproj'))
+    if not projects:
+        return False
+    for project in projects:
+        assembly = os.path.splitext(os.path.basename(project))[0] + '.dll'
+        if not glob.glob(os.path.join(project_root, 'bin', '**', assembly), recursive=True):
+            return False
+    return True
+
+def is_build_current(project_root):
+    """True when the last successful build used exactly the current sources"""
+    recorded = _read_recorded(project_root).get('build')
+    return bool(recorded) and recorded == compute_fingerprint(project_root) and build_output_exists(project_root)
+
+def is_restore_current(project_root):
+    """True when packages were restored for the current project files"""
+    recorded = _read_recorded(project_root).get('restore')
+    assets_file = os.path.join(project_root, 'obj', 'project.assets.json')
+    return bool(recorded) and recorded == compute_fingerprint(project_root, RESTORE_PATTERNS) and os.path.exists(assets_file)
+
+def current_fingerprints(project_root):
+    """Build and restore fingerprints of the sources as they are now"""
+    return {
+        'build': compute_fingerprint(project_root),
+        'restore': compute_fingerprint(project_root, RESTORE_PATTERNS),
+    }
+
+def record_build(project_root, fingerprints=None):
+    """Remember the sources of a successful build (which also restores).
+
+    Pass the current_fingerprints taken before the build started, so a file saved while
+    it ran isn't recorded as built.
+    """
+    _write_recorded(project_root, fingerprints or current_fingerprints(project_root))
+
+def record_restore(project_root):
+    recorded = _read_recorded(project_root)
+    recorded['restore'] = compute_fingerprint(project_root, RESTORE_PATTERNS)
+    _write_recorded(project_root, recorded)
+
+def invalidate(project_root):
+    """Forget the recorded build (e.g. after `dotnet clean`); the restore record is kept"""
+    recorded = _read_recorded(project_root)
+    if recorded.pop('build', None) is not None:
+        _write_recorded(project_root, recorded)
+
+def _write_recorded(project_root, recorded):
+    path = os.path.join(project_root, FINGERPRINT_FILE)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_file = f"{path}.{os.getpid()}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(recorded, f, indent=2)
+        os.replace(temp_file, path)
+    except OSError as e:
+        print(f"Warning: Could not write build fingerprint {path}: {e}")
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Streaming Command Runner
+Runs a command and streams its output (stdout and stderr merged, in order) line by line,
+instead of capturing it whole until the process exits.
+
+Every line is passed to the given callbacks as soon as it is written (echo, progress
+counters, failure detection...), optionally written straight to a full log file, and only
+the last lines are kept in memory in a ring buffer for error display. Memory stays flat no
+matter how much a `dotnet test --verbosity normal` run logs.
+"""
+
+import subprocess
+from collections import deque
+
+from pipeline_trace import span
+
+TAIL_LINES = 200
+
+
+class CommandResult:
+    """Exit code plus the tail of the output of a streamed command"""
+
+    def __init__(self, returncode, tail, line_count, log_path=None):
+        self.returncode = returncode
+        self.tail = tail              # last lines of output, newest last
+        self.line_count = line_count
+        self.log_path = log_path
+
+    @property
+    def success(self):
+        return self.returncode == 0
+
+    @property
+    def output(self):
+        return ''.join(self.tail)
+
+    def tail_text(self, lines):
+        return ''.join(self.tail[-lines:]).rstrip('\n')
+
+
+def run_streaming(command, on_line=(), env=None, log_path=None, tail_lines=TAIL_LINES, cwd=None):
+    """Run a shell command, dispatching each output line to the on_line callbacks.
+
+    With log_path the full output is written to that file as it arrives. If a callback
+    raises (or the run is interrupted) the process is killed before the error propagates.
+    """
+    tail = deque(maxlen=tail_lines)
+    line_count = 0
+    log_file = open(log_path, 'w', encoding='utf-8') if log_path else None
+    with span(' '.join(command.split()[:2]), 'subprocess', command=command) as attributes:
+        try:
+            process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                       text=True, encoding='utf-8', errors='replace', bufsize=1, env=env, cwd=cwd)
+            try:
+                with process.stdout:
+                    for line in process.stdout:
+                        line_count += 1
+                        tail.append(line)
+                        if log_file:
+                            log_file.write(line)
+                        for callback in on_line:
+                            callback(line)
+            except BaseException:
+                process.kill()
+                process.wait()
+                raise
+            returncode = process.wait()
+        finally:
+            if log_file:
+                log_file.close()
+        attributes.update(returncode=returncode, lines=line_count)
+    return CommandResult(returncode, list(tail), line_count, log_path)
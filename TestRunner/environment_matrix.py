@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Environment Matrix
+Compares runs of the same suite against several environments (Staging, QA, Production) in
+one side-by-side HTML report: a row per test with its outcome and duration in every
+environment, tests whose outcome differs between environments listed first.
+
+The runs themselves are started by run-all-tests.py --environments, all at the same time,
+each with its own ASPNETCORE_ENVIRONMENT and output directory.
+"""
+
+import os
+from html import escape
+from datetime import datetime
+
+from results_model import STATUS_ICONS, DEFAULT_STATUS_ICON
+
+ENVIRONMENTS = ('Staging', 'QA', 'Production')
+COMPARISON_REPORT_PREFIX = 'EnvironmentComparison'
+NOT_RUN = 'Not run'
+
+
+def parse_environments(value):
+    """Environment names from a comma-separated list (case-insensitive, duplicates dropped)"""
+    known = {name.lower(): name for name in ENVIRONMENTS}
+    environments = []
+    for part in value.split(','):
+        name = part.strip()
+        if not name:
+            continue
+        if name.lower() not in known:
+            raise ValueError(f"Unknown environment '{name}' (choose from {', '.join(ENVIRONMENTS)})")
+        if known[name.lower()] not in environments:
+            environments.append(known[name.lower()])
+    if not environments:
+        raise ValueError("No environment given")
+    return environments
+
+
+class EnvironmentRun:
+    """One environment's part of a matrix run"""
+
+    def __init__(self, environment, output_dir):
+        self.environment = environment
+        self.output_dir = output_dir
+        self.returncode = None
+        self.elapsed = 0.0
+        self.log_path = None
+        self.output_tail = ''
+        self.result_files = []
+        self.summary = None     # parsed RunSummary, None when no results could be read
+        self.preflight = None   # the failed pre-flight result when the run was aborted
+        self.report_path = None
+
+    @property
+    def success(self):
+        return self.preflight is None and self.returncode == 0
+
+    def describe(self):
+        if self.preflight is not None:
+            return f"aborted, {self.preflight.actual_result} [{self.preflight.rule_id}]"
+        if self.summary is None:
+            return f"exit code {self.returncode}, no results, {self.elapsed:.1f}s"
+        return (f"{self.summary.passed_tests} passed, {self.summary.failed_tests} failed, "
+                f"{self.summary.skipped_tests} skipped in {self.elapsed:.1f}s")
+
+
+class ComparisonRow:
+    """A test and its record in every environment (None where it didn't run)"""
+
+    def __init__(self, full_name, records):
+        self.full_name = full_name
+        self.records = records
+
+    @property
+    def outcomes(self):
+        return [record.outcome if record else NOT_RUN for record in self.records.values()]
+
+    @property
+    def differs(self):
+        return len(set(self.outcomes)) > 1
+
+
+def compare_runs(runs):
+    """One ComparisonRow per test seen in any environment: differing tests first, then by name"""
+    tests = {}
+    for run in runs:
+        if run.summary is None:
+            continue
+        for record in run.summary.records:
+            tests.setdefault(record.full_name, {})[run.environment] = record
+
+    rows = [ComparisonRow(full_name, {run.environment: records.get(run.environment) for run in runs})
+            for full_name, records in tests.items()]
+    rows.sort(key=lambda row: (not row.differs, row.full_name))
+    return rows
+
+
+def _outcome_cell(record):
+    if record is None:
+        return f'<td class="status-missing">➖ {NOT_RUN}</td>'
+    icon = STATUS_ICONS.get(record.outcome, DEFAULT_STATUS_ICON)
+    title = f' title="{escape(record.actual_result)}"' if record.actual_result else ''
+    return (f'<td class="status-{record.outcome.lower()}"{title}>{icon} {escape(record.outcome)}'
+            f'<br><span class="duration">{record.duration_ms}ms</span></td>')
+
+def _environment_card(run):
+    if run.preflight is not None:
+        body = f'<div class="stat-number aborted">🚫</div><div class="stat-label">Aborted: {escape(run.preflight.describe())}</div>'
+    elif run.summary is None:
+        body = f'<div class="stat-number aborted">⚠️</div><div class="stat-label">No results (exit code {run.returncode})</div>'
+    else:
+        summary = run.summary
+        body = (f'<div class="stat-number">{summary.success_rate}%</div>'
+                f'<div class="stat-label">✅ {summary.passed_tests} &nbsp; ❌ {summary.failed_tests} &nbsp; '
+                f'⏭️ {summary.skipped_tests} &nbsp; ⏱️ {run.elapsed:.1f}s</div>')
+    return f'<div class="stat-card"><h3>🌍 {escape(run.environment)}</h3>{body}</div>'
+
+def write_comparison_report(runs, output_dir, wall_time=None):
+    """Write the side-by-side HTML report for the runs; returns its path"""
+    rows = compare_runs(runs)
+    differing = sum(1 for row in rows if row.differs)
+    generated = datetime.now()
+    timestamp = generated.strftime('%Y-%m-%d %H:%M:%S')
+    wall_time_text = f" | Wall time: {wall_time:.1f}s" if wall_time is not None else ''
+
+    header_cells = ''.join(f'<th>{escape(run.environment)}</th>' for run in runs)
+    table_rows = []
+    for row in rows:
+        first = next(record for record in row.records.values() if record)
+        cells = ''.join(_outcome_cell(row.records[run.environment]) for run in runs)
+        table_rows.append(f"""
+                <tr class="{'diff-row' if row.differs else ''}">
+                    <td><strong>{escape(first.name)}</strong><div class="class-name">{escape(first.class_name)}</div></td>
+                    {cells}
+                </tr>""")
+
+    html_content = f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>VaxCare API Environment Comparison</title>
+    <style>
+        body {{ font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; margin: 0; padding: 20px; background-color: #f5f5f5; }}
+        .container {{ max-width: 1400px; margin: 0 auto; background: white; border-radius: 8px; box-shadow: 0 2px 10px rgba(0,0,0,0.1); }}
+        .header {{ background: linear-gradient(135deg, #8B5CF6 0%, #A855F7 50%, #EC4899 100%); color: white; padding: 30px; border-radius: 8px 8px 0 0; }}
+        .header h1 {{ margin: 0; font-size: 2.5em; }}
+        .header p {{ margin: 10px 0 0 0; opacity: 0.9; }}
+        .content {{ padding: 30px; }}
+        .stats {{ display: grid; grid-template-columns: repeat(auto-fit, minmax(250px, 1fr)); gap: 20px; margin: 20px 0; }}
+        .stat-card {{ background: #f8f9fa; padding: 20px; border-radius: 8px; text-align: center; border-left: 4px solid #007bff; }}
+        .stat-card h3 {{ margin: 0 0 10px 0; color: #333; }}
+        .stat-card .stat-number {{ font-size: 2em; font-weight: bold; color: #6f42c1; }}
+        .stat-card .stat-number.aborted {{ color: #dc3545; }}
+        .stat-card .stat-label {{ color: #666; }}
+        .test-table {{ width: 100%; border-collapse: collapse; margin: 20px 0; }}
+        .test-table th, .test-table td {{ padding: 12px; text-align: left; border-bottom: 1px solid #ddd; vertical-align: top; }}
+        .test-table th {{ background: #007bff; color: white; font-weight: bold; }}
+        .test-table tbody tr:hover {{ background-color: #f5f5f5; }}
+        .diff-row {{ background-color: #fff3cd; }}
+        .class-name {{ color: #666; font-size: 0.9em; margin-top: 3px; }}
+        .status-passed {{ color: #28a745; font-weight: bold; }}
+        .status-failed {{ color: #dc3545; font-weight: bold; }}
+        .status-skipped, .status-missing {{ color: #6c757d; font-weight: bold; }}
+        .duration {{ font-family: monospace; font-weight: normal; color: #333; background: #f8f9fa; padding: 2px 6px; border-radius: 3px; }}
+        .footer {{ text-align: center; margin-top: 30px; color: #666; }}
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>💉 VaxCare API Environment Comparison</h1>
+            <p>Generated: {timestamp}{wall_time_text}</p>
+            <p>{len(rows)} tests, {differing} with a different outcome across {', '.join(escape(run.environment) for run in runs)}</p>
+        </div>
+        <div class="content">
+            <div class="stats">{''.join(_environment_card(run) for run in runs)}
+            </div>
+
+            <table class="test-table">
+                <thead>
+                    <tr>
+                        <th>Test</th>
+                        {header_cells}
+                    </tr>
+                </thead>
+                <tbody>{''.join(table_rows)}
+                </tbody>
+            </table>
+
+            <div class="footer">
+                <p>Report generated by VaxCare API Test Suite | {timestamp}</p>
+            </div>
+        </div>
+    </div>
+</body>
+</html>"""
+
+    os.makedirs(output_dir, exist_ok=True)
+    report_path = os.path.join(output_dir, f"{COMPARISON_REPORT_PREFIX}_{generated.strftime('%Y-%m-%d_%H-%M-%S')}.html")
+    with open(report_path, 'w', encoding='utf-8') as f:
+        f.write(html_content)
+    return report_path
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Failure Classification Rules
+Maps a failed test's exception message and captured output onto a concise actual result
+and failure reason, using the ordered rules in failure_rules.json.
+
+All rule patterns are compiled into one combined alternation, so each text is scanned in a
+single pass however many rules there are. Patterns should start with literal text so the
+scan can skip straight to candidate positions. The first rule (in file order) whose patterns all
+occur wins. Every classification records the id of the rule that fired, and the classifier
+keeps hit counters across a run.
+
+Set FAILURE_RULES_FILE to use a different rules file.
+"""
+
+import os
+import re
+import json
+from collections import Counter
+
+RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'failure_rules.json')
+RULES_FILE_ENV = 'FAILURE_RULES_FILE'
+
+SOURCE_ERROR = 'error'
+SOURCE_OUTPUT = 'output'
+
+# Rule ids for the built-in fallbacks that are not configurable
+RULE_FIRST_LINE = 'first-line'
+RULE_UNCLASSIFIED = 'unclassified'
+
+GENERIC_ACTUAL_RESULT = "Test execution failed"
+GENERIC_FAILURE_REASON = "Test failed without specific error details"
+
+# Lines skipped when falling back to the first line of the error text
+IGNORED_LINE_PREFIXES = ('Test:', 'Description:')
+MAX_REASON_LENGTH = 100
+
+
+class FailureRule:
+    """A single classification rule; terms are indexes into the classifier's term patterns"""
+
+    __slots__ = ('id', 'terms', 'sources', 'actual_result', 'failure_reason')
+
+    def __init__(self, rule_id, terms, sources, actual_result, failure_reason):
+        self.id = rule_id
+        self.terms = terms
+        self.sources = sources
+        self.actual_result = actual_result
+        self.failure_reason = failure_reason
+
+    def __repr__(self):
+        return f"FailureRule({self.id!r})"
+
+
+class FailureClassifier:
+    """Compiled rule set with per-rule hit counters"""
+
+    def __init__(self, rules):
+        self.rules = []
+        patterns = []
+        term_indexes = {}
+
+        for position, rule in enumerate(rules):
+            rule_id = rule.get('id') or f"rule-{position + 1}"
+            rule_patterns = rule.get('patterns') or []
+            if not rule_patterns:
+                raise ValueError(f"Failure rule '{rule_id}' has no patterns")
+            terms = []
+            for pattern in rule_patterns:
+                try:
+                    re.compile(pattern)
+                except re.error as e:
+                    raise ValueError(f"Failure rule '{rule_id}' has an invalid pattern {pattern!r}: {e}")
+                if pattern not in term_indexes:
+                    term_indexes[pattern] = len(patterns)
+                    patterns.append(pattern)
+                terms.append(term_indexes[pattern])
+            self.rules.append(FailureRule(
+                rule_id,
+                frozenset(terms),
+                frozenset(rule.get('sources') or (SOURCE_ERROR, SOURCE_OUTPUT)),
+                rule.get('actual_result', ''),
+                rule.get('failure_reason', ''),
+            ))
+
+        self.patterns = patterns
+        self.term_patterns = [re.compile(pattern) for pattern in patterns]
+        self._scanners = {}
+
+        # Per source: term index -> positions (in self.rules) of the rules that use it
+        self._rules_by_term = {}
+        for source in (SOURCE_ERROR, SOURCE_OUTPUT):
+            by_term = {}
+            for position, rule in enumerate(self.rules):
+                if source in rule.sources:
+                    for term in rule.terms:
+                        by_term.setdefault(term, []).append(position)
+            self._rules_by_term[source] = by_term
+
+        self.hits = Counter()
+
+    def _scanner(self, terms):
+        """Combined alternation over the given terms, compiled once per term set.
+
+        The alternation is kept plain (no wrapping groups) so sre can skip ahead to the
+        first characters of the terms; the terms that matched are identified at each hit.
+        """
+        scanner = self._scanners.get(terms)
+        if scanner is None:
+            scanner = self._scanners[terms] = re.compile('|'.join(self.patterns[term] for term in terms))
+        return scanner
+
+    def match(self, text, source=SOURCE_ERROR):
+        """Return the highest-priority rule whose patterns all occur in text, or None.
+
+        The text is scanned once, front to back. Terms drop out of the scan as soon as they
+        are found or can no longer lead to a rule outranking the best match so far.
+        """
+        if not text or not self.rules:
+            return None
+
+        rules_by_term = self._rules_by_term[source]
+        pending = tuple(term for term in range(len(self.patterns)) if term in rules_by_term)
+        found = set()
+        best = None
+        offset = 0
+        while pending:
+            hit = self._scanner(pending).search(text, offset)
+            if hit is None:
+                break
+            offset = hit.start()
+            for term in pending:
+                if not self.term_patterns[term].match(text, offset):
+                    continue
+                found.add(term)
+                for position in rules_by_term[term]:
+                    if (best is None or position < best) and self.rules[position].terms <= found:
+                        best = position
+            if best == 0:
+                break  # Nothing can outrank the first rule
+            pending = tuple(term for term in pending
+                            if term not in found and (best is None or rules_by_term[term][0] < best))
+            offset += 1
+        return self.rules[best] if best is not None else None
+
+    def classify(self, error_text, output_text):
+        """Classify a failure; returns (actual_result, failure_reason, rule_id)"""
+        result = None
+
+        # The exception message is the most reliable source of error details
+        if error_text:
+            result = self._classify_text(error_text, SOURCE_ERROR)
+
+        # Fallback to the captured output
+        if result is None and output_text:
+            result = self._classify_text(output_text, SOURCE_OUTPUT)
+
+        # If no specific failure reason found, use generic message
+        if result is None:
+            result = (GENERIC_ACTUAL_RESULT, GENERIC_FAILURE_REASON, RULE_UNCLASSIFIED)
+
+        self.hits[result[2]] += 1
+        return result
+
+    def _classify_text(self, text, source):
+        rule = self.match(text, source)
+        if rule is not None:
+            return rule.actual_result, rule.failure_reason, rule.id
+
+        line = first_meaningful_line(text)
+        if line:
+            reason = line[:MAX_REASON_LENGTH] + "..." if len(line) > MAX_REASON_LENGTH else line
+            return GENERIC_ACTUAL_RESULT, reason, RULE_FIRST_LINE
+        return None
+
+    def reset_hits(self):
+        self.hits.clear()
+
+
+def first_meaningful_line(text):
+    """First non-empty line that is not a Test:/Description: header, without splitting the whole text"""
+    start = 0
+    length = len(text)
+    while start < length:
+        end = text.find('\n', start)
+        if end == -1:
+            end = length
+        line = text[start:end].strip()
+        if line and not line.startswith(IGNORED_LINE_PREFIXES):
+            return line
+        start = end + 1
+    return ''
+
+def rules_path():
+    return os.environ.get(RULES_FILE_ENV) or RULES_FILE
+
+def load_rules(path=None):
+    """Load the ordered rule list from a JSON rules file"""
+    with open(path or rules_path(), 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return data.get('rules', []) if isinstance(data, dict) else data
+
+_classifier = None
+
+def get_classifier():
+    """Shared classifier, compiled on first use"""
+    global _classifier
+    if _classifier is None:
+        _classifier = FailureClassifier(load_rules())
+    return _classifier
+
+def classify_failure(error_text, output_text):
+    """Classify with the shared classifier; returns (actual_result, failure_reason, rule_id)"""
+    return get_classifier().classify(error_text, output_text)
+
+def format_rule_hits(rule_counts):
+    """Lines for printing per-rule hit counts, most frequent first"""
+    return [f"   {rule_id}: {count}" for rule_id, count in sorted(rule_counts.items(), key=lambda item: (-item[1], item[0]))]
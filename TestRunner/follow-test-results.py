@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Live Test Results Follower
+Follows an in-progress test run and keeps a partial JSON summary up to date for dashboards.
+
+Reads the `dotnet test` console output from stdin (echoing it through), or tails a growing
+TRX/xUnit file with --file.
+
+Examples:
+    dotnet test --verbosity normal | python3 TestRunner/follow-test-results.py
+    python3 TestRunner/follow-test-results.py --file TestReports/TestResults.xml --pid 12345
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from results_live import LiveRunTracker, ConsoleResultParser, follow_file, LIVE_SUMMARY_FILE
+
+def safe_print(text):
+    """Safely print text that may contain Unicode characters"""
+    try:
+        print(text, flush=True)
+    except UnicodeEncodeError:
+        # Fallback for Windows Command Prompt
+        print(text.encode('ascii', 'replace').decode('ascii'), flush=True)
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # exists but not ours to signal
+    return True
+
+def follow_stdin(tracker):
+    parser = ConsoleResultParser(tracker.add_record)
+    for line in sys.stdin:
+        sys.stdout.write(line)
+        parser.feed_line(line)
+    parser.flush()
+    tracker.finish()
+
+def follow_growing_file(path, tracker, pid, idle_timeout):
+    """Follow until the writing process exits (--pid) or the file stops growing"""
+    last_size = -1
+    last_change = time.monotonic()
+
+    def is_running():
+        nonlocal last_size, last_change
+        if pid:
+            return process_alive(pid)
+        size = os.path.getsize(path) if os.path.exists(path) else -1
+        if size != last_size:
+            last_size = size
+            last_change = time.monotonic()
+        return time.monotonic() - last_change < idle_timeout
+
+    follow_file(path, tracker, is_running)
+
+def main():
+    parser = argparse.ArgumentParser(description='Follow an in-progress test run and write a live JSON summary')
+    parser.add_argument('--file', help='Growing TRX/xUnit file to follow (default: read console output from stdin)')
+    parser.add_argument('--pid', type=int, help='Stop following --file when this process exits')
+    parser.add_argument('--idle-timeout', type=float, default=30.0, help='Stop following --file after this many seconds without growth (default: 30)')
+    parser.add_argument('--summary', default=os.path.join('TestReports', LIVE_SUMMARY_FILE), help='Live summary JSON path')
+    parser.add_argument('--interval', type=float, default=1.0, help='Minimum seconds between summary rewrites')
+
+    args = parser.parse_args()
+
+    summary_dir = os.path.dirname(args.summary)
+    if summary_dir:
+        os.makedirs(summary_dir, exist_ok=True)
+
+    tracker = LiveRunTracker(args.summary, args.interval, source=args.file or 'console')
+    tracker.write()
+
+    try:
+        if args.file:
+            safe_print(f"📡 Following {args.file} (summary: {args.summary})")
+            follow_growing_file(args.file, tracker, args.pid, args.idle_timeout)
+        else:
+            follow_stdin(tracker)
+    except KeyboardInterrupt:
+        tracker.finish()
+
+    safe_print(f"📊 Live summary: {tracker.progress_line()} -> {args.summary}")
+
+if __name__ == "__main__":
+    main()
@@ -6,317 +6,21 @@ This script parses TRX files and generates comprehensive HTML reports with actua
 
 import os
 import sys
-import xml.etree.ElementTree as ET
 from datetime import datetime
 import argparse
-import re
 
-def parse_trx_file(trx_file):
-    """Parse TRX file and extract test results with actual results and failure reasons"""
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from results_merge import expand_result_paths, load_merged_results
+from failure_rules import format_rule_hits
+from pipeline_trace import finish_trace
+
+def parse_trx_file(trx_file, stream=False, use_cache=True):
+    """Parse TRX file(s) and extract test results with actual results and failure reasons.
+
+    trx_file may be a path, a glob or a list of them; several files are merged into one run.
+    """
     try:
-        tree = ET.parse(trx_file)
-        root = tree.getroot()
-        
-        # Extract test results
-        test_results = []
-        total_tests = 0
-        passed_tests = 0
-        failed_tests = 0
-        skipped_tests = 0
-        
-        # Find all UnitTestResult elements
-        for result in root.findall('.//{http://microsoft.com/schemas/VisualStudio/TeamTest/2010}UnitTestResult'):
-            total_tests += 1
-            
-            test_name = result.get('testName', 'Unknown Test')
-            outcome = result.get('outcome', 'Unknown')
-            duration = result.get('duration', '0')
-            start_time = result.get('startTime', '')
-            
-            # Extract class name from test name
-            if '.' in test_name:
-                class_parts = test_name.split('.')
-                class_name = class_parts[-2] if len(class_parts) > 1 else 'Unknown'
-                display_name = class_parts[-1].replace('_', ' ')
-            else:
-                class_name = 'Unknown'
-                display_name = test_name.replace('_', ' ')
-            
-            # Parse duration
-            try:
-                # Convert duration from format like "00:00:00.1234567" to milliseconds
-                if ':' in duration:
-                    parts = duration.split(':')
-                    hours = float(parts[0])
-                    minutes = float(parts[1])
-                    seconds = float(parts[2])
-                    duration_ms = (hours * 3600 + minutes * 60 + seconds) * 1000
-                else:
-                    duration_ms = float(duration) * 1000
-            except:
-                duration_ms = 0
-            
-            # Count results (exclude skipped tests)
-            if outcome == 'Passed':
-                passed_tests += 1
-            elif outcome == 'Failed':
-                failed_tests += 1
-            elif outcome == 'Skipped':
-                skipped_tests += 1
-                # Skip adding to test_results - exclude from report
-                continue
-            
-            # Extract actual result and failure reason for failed tests
-            actual_result = ""
-            failure_reason = ""
-            
-            if outcome == 'Failed':
-                # Look for Output/ErrorInfo first (most reliable for error details)
-                output_elem = result.find('.//{http://microsoft.com/schemas/VisualStudio/TeamTest/2010}Output')
-                if output_elem is not None:
-                    # Try ErrorInfo first (contains the actual exception message)
-                    error_info_elem = output_elem.find('.//{http://microsoft.com/schemas/VisualStudio/TeamTest/2010}ErrorInfo')
-                    if error_info_elem is not None:
-                        message_elem = error_info_elem.find('.//{http://microsoft.com/schemas/VisualStudio/TeamTest/2010}Message')
-                        if message_elem is not None and message_elem.text:
-                            error_text = message_elem.text
-                            
-                            # Look for common failure patterns in error message
-                            if 'InvalidOperationException' in error_text and 'Network connectivity required' in error_text:
-                                actual_result = "Network connectivity issue"
-                                failure_reason = "POST operations require network connectivity - API endpoint not reachable"
-                            elif 'HttpRequestException' in error_text:
-                                if 'nodename nor servname provided' in error_text:
-                                    actual_result = "Network connectivity issue"
-                                    failure_reason = "API endpoint not reachable - DNS resolution failed"
-                                elif 'Name or service not known' in error_text:
-                                    actual_result = "Network connectivity issue"
-                                    failure_reason = "API endpoint not reachable - hostname not found"
-                                else:
-                                    actual_result = "HTTP request failed"
-                                    failure_reason = "Network connectivity issue"
-                            elif 'TaskCanceledException' in error_text:
-                                actual_result = "Request timeout"
-                                failure_reason = "API endpoint timeout - server not responding"
-                            elif 'TimeoutException' in error_text:
-                                actual_result = "Request timeout"
-                                failure_reason = "Request timed out"
-                            elif 'Assertion' in error_text:
-                                actual_result = "Assertion failed"
-                                failure_reason = "Test assertion did not pass"
-                            else:
-                                # Extract first line of meaningful error
-                                lines = error_text.split('\n')
-                                for line in lines:
-                                    line = line.strip()
-                                    if line and not line.startswith('Test:') and not line.startswith('Description:'):
-                                        actual_result = "Test execution failed"
-                                        failure_reason = line[:100] + "..." if len(line) > 100 else line
-                                        break
-                    
-                    # Fallback to StdOut if ErrorInfo not found
-                    if not actual_result:
-                        stdout_elem = output_elem.find('.//{http://microsoft.com/schemas/VisualStudio/TeamTest/2010}StdOut')
-                        if stdout_elem is not None and stdout_elem.text:
-                            # Extract concise failure reason from output
-                            output_text = stdout_elem.text
-                            
-                            # Look for common failure patterns
-                            if 'HttpRequestException' in output_text:
-                                if 'nodename nor servname provided' in output_text:
-                                    actual_result = "Network connectivity issue"
-                                    failure_reason = "API endpoint not reachable - DNS resolution failed"
-                                elif 'Name or service not known' in output_text:
-                                    actual_result = "Network connectivity issue"
-                                    failure_reason = "API endpoint not reachable - hostname not found"
-                                else:
-                                    actual_result = "HTTP request failed"
-                                    failure_reason = "Network connectivity issue"
-                            elif 'TaskCanceledException' in output_text:
-                                actual_result = "Request timeout"
-                                failure_reason = "API endpoint timeout - server not responding"
-                            elif 'TimeoutException' in output_text:
-                                actual_result = "Request timeout"
-                                failure_reason = "Request timed out"
-                            elif 'Assertion' in output_text:
-                                actual_result = "Assertion failed"
-                                failure_reason = "Test assertion did not pass"
-                            else:
-                                # Extract first line of meaningful error
-                                lines = output_text.split('\n')
-                                for line in lines:
-                                    line = line.strip()
-                                    if line and not line.startswith('Test:') and not line.startswith('Description:'):
-                                        actual_result = "Test execution failed"
-                                        failure_reason = line[:100] + "..." if len(line) > 100 else line
-                                        break
-                
-                # If no specific failure reason found, use generic message
-                if not actual_result:
-                    actual_result = "Test execution failed"
-                    failure_reason = "Test failed without specific error details"
-            
-            # Get test info from the test definition
-            test_def = root.find(f'.//{{http://microsoft.com/schemas/VisualStudio/TeamTest/2010}}UnitTest[@id="{result.get("testId")}"]')
-            description = ""
-            test_type = ""
-            endpoint = ""
-            expected_result = ""
-            
-            if test_def is not None:
-                # Try to extract description from test method name or comments
-                method_name = test_def.get('name', '')
-                
-                # Generate more accurate expected results based on test name patterns
-                if 'ShouldValidate' in method_name:
-                    if 'RequiredHeaders' in method_name:
-                        expected_result = "All required headers validated successfully"
-                    elif 'EndpointStructure' in method_name:
-                        expected_result = "Endpoint structure and format validated"
-                    elif 'DateFormats' in method_name:
-                        expected_result = "Date parameter formats validated"
-                    elif 'VersionFormats' in method_name:
-                        expected_result = "Version parameter formats validated"
-                    elif 'ClinicIdFormats' in method_name:
-                        expected_result = "Clinic ID parameter formats validated"
-                    elif 'QueryParameters' in method_name:
-                        expected_result = "Query parameters validated successfully"
-                    elif 'CurlCommandStructure' in method_name:
-                        expected_result = "Curl command structure validated"
-                    elif 'AuthenticationHeaders' in method_name:
-                        expected_result = "Authentication headers handled correctly"
-                    else:
-                        expected_result = "Validation passed successfully"
-                elif 'ShouldReturn' in method_name:
-                    if 'InventoryProducts' in method_name:
-                        expected_result = "200 OK with inventory products data"
-                    elif 'LotNumbersData' in method_name:
-                        expected_result = "200 OK with lot numbers data"
-                    elif 'LotInventoryData' in method_name:
-                        expected_result = "200 OK with lot inventory data"
-                    elif 'ClinicData' in method_name:
-                        expected_result = "200 OK with clinic data"
-                    elif 'InsuranceData' in method_name:
-                        expected_result = "200 OK with insurance data"
-                    elif 'ProvidersData' in method_name:
-                        expected_result = "200 OK with providers data"
-                    elif 'ShotAdministratorsData' in method_name:
-                        expected_result = "200 OK with shot administrators data"
-                    elif 'UsersPartnerLevelData' in method_name:
-                        expected_result = "200 OK with users partner level data"
-                    elif 'LocationData' in method_name:
-                        expected_result = "200 OK with location data"
-                    elif 'CheckData' in method_name:
-                        expected_result = "200 OK with check data response"
-                    elif 'AppointmentData' in method_name:
-                        expected_result = "200 OK with appointment data"
-                    elif 'AppointmentId' in method_name:
-                        expected_result = "200 OK with appointment ID returned"
-                    else:
-                        expected_result = "200 OK with data returned"
-                elif 'ShouldHandle' in method_name:
-                    if 'UniquePatientNames' in method_name:
-                        expected_result = "200 OK with unique patient appointment created"
-                    elif 'InvalidAppointmentId' in method_name:
-                        expected_result = "400 Bad Request or appropriate error for invalid appointment ID"
-                    else:
-                        expected_result = "Proper handling of scenario"
-                elif 'ShouldDemonstrate' in method_name:
-                    if 'ResponseLogging' in method_name:
-                        expected_result = "Response logging demonstrated successfully"
-                    else:
-                        expected_result = "Demonstration completed successfully"
-                else:
-                    expected_result = "Test execution completed successfully"
-                
-                # Extract endpoint from test name patterns
-                if 'Inventory' in class_name:
-                    endpoint = "GET /api/inventory"
-                elif 'Appointment' in class_name:
-                    if 'Create' in method_name:
-                        endpoint = "POST /api/patients/appointment"
-                    elif 'Sync' in method_name:
-                        endpoint = "GET /api/patients/appointment/sync"
-                    elif 'Checkout' in method_name:
-                        endpoint = "PUT /api/patients/appointment/{id}/checkout"
-                elif 'Clinic' in class_name:
-                    endpoint = "GET /api/patients/clinic"
-                elif 'Insurance' in class_name:
-                    endpoint = "GET /api/patients/insurance"
-                elif 'Staffer' in class_name:
-                    endpoint = "GET /api/patients/staffer"
-                elif 'Setup' in class_name:
-                    endpoint = "GET /api/setup"
-            
-            test_results.append({
-                'name': display_name,
-                'full_name': test_name,
-                'class': class_name,
-                'result': outcome,
-                'duration': duration_ms,
-                'duration_ms': round(duration_ms, 2),
-                'status_icon': '&#10004;' if outcome == 'Passed' else '&#10008;' if outcome == 'Failed' else '&#9193;',
-                'description': description,
-                'test_type': test_type,
-                'endpoint': endpoint,
-                'expected_result': expected_result,
-                'actual_result': actual_result,
-                'failure_reason': failure_reason
-            })
-        
-        # Calculate success rate (excluding skipped tests from denominator)
-        executed_tests = passed_tests + failed_tests
-        success_rate = round((passed_tests / executed_tests) * 100, 1) if executed_tests > 0 else 0
-        
-        # Calculate total runtime from overall test run times
-        total_runtime_seconds = 0
-        try:
-            # Get the overall test run start and finish times from the Times element
-            times_elem = root.find('.//{http://microsoft.com/schemas/VisualStudio/TeamTest/2010}Times')
-            if times_elem is not None:
-                start_attr = times_elem.get('start')
-                finish_attr = times_elem.get('finish')
-                if start_attr and finish_attr:
-                    # Fix datetime format by limiting microseconds precision
-                    start_clean = start_attr[:26] + start_attr[-6:]  # Keep only 6 decimal places
-                    finish_clean = finish_attr[:26] + finish_attr[-6:]  # Keep only 6 decimal places
-                    start_dt = datetime.fromisoformat(start_clean)
-                    finish_dt = datetime.fromisoformat(finish_clean)
-                    total_runtime_seconds = (finish_dt - start_dt).total_seconds()
-        except Exception as e:
-            # Fallback to individual test times if overall times not available
-            if test_results:
-                start_times = []
-                end_times = []
-                for test in test_results:
-                    if test.get('start_time'):
-                        try:
-                            start_dt = datetime.fromisoformat(test['start_time'].replace('Z', '+00:00'))
-                            start_times.append(start_dt)
-                        except:
-                            pass
-                    if test.get('end_time'):
-                        try:
-                            end_dt = datetime.fromisoformat(test['end_time'].replace('Z', '+00:00'))
-                            end_times.append(end_dt)
-                        except:
-                            pass
-                
-                if start_times and end_times:
-                    earliest_start = min(start_times)
-                    latest_end = max(end_times)
-                    total_runtime_seconds = (latest_end - earliest_start).total_seconds()
-        
-        return {
-            'total_tests': total_tests,
-            'passed_tests': passed_tests,
-            'failed_tests': failed_tests,
-            'skipped_tests': skipped_tests,
-            'success_rate': success_rate,
-            'total_runtime_seconds': total_runtime_seconds,
-            'test_details': test_results
-        }
-        
+        return load_merged_results(trx_file, use_cache=use_cache, stream=stream)
     except Exception as e:
         print(f"Error parsing TRX file: {e}")
         sys.exit(1)
@@ -379,23 +83,23 @@ def generate_html_report(data, output_path, environment="Staging"):
         
         <div class="stats">
             <div class="stat-card passed">
-                <div class="stat-number">{data['passed_tests']}</div>
+                <div class="stat-number">{data.passed_tests}</div>
                 <div class="stat-label">✅ Passed</div>
             </div>
             <div class="stat-card failed">
-                <div class="stat-number">{data['failed_tests']}</div>
+                <div class="stat-number">{data.failed_tests}</div>
                 <div class="stat-label">❌ Failed</div>
             </div>
             <div class="stat-card total">
-                <div class="stat-number">{data['total_tests']}</div>
+                <div class="stat-number">{data.total_tests}</div>
                 <div class="stat-label">📊 Total</div>
             </div>
             <div class="stat-card success-rate">
-                <div class="stat-number">{data['success_rate']}%</div>
+                <div class="stat-number">{data.success_rate}%</div>
                 <div class="stat-label">🎯 Success Rate</div>
             </div>
             <div class="stat-card">
-                <div class="stat-number">{data['total_runtime_seconds']:.1f}s</div>
+                <div class="stat-number">{data.total_runtime_seconds:.1f}s</div>
                 <div class="stat-label">⏱️ Total Runtime</div>
             </div>
         </div>
@@ -412,39 +116,39 @@ def generate_html_report(data, output_path, environment="Staging"):
             <tbody>"""
     
     # Add test details to table
-    for test in data['test_details']:
-        status_class = f"status-{test['result'].lower()}" if test['result'] in ['Passed', 'Failed', 'Skipped'] else 'status-unknown'
-        row_class = "failed-test-row" if test['result'] == 'Failed' else ""
+    for test in data.reported_tests:
+        status_class = f"status-{test.outcome.lower()}" if test.outcome in ['Passed', 'Failed', 'Skipped'] else 'status-unknown'
+        row_class = "failed-test-row" if test.outcome == 'Failed' else ""
         
         # Add test information if available
         test_info_html = ""
-        if test.get('description') or test.get('endpoint') or test.get('expected_result'):
+        if test.description or test.endpoint or test.expected_result:
             test_info_html = f"""
                 <div class="test-info">
-                    {f"<div><strong>📋 Description:</strong> {test['description']}</div>" if test.get('description') else ""}
-                    {f"<div><strong>🔗 Endpoint:</strong> {test['endpoint']}</div>" if test.get('endpoint') else ""}
-                    {f"<div><strong>📊 Expected Result:</strong> {test['expected_result']}</div>" if test.get('expected_result') else ""}
+                    {f"<div><strong>📋 Description:</strong> {test.description}</div>" if test.description else ""}
+                    {f"<div><strong>🔗 Endpoint:</strong> {test.endpoint}</div>" if test.endpoint else ""}
+                    {f"<div><strong>📊 Expected Result:</strong> {test.expected_result}</div>" if test.expected_result else ""}
                 </div>"""
         
         # Add failure information for failed tests
         failure_info_html = ""
-        if test['result'] == 'Failed' and (test.get('actual_result') or test.get('failure_reason')):
+        if test.outcome == 'Failed' and (test.actual_result or test.failure_reason):
             failure_info_html = f"""
                 <div class="failure-info">
-                    {f"<div class='actual-result'><strong>❌ Actual Result:</strong> {test['actual_result']}</div>" if test.get('actual_result') else ""}
-                    {f"<div class='failure-reason'><strong>🔍 Failure Reason:</strong> {test['failure_reason']}</div>" if test.get('failure_reason') else ""}
+                    {f"<div class='actual-result'><strong>❌ Actual Result:</strong> {test.actual_result}</div>" if test.actual_result else ""}
+                    {f"<div class='failure-reason'><strong>🔍 Failure Reason:</strong> {test.failure_reason}</div>" if test.failure_reason else ""}
                 </div>"""
         
         html_content += f"""
                 <tr class="{row_class}">
-                    <td class="{status_class}">{test['status_icon']} {test['result']}</td>
+                    <td class="{status_class}">{test.status_icon} {test.outcome}</td>
                     <td>
-                        <div><strong>{test['name']}</strong></div>
+                        <div><strong>{test.name}</strong></div>
                         {test_info_html}
                         {failure_info_html}
                     </td>
-                    <td>{test['class']}</td>
-                    <td><span class="duration">{test['duration_ms']}ms</span></td>
+                    <td>{test.class_name}</td>
+                    <td><span class="duration">{test.duration_ms}ms</span></td>
                 </tr>"""
     
     html_content += f"""
@@ -476,41 +180,53 @@ def safe_print(text):
         # Fallback for Windows Command Prompt
         print(text.encode('ascii', 'replace').decode('ascii'))
 
+def generate_report(data, output_dir, environment="Staging"):
+    """Write the HTML report for already-parsed results into output_dir; returns its path, or None on failure"""
+    os.makedirs(output_dir, exist_ok=True)
+    timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+    html_report_path = os.path.join(output_dir, f'EnhancedTestReport_WithActualResults_{timestamp}.html')
+    return html_report_path if generate_html_report(data, html_report_path, environment) else None
+
 def main():
     parser = argparse.ArgumentParser(description='Generate enhanced HTML test report with actual results')
-    parser.add_argument('--trx', default='TestResults/TestResults_2025-10-24_09-56-03.trx', help='TRX file path')
+    parser.add_argument('--trx', nargs='+', default=['TestResults/TestResults_2025-10-24_09-56-03.trx'], help='TRX file path(s) or glob; several files are merged into one report')
     parser.add_argument('--output', default='TestReports', help='Output directory')
     parser.add_argument('--environment', default='Staging', help='Test environment (Staging, QA, Production)')
+    parser.add_argument('--stream', action='store_true', help='Parse the TRX file incrementally to keep memory bounded on very large files')
+    parser.add_argument('--no-cache', action='store_true', help='Ignore and do not write the parsed results cache')
     
     args = parser.parse_args()
     
-    # Create output directory if it doesn't exist
-    os.makedirs(args.output, exist_ok=True)
-    
-    timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
-    html_report_path = os.path.join(args.output, f'EnhancedTestReport_WithActualResults_{timestamp}.html')
-    
     safe_print("Generating enhanced HTML report with actual results...")
     
     # Check if TRX file exists
-    if not os.path.exists(args.trx):
-        safe_print(f"ERROR: TRX file not found: {args.trx}")
+    trx_files = expand_result_paths(args.trx)
+    if not trx_files:
+        safe_print(f"ERROR: TRX file not found: {' '.join(args.trx)}")
         sys.exit(1)
     
     # Parse TRX and extract data
-    data = parse_trx_file(args.trx)
+    data = parse_trx_file(trx_files, stream=args.stream, use_cache=not args.no_cache)
+    if data.merged_from:
+        safe_print(f"Merged {len(data.merged_from)} result files ({data.duplicates_dropped} retried results replaced by a later attempt)")
     
     # Print statistics
     safe_print("Test Statistics:")
-    safe_print(f"   Total Tests: {data['total_tests']}")
-    safe_print(f"   Passed: {data['passed_tests']}")
-    safe_print(f"   Failed: {data['failed_tests']}")
-    safe_print(f"   Skipped: {data['skipped_tests']}")
-    safe_print(f"   Success Rate: {data['success_rate']}%")
-    safe_print(f"   Total Runtime: {data['total_runtime_seconds']:.1f} seconds")
+    safe_print(f"   Total Tests: {data.total_tests}")
+    safe_print(f"   Passed: {data.passed_tests}")
+    safe_print(f"   Failed: {data.failed_tests}")
+    safe_print(f"   Skipped: {data.skipped_tests}")
+    safe_print(f"   Success Rate: {data.success_rate}%")
+    safe_print(f"   Total Runtime: {data.total_runtime_seconds:.1f} seconds")
+    if data.failure_rule_counts:
+        safe_print("Failure Classification (rule: hits):")
+        for line in format_rule_hits(data.failure_rule_counts):
+            safe_print(line)
     
     # Generate HTML report
-    if generate_html_report(data, html_report_path, args.environment):
+    success = generate_report(data, args.output, args.environment)
+    finish_trace(args.output, 'generate-enhanced-html-report-with-actual-results', log=safe_print)
+    if success:
         safe_print("SUCCESS: Enhanced HTML report with actual results generation completed!")
     else:
         sys.exit(1)
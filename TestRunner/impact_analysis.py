@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Test Impact Analysis
+Maps the files changed since a git ref to the test classes they can affect, so a run can be
+limited to those classes.
+
+  - a changed file under Tests/ selects the test classes it declares
+  - a changed type (class/record/interface/enum/struct in any .cs file) selects every file that
+    references it by name, transitively, and the test classes declared there
+  - a changed .cs file that declares no types selects the files `using` its namespace
+  - project-wide inputs (csproj, appsettings, MSBuild/NuGet config) select every test;
+    files outside the C# sources (TestRunner/, docs...) select none
+
+Per-file declarations and references are kept in a cached dependency index under obj/ and
+re-scanned only for files whose size or mtime changed.
+"""
+
+import os
+import re
+import json
+import fnmatch
+import subprocess
+
+from build_fingerprint import matching_files
+from shard_planner import tests_in_source, NAMESPACE_DECLARATION
+
+INDEX_FILE = os.path.join('obj', 'testrunner.dependency-index.json')
+INDEX_VERSION = 1
+
+# Project-root files whose change can affect every test
+GLOBAL_INPUTS = ('*.csproj', 'appsettings*.json', 'Directory.Build.props', 'Directory.Build.targets',
+                 'NuGet.config', 'global.json')
+
+TYPE_DECLARATION = re.compile(r'\b(?:class|record|interface|enum|struct)\s+([A-Za-z_]\w*)')
+TYPE_REFERENCE = re.compile(r'\b[A-Z]\w*')
+USING_DIRECTIVE = re.compile(r'^\s*(?:global\s+)?using\s+(?:static\s+)?([\w.]+)\s*;', re.M)
+
+
+def analyze_source(source):
+    """Index entry for one C# file: declared types, referenced type names, usings, test classes"""
+    namespace_match = NAMESPACE_DECLARATION.search(source)
+    types = sorted(set(TYPE_DECLARATION.findall(source)))
+    return {
+        'namespace': namespace_match.group(1) if namespace_match else '',
+        'types': types,
+        'references': sorted(set(TYPE_REFERENCE.findall(source)) - set(types)),
+        'usings': sorted(set(USING_DIRECTIVE.findall(source))),
+        'test_classes': sorted(tests_in_source(source)),
+    }
+
+def _read_index(project_root):
+    try:
+        with open(os.path.join(project_root, INDEX_FILE), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return index.get('files', {}) if index.get('version') == INDEX_VERSION else {}
+
+def _write_index(project_root, entries):
+    path = os.path.join(project_root, INDEX_FILE)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_file = f"{path}.{os.getpid()}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump({'version': INDEX_VERSION, 'files': entries}, f)
+        os.replace(temp_file, path)
+    except OSError as e:
+        print(f"Warning: Could not write dependency index {path}: {e}")
+
+def load_dependency_index(project_root):
+    """Index entries for every .cs file under project_root, re-scanning only changed files.
+
+    Returns (entries by relative path, number of files re-scanned).
+    """
+    cached = _read_index(project_root)
+    entries = {}
+    rescanned = 0
+    for relative in matching_files(project_root, ('**/*.cs',)):
+        path = os.path.join(project_root, relative)
+        stat = os.stat(path)
+        entry = cached.get(relative)
+        if entry is None or entry.get('size') != stat.st_size or entry.get('mtime') != stat.st_mtime_ns:
+            with open(path, 'r', encoding='utf-8-sig', errors='replace') as f:
+                entry = analyze_source(f.read())
+            entry['size'] = stat.st_size
+            entry['mtime'] = stat.st_mtime_ns
+            rescanned += 1
+        entries[relative] = entry
+
+    if rescanned or len(entries) != len(cached):
+        _write_index(project_root, entries)
+    return entries, rescanned
+
+def _git(project_root, *args):
+    process = subprocess.run(['git', *args], cwd=project_root, capture_output=True, text=True)
+    if process.returncode != 0:
+        raise RuntimeError(f"git {' '.join(args)} failed: {process.stderr.strip()}")
+    return process.stdout
+
+def resolve_base(project_root, ref):
+    """The commit to diff against: where HEAD branched off ref (or ref itself)"""
+    try:
+        return _git(project_root, 'merge-base', ref, 'HEAD').strip()
+    except RuntimeError:
+        return _git(project_root, 'rev-parse', '--verify', ref).strip()
+
+def changed_files(project_root, base):
+    """Project-relative paths changed since base: committed, staged, unstaged and untracked"""
+    top = _git(project_root, 'rev-parse', '--show-toplevel').strip()
+    paths = _git(project_root, 'diff', '--name-only', '--no-renames', base).splitlines()
+    untracked = _git(project_root, 'ls-files', '--others', '--exclude-standard', '--full-name').splitlines()
+
+    changed = []
+    for path in paths + untracked:
+        relative = os.path.relpath(os.path.join(top, path), project_root)
+        if not relative.startswith('..') and relative not in changed:
+            changed.append(relative)
+    return changed
+
+def _source_at(project_root, base, relative):
+    """Content of a file (deleted since) at base, or None"""
+    try:
+        prefix = _git(project_root, 'rev-parse', '--show-prefix').strip()
+        return _git(project_root, 'show', f"{base}:{prefix}{relative.replace(os.sep, '/')}")
+    except RuntimeError:
+        return None
+
+def is_global_input(relative):
+    return os.sep not in relative and any(fnmatch.fnmatch(relative, pattern) for pattern in GLOBAL_INPUTS)
+
+def affected_test_classes(project_root, changed, entries, base=None):
+    """Fully qualified test classes affected by the changed files, or None when a project-wide
+    input changed (run everything)"""
+    classes = set()
+    dirty_types = set()
+    dirty_namespaces = set()
+    for relative in changed:
+        if is_global_input(relative):
+            return None
+        if not relative.endswith('.cs'):
+            continue
+        entry = entries.get(relative)
+        if entry is None:
+            # Deleted since base: what it declared back then still matters to its dependents
+            source = _source_at(project_root, base, relative) if base else None
+            if source is None:
+                continue
+            entry = analyze_source(source)
+        classes.update(entry['test_classes'])
+        if entry['types']:
+            dirty_types.update(entry['types'])
+        elif entry['namespace']:
+            dirty_namespaces.add(entry['namespace'])
+
+    # Follow references until no new types are reached
+    reached = set()
+    seen_types = set()
+    while dirty_types or dirty_namespaces:
+        seen_types.update(dirty_types)
+        new_types = set()
+        for relative, entry in entries.items():
+            if relative in reached:
+                continue
+            if dirty_types.intersection(entry['references']) or dirty_namespaces.intersection(entry['usings']):
+                reached.add(relative)
+                classes.update(entry['test_classes'])
+                new_types.update(entry['types'])
+        dirty_types = new_types - seen_types
+        dirty_namespaces = set()
+    return classes
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Expected Result and Endpoint Inference
+Fills in the expected result and endpoint of tests without a TestInfo.json entry, from the
+declarative table in inference_rules.json.
+
+The table is compiled once into ordered (conditions, value) entries and every answer is
+memoized per (method, class), so each test name is inferred once per process no matter how
+many results, files or generators ask for it.
+
+Set INFERENCE_RULES_FILE to use a different table.
+"""
+
+import os
+import json
+from functools import lru_cache
+
+RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'inference_rules.json')
+RULES_FILE_ENV = 'INFERENCE_RULES_FILE'
+
+# Condition keys in the table, mapped to the argument they are matched against
+CONDITION_FIELDS = ('method', 'class')
+
+
+def _conditions(entry):
+    """(field, substring) pairs an entry requires"""
+    return tuple((field, entry[field]) for field in CONDITION_FIELDS if entry.get(field))
+
+def compile_entries(groups):
+    """Flatten groups into ordered (conditions, value) entries.
+
+    A group that matches always answers (with its default when no case matches), so its
+    default is emitted right after its cases and later groups are never reached.
+    """
+    entries = []
+    for group in groups:
+        group_conditions = _conditions(group)
+        for case in group.get('cases', []):
+            entries.append((group_conditions + _conditions(case), case.get('value', '')))
+        entries.append((group_conditions, group.get('default', '')))
+    return tuple(entries)
+
+def _lookup(entries, default, method_name, class_name):
+    values = {'method': method_name, 'class': class_name}
+    for conditions, value in entries:
+        if all(substring in values[field] for field, substring in conditions):
+            return value
+    return default
+
+
+class InferenceTable:
+    """Compiled expected-result and endpoint tables"""
+
+    def __init__(self, data):
+        self.expected_results = compile_entries(data.get('expected_results', []))
+        self.default_expected_result = data.get('default_expected_result', '')
+        self.endpoints = compile_entries(data.get('endpoints', []))
+        self.default_endpoint = data.get('default_endpoint', '')
+
+    def infer(self, method_name, class_name):
+        """Return (expected_result, endpoint) for a test"""
+        return (
+            _lookup(self.expected_results, self.default_expected_result, method_name, class_name),
+            _lookup(self.endpoints, self.default_endpoint, method_name, class_name),
+        )
+
+
+def rules_path():
+    return os.environ.get(RULES_FILE_ENV) or RULES_FILE
+
+def load_table(path=None):
+    """Load and compile the inference table"""
+    with open(path or rules_path(), 'r', encoding='utf-8') as f:
+        return InferenceTable(json.load(f))
+
+_table = None
+
+def get_table():
+    """Shared table, compiled on first use"""
+    global _table
+    if _table is None:
+        _table = load_table()
+    return _table
+
+@lru_cache(maxsize=None)
+def infer_test_info(method_name, class_name):
+    """Memoized (expected_result, endpoint) for a test method and class"""
+    return get_table().infer(method_name or '', class_name or '')
@@ -6,11 +6,14 @@ This script finds and opens the most recent HTML test report
 
 import os
 import sys
-import glob
 import webbrowser
 import argparse
 from datetime import datetime
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from report_manifest import ReportManifest, HTML_ARTIFACTS, ARTIFACT_COMPARISON
+from run_directory import latest_run_dir
+
 def safe_print(text):
     """Safely print text that may contain Unicode characters"""
     try:
@@ -22,24 +25,17 @@ def safe_print(text):
 def find_latest_html_report(reports_dir="TestReports"):
     """Find the most recent HTML report in the specified directory"""
     try:
-        # Look for EnhancedTestReport files
-        pattern = os.path.join(reports_dir, "**", "EnhancedTestReport*.html")
-        html_files = glob.glob(pattern, recursive=True)
-        
-        if html_files:
-            # Get the most recent file
-            latest_file = max(html_files, key=os.path.getmtime)
-            return latest_file
-        
-        # If no EnhancedTestReport found, look for any HTML files
-        pattern = os.path.join(reports_dir, "**", "*.html")
-        html_files = glob.glob(pattern, recursive=True)
-        
-        if html_files:
-            latest_file = max(html_files, key=os.path.getmtime)
-            return latest_file
-            
-        return None
+        manifest = ReportManifest(reports_dir)
+        # The report of the run published last (an environment comparison before the
+        # per-environment reports), then the newest report in the manifest
+        run_folder = latest_run_dir(reports_dir)
+        if run_folder:
+            reports = [entry for entry in manifest.by_run(os.path.basename(run_folder)) if entry['type'] in HTML_ARTIFACTS]
+            reports.sort(key=lambda entry: entry['type'] != ARTIFACT_COMPARISON)
+            for entry in reports:
+                if os.path.exists(manifest.path_of(entry)):
+                    return manifest.path_of(entry)
+        return manifest.latest(HTML_ARTIFACTS)
         
     except Exception as e:
         safe_print(f"Error finding HTML reports: {e}")
@@ -76,37 +72,37 @@ def open_html_report(reports_dir="TestReports", specific_file=None):
         safe_print(f"ERROR: Could not open HTML report: {e}")
         return False
 
-def list_html_reports(reports_dir="TestReports"):
-    """List all available HTML reports"""
+def list_html_reports(reports_dir="TestReports", run_id=None):
+    """List all available HTML reports (or every artifact of one run)"""
     try:
-        pattern = os.path.join(reports_dir, "**", "*.html")
-        html_files = glob.glob(pattern, recursive=True)
+        manifest = ReportManifest(reports_dir)
+        if run_id:
+            entries = manifest.by_run(run_id)
+            title = f"Artifacts of run {run_id}"
+        else:
+            # Newest first, as recorded in the manifest
+            entries = manifest.entries(HTML_ARTIFACTS, newest_first=True)
+            title = f"Available HTML reports in {reports_dir}"
         
-        if not html_files:
-            safe_print(f"No HTML reports found in {reports_dir}")
+        if not entries:
+            safe_print(f"No reports found for run {run_id}" if run_id else f"No HTML reports found in {reports_dir}")
             return
         
-        safe_print(f"Available HTML reports in {reports_dir}:")
+        safe_print(f"{title}:")
         safe_print("-" * 50)
         
-        # Sort by modification time (newest first)
-        html_files.sort(key=os.path.getmtime, reverse=True)
-        
-        for i, html_file in enumerate(html_files, 1):
-            # Get file info
-            mtime = os.path.getmtime(html_file)
-            size = os.path.getsize(html_file)
-            size_kb = size / 1024
-            
+        for i, entry in enumerate(entries, 1):
             # Format timestamp
-            timestamp = datetime.fromtimestamp(mtime).strftime('%Y-%m-%d %H:%M:%S')
-            
-            # Get relative path
-            rel_path = os.path.relpath(html_file, reports_dir)
+            timestamp = datetime.fromtimestamp(entry['mtime']).strftime('%Y-%m-%d %H:%M:%S')
+            size_kb = entry['size'] / 1024
             
-            safe_print(f"{i:2d}. {rel_path}")
+            safe_print(f"{i:2d}. {entry['path']}")
+            safe_print(f"    Run: {entry['run_id']} ({entry['type']}{', ' + entry['environment'] if entry.get('environment') else ''})")
             safe_print(f"    Modified: {timestamp}")
             safe_print(f"    Size: {size_kb:.1f} KB")
+            counts = entry.get('counts')
+            if counts:
+                safe_print(f"    Tests: {counts['total']} ({counts['passed']} passed, {counts['failed']} failed, {counts['skipped']} skipped)")
             safe_print("")
             
     except Exception as e:
@@ -118,6 +114,7 @@ def main():
     parser.add_argument('--file', help='Specific HTML file to open')
     parser.add_argument('--list', action='store_true', help='List all available HTML reports')
     parser.add_argument('--latest', action='store_true', help='Open the most recent HTML report (default)')
+    parser.add_argument('--run', metavar='RUN_ID', help='List every artifact of one run (e.g. 2025-01-31_14-05-09)')
     
     args = parser.parse_args()
     
@@ -129,8 +126,8 @@ def main():
         safe_print(f"ERROR: Reports directory not found: {args.dir}")
         sys.exit(1)
     
-    if args.list:
-        list_html_reports(args.dir)
+    if args.list or args.run:
+        list_html_reports(args.dir, args.run)
     elif args.file:
         open_html_report(args.dir, args.file)
     else:
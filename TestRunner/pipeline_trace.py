@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Pipeline Trace
+A minimal span API for timing the phases of a test run (restore, build, test, parse,
+render, Teams, open...) and the subprocesses and parser fallbacks inside them.
+
+    with span('build', 'runner') as attributes:
+        ...
+        attributes['returncode'] = 0
+
+Spans from every thread of the process are collected in one list and written in Chrome
+trace-event format (load trace.json in chrome://tracing or https://ui.perfetto.dev).
+Timestamps come from perf_counter, which is system-wide, so spans recorded in worker
+processes and passed back with events_since() line up with the parent's.
+"""
+
+import os
+import json
+import time
+import threading
+import functools
+from contextlib import contextmanager
+
+TRACE_FILE = 'trace.json'
+
+_events = []
+_thread_names = {}
+_lock = threading.Lock()
+
+
+def _now_us():
+    return time.perf_counter_ns() // 1000
+
+@contextmanager
+def span(name, category='runner', **attributes):
+    """Time the block as a span; the yielded dict becomes the span's args"""
+    start = _now_us()
+    try:
+        yield attributes
+    except BaseException as e:
+        attributes.setdefault('error', f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        thread = threading.current_thread()
+        event = {'name': name, 'cat': category, 'ph': 'X', 'ts': start, 'dur': _now_us() - start,
+                 'pid': os.getpid(), 'tid': thread.native_id, 'args': attributes}
+        with _lock:
+            _events.append(event)
+            _thread_names[(os.getpid(), thread.native_id)] = thread.name
+
+def traced(name, category='runner'):
+    """Decorator: run every call of the function as a span"""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name, category):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def mark():
+    """Position in the event list, for events_since"""
+    with _lock:
+        return len(_events)
+
+def events_since(position):
+    """Spans recorded after mark() returned position (e.g. to send back from a worker process)"""
+    with _lock:
+        return _events[position:]
+
+def add_events(events):
+    """Add spans recorded elsewhere (a worker process)"""
+    with _lock:
+        _events.extend(events)
+
+def events():
+    with _lock:
+        return list(_events)
+
+
+def summary_lines(recorded=None):
+    """Timing table: one line per (category, span name), in order of first start"""
+    recorded = events() if recorded is None else recorded
+    if not recorded:
+        return []
+    groups = {}
+    for event in recorded:
+        group = groups.setdefault((event['cat'], event['name']), {'first': event['ts'], 'count': 0, 'total': 0, 'max': 0})
+        group['first'] = min(group['first'], event['ts'])
+        group['count'] += 1
+        group['total'] += event['dur']
+        group['max'] = max(group['max'], event['dur'])
+
+    wall = max(event['ts'] + event['dur'] for event in recorded) - min(event['ts'] for event in recorded)
+    width = max(len(name) for _, name in groups) + 2
+    lines = [f"   {'Span':<{width}}{'Category':<12}{'Count':>6}{'Total':>10}{'Max':>10}"]
+    for (category, name), group in sorted(groups.items(), key=lambda item: item[1]['first']):
+        lines.append(f"   {name:<{width}}{category:<12}{group['count']:>6}"
+                     f"{group['total'] / 1e6:>9.2f}s{group['max'] / 1e6:>9.2f}s")
+    lines.append(f"   {'wall time':<{width}}{'':<12}{'':>6}{wall / 1e6:>9.2f}s")
+    return lines
+
+def write_trace(output_dir, recorded=None, process_name='run-all-tests', file_name=TRACE_FILE):
+    """Write the spans as a Chrome trace (trace.json in output_dir); returns its path"""
+    recorded = events() if recorded is None else recorded
+    with _lock:
+        thread_names = dict(_thread_names)
+    metadata = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+                for (pid, tid), name in thread_names.items()]
+    metadata += [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': process_name if pid == os.getpid() else 'result parser'}}
+                 for pid in sorted({event['pid'] for event in recorded})]
+
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, file_name)
+    # Written aside and renamed, as the run folder may already be published
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': metadata + recorded, 'displayTimeUnit': 'ms'}, f, default=str)
+    os.replace(temp_path, path)
+    return path
+
+def finish_trace(output_dir, process_name, log=print):
+    """For a script run on its own: print the timing table and write its trace into output_dir,
+    as <process_name>.trace.json (trace.json there may be the trace of the run it reports on).
+    Returns the trace path, or None when nothing was recorded or it couldn't be written."""
+    lines = summary_lines()
+    if not lines:
+        return None
+    # Plain text: the report generators print to Windows consoles as well
+    log("Pipeline timing:")
+    for line in lines:
+        log(line)
+    try:
+        path = write_trace(output_dir, process_name=process_name, file_name=f"{process_name}.trace.json")
+    except OSError as e:
+        log(f"WARNING: Could not write the pipeline trace: {e}")
+        return None
+    log(f"Trace: {path} (open in chrome://tracing or https://ui.perfetto.dev)")
+    return path
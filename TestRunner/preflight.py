@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Pre-Flight Connectivity Probe
+Checks that the API of the chosen environment is reachable (DNS, TCP and, for https, the TLS
+handshake) before any test runs, so an unreachable environment aborts the run in seconds
+instead of every test spending its full timeout-and-retry budget.
+
+The base URL is read like the tests read it: appsettings.json, overlaid with
+appsettings.<environment>.json, overlaid with ApiConfiguration__* environment variables,
+defaulting to the staging URL like HttpClientService. A proxy is used like .NET's HttpClient
+uses it (HTTPS_PROXY/HTTP_PROXY/NO_PROXY, or the system settings; loopback bypassed): the
+probe then reaches the proxy and, for https, opens a CONNECT tunnel through it.
+A failure is described the way .NET would report it and classified with the failure rules,
+so it gets the same label a test run would have produced.
+"""
+
+import os
+import ssl
+import json
+import time
+import base64
+import socket
+import ipaddress
+import threading
+import urllib.request
+from urllib.parse import urlsplit, unquote
+
+from failure_rules import classify_failure
+from pipeline_trace import span
+
+PROBE_TIMEOUT_SECONDS = 10.0
+PREFLIGHT_FILE = 'preflight.json'
+# HttpClientService's ApiConfiguration:BaseUrl when none is configured
+DEFAULT_BASE_URL = 'https://vhapistg.vaxcare.com'
+
+STAGE_CONFIG = 'config'
+STAGE_DNS = 'dns'
+STAGE_TCP = 'tcp'
+STAGE_PROXY = 'proxy'
+STAGE_TLS = 'tls'
+
+
+def _merge(base, override):
+    merged = dict(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+def load_api_configuration(project_root, environment):
+    """The ApiConfiguration section as the tests see it for environment"""
+    settings = {}
+    for file_name in ('appsettings.json', f'appsettings.{environment}.json'):
+        path = os.path.join(project_root, file_name)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8-sig') as f:
+                settings = _merge(settings, json.load(f))
+
+    api_configuration = dict(settings.get('ApiConfiguration', {}))
+    prefix = 'ApiConfiguration__'
+    for name, value in os.environ.items():
+        if name.startswith(prefix) and '__' not in name[len(prefix):]:
+            api_configuration[name[len(prefix):]] = value
+    return api_configuration
+
+def _is_true(value, default=True):
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() == 'true'
+
+
+class PreflightResult:
+    """Outcome of a probe: the stage reached, per-stage timings and, on failure, the
+    classified error"""
+
+    def __init__(self, base_url, environment):
+        self.base_url = base_url
+        self.environment = environment
+        self.host = None
+        self.port = None
+        self.proxy = None     # proxy URL the connection went through, if any
+        self.ok = False
+        self.stage = STAGE_CONFIG
+        self.timings = {}
+        self.address = None
+        self.error = None
+        self.actual_result = None
+        self.failure_reason = None
+        self.rule_id = None
+
+    def fail(self, stage, error_text):
+        self.ok = False
+        self.stage = stage
+        self.error = error_text
+        self.actual_result, self.failure_reason, self.rule_id = classify_failure(error_text, None)
+        return self
+
+    @property
+    def elapsed(self):
+        return sum(self.timings.values())
+
+    def describe(self):
+        if self.ok:
+            timings = ', '.join(f"{stage} {seconds * 1000:.0f} ms" for stage, seconds in self.timings.items())
+            via = f" via proxy {self.proxy}" if self.proxy else ""
+            return f"{self.host}:{self.port} reachable{via} ({timings})"
+        return f"{self.actual_result} - {self.failure_reason} [{self.rule_id}] at {self.stage}: {self.error}"
+
+    def to_dict(self):
+        return {
+            'ok': self.ok,
+            'environment': self.environment,
+            'base_url': self.base_url,
+            'host': self.host,
+            'port': self.port,
+            'proxy': self.proxy,
+            'address': self.address,
+            'stage': self.stage,
+            'timings_ms': {stage: round(seconds * 1000, 1) for stage, seconds in self.timings.items()},
+            'error': self.error,
+            'actual_result': self.actual_result,
+            'failure_reason': self.failure_reason,
+            'rule_id': self.rule_id,
+        }
+
+
+def proxy_for(scheme, host, proxies=None):
+    """Proxy URL HttpClient would use for scheme://host, or None for a direct connection.
+    proxies defaults to urllib's view of the environment (or the system settings)"""
+    try:
+        if host == 'localhost' or ipaddress.ip_address(host).is_loopback:
+            return None
+    except ValueError:
+        pass
+    if proxies is None:
+        proxies = urllib.request.getproxies()
+        bypass = proxies.get(scheme) and urllib.request.proxy_bypass(host)
+    else:
+        bypass = urllib.request.proxy_bypass_environment(host, proxies)
+    proxy = proxies.get(scheme)
+    if not proxy or bypass:
+        return None
+    return proxy if '://' in proxy else f"http://{proxy}"
+
+def _without_credentials(proxy):
+    parts = urlsplit(proxy)
+    return f"{parts.scheme}://{parts.hostname}" + (f":{parts.port}" if parts.port else "")
+
+def _connect(result, host, port, timeout, endpoint):
+    """DNS and TCP stages; returns the connected socket, or None with result failed"""
+    started = time.monotonic()
+    try:
+        addresses = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        result.timings[STAGE_DNS] = time.monotonic() - started
+        result.fail(STAGE_DNS, f"System.Net.Http.HttpRequestException : {e.strerror} {endpoint}")
+        return None
+    result.timings[STAGE_DNS] = time.monotonic() - started
+
+    started = time.monotonic()
+    last_error = None
+    for family, socket_type, protocol, _, address in addresses:
+        remaining = timeout - (time.monotonic() - started)
+        if remaining <= 0:
+            break
+        candidate = socket.socket(family, socket_type, protocol)
+        candidate.settimeout(remaining)
+        try:
+            candidate.connect(address)
+        except OSError as e:
+            candidate.close()
+            last_error = e
+            continue
+        result.timings[STAGE_TCP] = time.monotonic() - started
+        result.address = address[0]
+        return candidate
+    result.timings[STAGE_TCP] = time.monotonic() - started
+    if last_error is None or isinstance(last_error, socket.timeout):
+        result.fail(STAGE_TCP, f"System.Threading.Tasks.TaskCanceledException : "
+                               f"Connection not established within {timeout:g}s {endpoint}")
+    else:
+        result.fail(STAGE_TCP, f"System.Net.Http.HttpRequestException : "
+                               f"{last_error.strerror or last_error} {endpoint}")
+    return None
+
+def _open_tunnel(result, sock, proxy, timeout):
+    """CONNECT through the proxy to the target; returns False with result failed"""
+    started = time.monotonic()
+    proxy_parts = urlsplit(proxy)
+    proxy = result.proxy
+    request = f"CONNECT {result.host}:{result.port} HTTP/1.1\r\nHost: {result.host}:{result.port}\r\n"
+    if proxy_parts.username:
+        credentials = f"{unquote(proxy_parts.username)}:{unquote(proxy_parts.password or '')}"
+        request += f"Proxy-Authorization: Basic {base64.b64encode(credentials.encode()).decode()}\r\n"
+    response = b''
+    try:
+        sock.settimeout(timeout)
+        sock.sendall((request + "\r\n").encode('ascii'))
+        while b'\r\n\r\n' not in response and len(response) < 65536:
+            chunk = sock.recv(4096)
+            if not chunk:
+                break
+            response += chunk
+    except socket.timeout:
+        result.timings[STAGE_PROXY] = time.monotonic() - started
+        result.fail(STAGE_PROXY, f"System.Threading.Tasks.TaskCanceledException : "
+                                 f"The proxy tunnel request to proxy '{proxy}' did not complete within {timeout:g}s")
+        return False
+    except OSError as e:
+        result.timings[STAGE_PROXY] = time.monotonic() - started
+        result.fail(STAGE_PROXY, f"System.Net.Http.HttpRequestException : "
+                                 f"The proxy tunnel request to proxy '{proxy}' failed: {e.strerror or e}")
+        return False
+    result.timings[STAGE_PROXY] = time.monotonic() - started
+    status_line = response.split(b'\r\n', 1)[0].decode('latin-1')
+    status = status_line.split(' ')[1] if len(status_line.split(' ')) > 1 else '?'
+    if not status.startswith('2'):
+        result.fail(STAGE_PROXY, f"System.Net.Http.HttpRequestException : "
+                                 f"The proxy tunnel request to proxy '{proxy}' failed with status code '{status}'.")
+        return False
+    return True
+
+def probe_url(base_url, environment=None, timeout=PROBE_TIMEOUT_SECONDS, insecure=True, proxies=None):
+    """Resolve, connect to and (for https) TLS-handshake with base_url's host, through the
+    proxy HttpClient would use (see proxy_for)"""
+    result = PreflightResult(base_url, environment)
+    parts = urlsplit(base_url or '')
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        return result.fail(STAGE_CONFIG, f"InvalidOperationException : Invalid ApiConfiguration:BaseUrl {base_url!r}")
+    result.host = parts.hostname
+    result.port = parts.port or (443 if parts.scheme == 'https' else 80)
+
+    # Through a proxy only the proxy is resolved and connected to; it reaches the host
+    proxy = proxy_for(parts.scheme, result.host, proxies)
+    if proxy:
+        result.proxy = _without_credentials(proxy)  # recorded in preflight.json
+        proxy_parts = urlsplit(proxy)
+        connect_host, connect_port = proxy_parts.hostname, proxy_parts.port or 80
+        endpoint = f"(proxy {connect_host}:{connect_port})"
+    else:
+        connect_host, connect_port = result.host, result.port
+        endpoint = f"({result.host}:{result.port})"
+    sock = _connect(result, connect_host, connect_port, timeout, endpoint)
+    if sock is None:
+        return result
+
+    try:
+        if proxy and parts.scheme == 'https':
+            if not _open_tunnel(result, sock, proxy, max(0.1, timeout - result.timings[STAGE_TCP])):
+                return result
+        if parts.scheme == 'https':
+            endpoint = f"({result.host}:{result.port})"
+            started = time.monotonic()
+            context = ssl.create_default_context()
+            if insecure:
+                # Matches ApiConfiguration:InsecureHttps, under which the tests skip validation
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+            sock.settimeout(max(0.1, timeout - result.timings[STAGE_TCP]))
+            try:
+                sock = context.wrap_socket(sock, server_hostname=result.host)
+            except socket.timeout:
+                result.timings[STAGE_TLS] = time.monotonic() - started
+                return result.fail(STAGE_TLS, f"System.Threading.Tasks.TaskCanceledException : "
+                                              f"TLS handshake did not complete within {timeout:g}s {endpoint}")
+            except (ssl.SSLError, OSError) as e:
+                result.timings[STAGE_TLS] = time.monotonic() - started
+                return result.fail(STAGE_TLS, f"System.Security.Authentication.AuthenticationException : "
+                                              f"The SSL connection could not be established: {e} {endpoint}")
+            result.timings[STAGE_TLS] = time.monotonic() - started
+    finally:
+        sock.close()
+
+    result.ok = True
+    result.stage = STAGE_TLS if parts.scheme == 'https' else STAGE_TCP
+    return result
+
+def probe_environment(project_root, environment, timeout=PROBE_TIMEOUT_SECONDS):
+    """Probe ApiConfiguration:BaseUrl of environment (the staging URL when it isn't set, as in
+    HttpClientService)"""
+    with span('preflight', 'network', environment=environment) as attributes:
+        try:
+            api_configuration = load_api_configuration(project_root, environment)
+        except (OSError, ValueError) as e:
+            result = PreflightResult(None, environment).fail(STAGE_CONFIG, f"InvalidOperationException : Could not read appsettings: {e}")
+        else:
+            base_url = api_configuration.get('BaseUrl')
+            result = probe_url(DEFAULT_BASE_URL if base_url is None else base_url, environment, timeout,
+                               insecure=_is_true(api_configuration.get('InsecureHttps')))
+        attributes.update(ok=result.ok, stage=result.stage, base_url=result.base_url)
+        return result
+
+
+class PreflightProbe:
+    """Runs probe_environment on a background (daemon) thread, e.g. while the project builds"""
+
+    def __init__(self, project_root, environment, timeout=PROBE_TIMEOUT_SECONDS):
+        self.environment = environment
+        self.timeout = timeout
+        self._result = None
+        self._thread = threading.Thread(target=self._run, args=(project_root, environment, timeout), daemon=True)
+
+    def _run(self, project_root, environment, timeout):
+        self._result = probe_environment(project_root, environment, timeout)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def result(self):
+        """Wait for the probe; DNS can't be interrupted, so a stuck lookup counts as a timeout"""
+        with span('preflight-wait', 'network', environment=self.environment):
+            self._thread.join(self.timeout * 3)
+        if self._result is None:
+            return PreflightResult(None, self.environment).fail(
+                STAGE_DNS, f"System.Threading.Tasks.TaskCanceledException : Name resolution did not complete within {self.timeout * 3:g}s")
+        return self._result
+
+def write_result(result, output_dir):
+    """Write the probe result next to the reports; returns the path"""
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, PREFLIGHT_FILE)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(result.to_dict(), f, indent=2)
+    return path
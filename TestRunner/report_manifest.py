@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+"""
+Report Manifest
+Keeps track of every artifact written under TestReports (TRX/XML results, HTML reports,
+logs, traces...), so finding "the latest report" or "the files of a run" doesn't glob and
+stat the whole tree, which takes seconds on agents with months of reports.
+
+  - TestReports/manifest.jsonl is append-only: one JSON line per recorded (or removed)
+    artifact with run id, type, path, size, environment and, for reports, the summary counts
+  - TestReports/manifest.index.json is the compacted index (artifacts by path, by run and the
+    latest of each type). It remembers how much of the manifest it covers and folds in only
+    the lines appended since (rewriting itself once there are many); it is rebuilt from the
+    manifest when missing or unreadable. Listing all reports or the TRX history reads it
+  - TestReports/manifest.pointers/ holds one small file per artifact type (latest-<type>.json,
+    its newest entry) and per run (runs/<run id>.json, its entries), updated on every record,
+    so the latest report and the files of a run are one small read whatever the history size
+
+A directory without a manifest (reports from before it existed) is scanned once to create it.
+Paths are stored relative to the reports directory.
+"""
+
+import os
+import re
+import json
+import time
+import shutil
+import threading
+from datetime import datetime
+
+MANIFEST_FILE = 'manifest.jsonl'
+INDEX_FILE = 'manifest.index.json'
+INDEX_VERSION = 1
+POINTER_DIR = 'manifest.pointers'
+# The index is rewritten once this many manifest lines are not in it yet (fewer are just
+# read from the end of the manifest on every load)
+COMPACT_AFTER_LINES = 100
+
+ARTIFACT_TRX = 'trx'
+ARTIFACT_XML = 'xml'
+ARTIFACT_HTML = 'html'
+ARTIFACT_COMPARISON = 'comparison'
+ARTIFACT_PDF = 'pdf'
+ARTIFACT_LOG = 'log'
+ARTIFACT_TRACE = 'trace'
+ARTIFACT_PREFLIGHT = 'preflight'
+HTML_ARTIFACTS = (ARTIFACT_HTML, ARTIFACT_COMPARISON)
+ARTIFACT_TYPES = (ARTIFACT_TRX, ARTIFACT_XML, ARTIFACT_HTML, ARTIFACT_COMPARISON, ARTIFACT_PDF, ARTIFACT_LOG,
+                  ARTIFACT_TRACE, ARTIFACT_PREFLIGHT)
+
+RUN_ID_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2}')
+ENVIRONMENT_DIRS = ('Staging', 'QA', 'Production')
+# Reused in place by every --watch cycle; not a run, so not recorded
+WATCH_RUN_DIR = 'runs/watch'
+
+_append_lock = threading.Lock()
+
+
+def new_run_id():
+    """Id of a run started now (also the timestamp in its result file names)"""
+    return datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+
+def _write_json(path, data):
+    """Write data to path atomically (a temporary file, then renamed)"""
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(temp_path, path)
+    except OSError as e:
+        print(f"Warning: Could not write {path}: {e}")
+
+def _read_json(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def classify_artifact(file_name):
+    """Artifact type of a file in the reports directory, or None for files not tracked"""
+    lower = file_name.lower()
+    if lower.endswith('.trx'):
+        return ARTIFACT_TRX
+    if lower.endswith('.xml') and lower.startswith('testresults'):
+        return ARTIFACT_XML
+    if lower.endswith('.html'):
+        return ARTIFACT_COMPARISON if lower.startswith('environmentcomparison') else ARTIFACT_HTML
+    if lower.endswith('.pdf'):
+        return ARTIFACT_PDF
+    if lower.endswith('.log'):
+        return ARTIFACT_LOG
+    if lower == 'trace.json' or lower.endswith('.trace.json'):
+        return ARTIFACT_TRACE
+    if lower == 'preflight.json':
+        return ARTIFACT_PREFLIGHT
+    return None
+
+def summary_counts(summary):
+    """The counts recorded for a report of summary (a RunSummary)"""
+    return {
+        'total': summary.total_tests,
+        'passed': summary.passed_tests,
+        'failed': summary.failed_tests,
+        'skipped': summary.skipped_tests,
+    }
+
+
+class ReportManifest:
+    """The manifest and index of one reports directory"""
+
+    def __init__(self, reports_dir):
+        self.reports_dir = reports_dir
+        self.manifest_path = os.path.join(reports_dir, MANIFEST_FILE)
+        self.index_path = os.path.join(reports_dir, INDEX_FILE)
+        self.pointer_dir = os.path.join(reports_dir, POINTER_DIR)
+        self._index = None
+
+    # -- recording ---------------------------------------------------------
+
+    def relative(self, path):
+        relative = os.path.relpath(os.path.abspath(path), os.path.abspath(self.reports_dir))
+        if relative.startswith('..'):
+            return os.path.abspath(path)
+        return relative.replace(os.sep, '/')
+
+    def path_of(self, entry):
+        """Absolute-or-working-directory path of an entry"""
+        return os.path.join(self.reports_dir, *entry['path'].split('/'))
+
+    def _append(self, lines):
+        if not os.path.exists(self.manifest_path):
+            # Create it from what is already there first, so older reports stay listed
+            # (without the artifacts being recorded now, which are already on disk)
+            self._index = self.rebuild_from_tree(skip={line.get('path') or line.get('removed') for line in lines})
+        self._ensure_pointers()
+        os.makedirs(self.reports_dir, exist_ok=True)
+        with _append_lock:
+            with open(self.manifest_path, 'a', encoding='utf-8') as f:
+                f.write(''.join(json.dumps(line) + '\n' for line in lines))
+            self._update_pointers([line for line in lines if 'removed' not in line])
+        self._index = None
+
+    def _entry(self, path, artifact_type, run_id, environment=None, counts=None, **attributes):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        entry = {'run_id': run_id, 'type': artifact_type, 'path': self.relative(path),
+                 'size': stat.st_size, 'mtime': stat.st_mtime}
+        if environment:
+            entry['environment'] = environment
+        if counts:
+            entry['counts'] = counts
+        entry.update({key: value for key, value in attributes.items() if value is not None})
+        return entry
+
+    def record(self, path, artifact_type, run_id, environment=None, counts=None, **attributes):
+        """Append an artifact that was just written; returns its entry (None if it doesn't exist)"""
+        entry = self._entry(path, artifact_type, run_id, environment, counts, **attributes)
+        if entry:
+            self._append([entry])
+        return entry
+
+    def record_all(self, artifacts):
+        """Append several artifacts at once; each is a dict of record() arguments"""
+        entries = [entry for entry in (self._entry(**artifact) for artifact in artifacts) if entry]
+        if entries:
+            self._append(entries)
+        return entries
+
+    def record_removed(self, paths):
+        """Append removals (e.g. after deleting old reports)"""
+        if not paths:
+            return
+        removed = [self.relative(path) for path in paths]
+        recorded = self._load_index()['entries']
+        run_ids = {recorded[path]['run_id'] for path in removed if path in recorded}
+        self._append([{'removed': path, 'time': time.time()} for path in removed])
+
+        # Rewrite the pointers of the runs and types that lost files from the updated index
+        index = self._load_index()
+        removed = set(removed)
+        with _append_lock:
+            for run_id in run_ids:
+                self._write_run_pointer(index, run_id)
+            for artifact_type in ARTIFACT_TYPES:
+                entry = _read_json(self._latest_pointer_path(artifact_type))
+                if entry and entry['path'] in removed:
+                    self._write_latest_pointer(index, artifact_type)
+
+    # -- pointers ----------------------------------------------------------
+
+    def _latest_pointer_path(self, artifact_type):
+        return os.path.join(self.pointer_dir, f'latest-{artifact_type}.json')
+
+    def _run_pointer_path(self, run_id):
+        return os.path.join(self.pointer_dir, 'runs', f'{run_id}.json')
+
+    def _write_latest_pointer(self, index, artifact_type):
+        path = index['latest'].get(artifact_type)
+        if path:
+            _write_json(self._latest_pointer_path(artifact_type), index['entries'][path])
+        else:
+            _remove_file(self._latest_pointer_path(artifact_type))
+
+    def _write_run_pointer(self, index, run_id):
+        paths = index['runs'].get(run_id)
+        if paths:
+            _write_json(self._run_pointer_path(run_id), [index['entries'][path] for path in paths])
+        else:
+            _remove_file(self._run_pointer_path(run_id))
+
+    def _write_pointers(self, index):
+        """All pointer files from the index (a new or rebuilt manifest)"""
+        shutil.rmtree(self.pointer_dir, ignore_errors=True)
+        os.makedirs(self.pointer_dir, exist_ok=True)
+        for artifact_type in index['latest']:
+            self._write_latest_pointer(index, artifact_type)
+        for run_id in index['runs']:
+            self._write_run_pointer(index, run_id)
+
+    def _ensure_pointers(self):
+        # A manifest from before the pointer files gets them once
+        if os.path.exists(self.manifest_path) and not os.path.isdir(self.pointer_dir):
+            self._write_pointers(self._load_index())
+
+    def _update_pointers(self, entries):
+        runs = {}
+        for entry in entries:
+            # A file recorded again for another run (e.g. overwritten in place) leaves its old run
+            previous = _read_json(self._latest_pointer_path(entry['type']))
+            if previous and previous['path'] == entry['path'] and previous['run_id'] != entry['run_id']:
+                self._drop_from_run_pointer(previous['run_id'], entry['path'])
+            _write_json(self._latest_pointer_path(entry['type']), entry)
+            runs.setdefault(entry['run_id'], []).append(entry)
+        for run_id, run_entries in runs.items():
+            paths = {entry['path'] for entry in run_entries}
+            recorded = _read_json(self._run_pointer_path(run_id)) or []
+            _write_json(self._run_pointer_path(run_id),
+                        [entry for entry in recorded if entry['path'] not in paths] + run_entries)
+
+    def _drop_from_run_pointer(self, run_id, path):
+        recorded = _read_json(self._run_pointer_path(run_id)) or []
+        remaining = [entry for entry in recorded if entry['path'] != path]
+        if remaining:
+            _write_json(self._run_pointer_path(run_id), remaining)
+        else:
+            _remove_file(self._run_pointer_path(run_id))
+
+    # -- index -------------------------------------------------------------
+
+    @staticmethod
+    def _empty_index():
+        return {'version': INDEX_VERSION, 'covered': 0, 'entries': {}, 'runs': {}, 'latest': {}}
+
+    @staticmethod
+    def _apply(index, line):
+        entries, runs, latest = index['entries'], index['runs'], index['latest']
+        removed = line.get('removed')
+        path = removed or line.get('path')
+        previous = entries.pop(path, None)
+        if previous is not None:
+            run_paths = runs.get(previous['run_id'], [])
+            if path in run_paths:
+                run_paths.remove(path)
+            if not run_paths:
+                runs.pop(previous['run_id'], None)
+            if latest.get(previous['type']) == path:
+                # The next newest of that type (rare: the latest was removed or replaced)
+                del latest[previous['type']]
+                for other_path in reversed(list(entries)):
+                    if entries[other_path]['type'] == previous['type']:
+                        latest[previous['type']] = other_path
+                        break
+        if removed:
+            return
+        entries[path] = line
+        runs.setdefault(line['run_id'], []).append(path)
+        latest[line['type']] = path
+
+    def _read_lines(self, offset):
+        """Complete manifest lines after byte offset, and the offset after the last of them"""
+        with open(self.manifest_path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+        end = data.rfind(b'\n') + 1  # a line still being written is left for next time
+        lines = []
+        for raw in data[:end].splitlines():
+            try:
+                lines.append(json.loads(raw))
+            except ValueError:
+                continue
+        return lines, offset + end
+
+    def _write_index(self, index):
+        _write_json(self.index_path, index)
+
+    def _load_index(self):
+        if self._index is not None:
+            return self._index
+        if not os.path.exists(self.manifest_path):
+            self._index = self.rebuild_from_tree()
+            return self._index
+
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = None
+        manifest_size = os.path.getsize(self.manifest_path)
+        rebuilt = not index or index.get('version') != INDEX_VERSION or index.get('covered', 0) > manifest_size
+        if rebuilt:
+            index = self._empty_index()
+
+        if index['covered'] < manifest_size:
+            lines, index['covered'] = self._read_lines(index['covered'])
+            for line in lines:
+                self._apply(index, line)
+            if rebuilt or len(lines) >= COMPACT_AFTER_LINES:
+                self._write_index(index)
+        self._index = index
+        return index
+
+    def rebuild_from_tree(self, skip=()):
+        """Create the manifest (and index) by scanning the reports directory once"""
+        found = []
+        for directory, subdirs, files in os.walk(self.reports_dir):
+            # Hidden folders hold runs still being written (see run_directory)
+            subdirs[:] = [subdir for subdir in subdirs if not subdir.startswith('.')
+                          and self.relative(os.path.join(directory, subdir)) != WATCH_RUN_DIR]
+            for file_name in files:
+                artifact_type = classify_artifact(file_name)
+                if artifact_type is None:
+                    continue
+                path = os.path.join(directory, file_name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                relative = self.relative(path)
+                if relative in skip:
+                    continue
+                match = RUN_ID_PATTERN.search(relative)
+                run_id = match.group(0) if match else datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d_%H-%M-%S')
+                entry = {'run_id': run_id, 'type': artifact_type, 'path': relative,
+                         'size': stat.st_size, 'mtime': stat.st_mtime}
+                environment = next((part for part in relative.split('/') if part in ENVIRONMENT_DIRS), None)
+                if environment:
+                    entry['environment'] = environment
+                if artifact_type == ARTIFACT_TRX and os.path.splitext(file_name)[0].endswith('_rerun'):
+                    entry['partial'] = True
+                found.append(entry)
+        found.sort(key=lambda entry: entry['mtime'])
+
+        index = self._empty_index()
+        if not os.path.isdir(self.reports_dir):
+            return index
+        with _append_lock, open(self.manifest_path, 'w', encoding='utf-8') as f:
+            f.write(''.join(json.dumps(entry) + '\n' for entry in found))
+        for entry in found:
+            self._apply(index, entry)
+        index['covered'] = os.path.getsize(self.manifest_path)
+        self._write_index(index)
+        self._write_pointers(index)
+        return index
+
+    # -- look-ups ----------------------------------------------------------
+
+    def latest(self, artifact_types, environment=None):
+        """Path of the newest existing artifact of the given type(s), or None"""
+        if isinstance(artifact_types, str):
+            artifact_types = (artifact_types,)
+        if environment is None and self._has_pointers():
+            candidates = [entry for entry in (_read_json(self._latest_pointer_path(artifact_type))
+                                              for artifact_type in artifact_types) if entry]
+            candidates.sort(key=lambda entry: entry['mtime'], reverse=True)
+            for entry in candidates:
+                if os.path.exists(self.path_of(entry)):
+                    return self.path_of(entry)
+        # An environment was asked for, or the latest was deleted behind our back (or none recorded)
+        for entry in self.entries(artifact_types, environment, newest_first=True):
+            if os.path.exists(self.path_of(entry)):
+                return self.path_of(entry)
+        return None
+
+    def entries(self, artifact_types=None, environment=None, newest_first=False):
+        """Recorded entries (optionally of the given type(s)/environment) in recording order"""
+        if isinstance(artifact_types, str):
+            artifact_types = (artifact_types,)
+        entries = list(self._load_index()['entries'].values())
+        if newest_first:
+            entries.reverse()
+        return [entry for entry in entries
+                if (artifact_types is None or entry['type'] in artifact_types)
+                and (environment is None or entry.get('environment') == environment)]
+
+    def by_run(self, run_id):
+        """Entries of one run"""
+        if self._has_pointers():
+            return _read_json(self._run_pointer_path(run_id)) or []
+        index = self._load_index()
+        return [index['entries'][path] for path in index['runs'].get(run_id, [])]
+
+    def _has_pointers(self):
+        self._ensure_pointers()
+        return os.path.isdir(self.pointer_dir)
+
+    def runs(self):
+        """Run ids, oldest first"""
+        return list(self._load_index()['runs'])
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+In-Process Report Pipeline
+Runs the HTML report generators and the Teams notifier inside the test runner's interpreter,
+on results parsed once, instead of starting a `python3` process (which re-parses everything)
+for every step and every fallback.
+
+The scripts keep their hyphenated file names and command lines; they are loaded as modules
+with importlib and called through their generate_report / notify functions.
+"""
+
+import os
+import importlib.util
+from functools import lru_cache
+
+from results_merge import load_merged_results
+from failure_rules import format_rule_hits
+from pipeline_trace import span
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+TRX_REPORT_SCRIPT = 'generate-enhanced-html-report-with-actual-results.py'
+WINDOWS_REPORT_SCRIPT = 'generate-enhanced-html-report-with-actual-results-windows.py'
+XML_REPORT_SCRIPT = 'generate-enhanced-html-report-robust.py'
+TEAMS_SCRIPT = 'send-teams-notification.py'
+
+# Generators tried in order until one writes a report; all take the same parsed results
+TRX_REPORT_GENERATORS = (TRX_REPORT_SCRIPT, WINDOWS_REPORT_SCRIPT)
+XML_REPORT_GENERATORS = (XML_REPORT_SCRIPT, WINDOWS_REPORT_SCRIPT)
+
+
+@lru_cache(maxsize=None)
+def load_script(file_name):
+    """Import a TestRunner script (hyphenated file name) as a module"""
+    module_name = os.path.splitext(file_name)[0].replace('-', '_')
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(SCRIPT_DIR, file_name))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def parse_results(result_files, log=print):
+    """Parse (and merge) the result files once for every later step; None if they can't be read"""
+    try:
+        with span('parse-results', 'report', files=len(result_files)) as attributes:
+            data = load_merged_results(result_files, stream=True)
+            attributes['tests'] = data.total_tests
+    except Exception as e:
+        log(f"⚠️ Could not parse test results: {e}")
+        return None
+
+    if data.merged_from:
+        log(f"🔗 Merged {len(data.merged_from)} result files ({data.duplicates_dropped} retried results replaced by a later attempt)")
+    log(f"📊 {data.total_tests} tests: {data.passed_tests} passed, {data.failed_tests} failed, "
+        f"{data.skipped_tests} skipped ({data.success_rate}% success)")
+    if data.failure_rule_counts:
+        log("Failure Classification (rule: hits):")
+        for line in format_rule_hits(data.failure_rule_counts):
+            log(line)
+    return data
+
+def generate_html_report(data, output_dir, environment="Staging", generators=TRX_REPORT_GENERATORS, log=print):
+    """Write the HTML report with the first generator that succeeds; returns its path or None"""
+    for index, script in enumerate(generators):
+        if index:
+            log(f"⚠️ Falling back to {script}...")
+        try:
+            with span('render', 'report', script=script, attempt=index + 1) as attributes:
+                module = load_script(script)
+                if script == XML_REPORT_SCRIPT:
+                    report_path = module.generate_report(data, output_dir)
+                else:
+                    report_path = module.generate_report(data, output_dir, environment)
+                attributes['ok'] = bool(report_path)
+        except Exception as e:
+            log(f"⚠️ {script} failed: {e}")
+            continue
+        if report_path:
+            return report_path
+    return None
+
+def send_teams_notification(data, environment="Staging", webhook_url=None):
+    """Send the Teams card for the parsed results; returns True on success"""
+    try:
+        return load_script(TEAMS_SCRIPT).notify(data, environment, webhook_url)
+    except Exception as e:
+        print(f"⚠️ Teams notification failed: {e}")
+        return False
+
+def send_preflight_notification(probe, environment="Staging", webhook_url=None):
+    """Send the aborted-run card for a failed pre-flight check; returns True on success"""
+    try:
+        return load_script(TEAMS_SCRIPT).notify_preflight_failure(probe, environment, webhook_url)
+    except Exception as e:
+        print(f"⚠️ Teams notification failed: {e}")
+        return False
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Report Retention
+Keeps the TestReports folder of an agent bounded: old runs are deleted according to a
+policy (keep the last N runs, a maximum age, a maximum total size, always keep failing runs).
+
+The folder is walked once with os.scandir and every artifact (results, logs, reports,
+traces...) is grouped into its run: by the run id recorded in the report manifest, or for
+files from before the manifest, by the timestamp in the file or folder name. A run is only
+ever deleted as a whole.
+
+Runs are never deleted while they may still be written to. Files of runs that aren't
+published yet are not scanned at all, however old: the runs/.<run id>.tmp staging and scratch
+folders, and a preflight.json not recorded in the manifest yet. Nor is runs/watch, which
+--watch rewrites in place. Of the published runs, the run calling the retention (protected
+run ids), any run with a file modified in the last ACTIVE_RUN_SECONDS (another runner on the
+same folder) and the newest run are kept.
+"""
+
+import os
+import time
+from datetime import datetime
+
+from report_manifest import ReportManifest, RUN_ID_PATTERN, classify_artifact, ARTIFACT_PREFLIGHT, WATCH_RUN_DIR
+from results_cache import CACHE_SUFFIX
+from run_directory import STAGING_SUFFIX
+
+DEFAULT_KEEP_RUNS = 10
+ACTIVE_RUN_SECONDS = 10 * 60
+RETENTION_LOG_FILE = 'retention.log'   # output of the retention run after a test run
+
+REASON_COUNT = 'count'
+REASON_AGE = 'age'
+REASON_SIZE = 'size'
+
+
+class RetentionPolicy:
+    """What to keep; None disables a limit. With keep_failing, runs with failed tests are
+    exempt from every limit."""
+
+    def __init__(self, keep_runs=None, max_age_days=None, max_bytes=None, keep_failing=False):
+        self.keep_runs = keep_runs
+        self.max_age_days = max_age_days
+        self.max_bytes = max_bytes
+        self.keep_failing = keep_failing
+
+    @property
+    def enabled(self):
+        return any(limit is not None for limit in (self.keep_runs, self.max_age_days, self.max_bytes))
+
+    def describe(self):
+        parts = []
+        if self.keep_runs is not None:
+            parts.append(f"last {self.keep_runs} runs")
+        if self.max_age_days is not None:
+            parts.append(f"at most {self.max_age_days:g} days old")
+        if self.max_bytes is not None:
+            parts.append(f"at most {format_size(self.max_bytes)}")
+        if self.keep_failing:
+            parts.append("failing runs kept")
+        return ", ".join(parts) or "keep everything"
+
+
+class ReportRun:
+    """The artifacts of one run found in the reports folder"""
+
+    def __init__(self, run_id):
+        self.run_id = run_id
+        self.files = []      # (path, size, mtime)
+        self.size = 0
+        self.newest = 0.0
+        self.failed = None   # from the report counts in the manifest; None if unknown
+
+    def add(self, path, size, mtime):
+        self.files.append((path, size, mtime))
+        self.size += size
+        self.newest = max(self.newest, mtime)
+
+
+def format_size(size):
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+def is_unpublished_folder(name):
+    """A run's staging or scratch folder (runs/.<run id>[.<stage>].tmp)"""
+    return name.startswith('.') and name.endswith(STAGING_SUFFIX)
+
+def _walk(directory):
+    """Every file under directory as (path, size, mtime), with one scandir per folder;
+    folders of unpublished runs are skipped"""
+    try:
+        with os.scandir(directory) as scanned:
+            for item in scanned:
+                if item.is_dir(follow_symlinks=False):
+                    if not is_unpublished_folder(item.name):
+                        yield from _walk(item.path)
+                elif item.is_file(follow_symlinks=False):
+                    try:
+                        stat = item.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    yield item.path, stat.st_size, stat.st_mtime
+    except OSError:
+        return
+
+def scan_runs(reports_dir):
+    """The runs in reports_dir, by run id (one walk of the folder)"""
+    manifest = ReportManifest(reports_dir)
+    recorded = {}
+    # An existing manifest supplies run ids and results; a missing one is not created here,
+    # which would walk the folder a second time
+    if os.path.exists(manifest.manifest_path):
+        recorded = {entry['path']: entry for entry in manifest.entries()}
+
+    runs = {}
+    for path, size, mtime in _walk(reports_dir):
+        # A results cache sidecar goes with its result file
+        source = path[:-len(CACHE_SUFFIX)] if path.endswith(CACHE_SUFFIX) else path
+        artifact_type = classify_artifact(os.path.basename(source))
+        if artifact_type is None:
+            continue  # the manifest, live summary and anything else not produced by a run
+        relative = manifest.relative(source)
+        if relative == RETENTION_LOG_FILE or relative.startswith(WATCH_RUN_DIR + '/'):
+            continue  # the retention's own log; the watch folder, rewritten in place
+        entry = recorded.get(relative)
+        if artifact_type == ARTIFACT_PREFLIGHT and not entry:
+            continue  # written by a run that is still recording it
+        if entry:
+            run_id = entry['run_id']
+        else:
+            match = RUN_ID_PATTERN.search(relative)
+            run_id = match.group(0) if match else datetime.fromtimestamp(mtime).strftime('%Y-%m-%d_%H-%M-%S')
+        run = runs.setdefault(run_id, ReportRun(run_id))
+        run.add(path, size, mtime)
+        counts = entry.get('counts') if entry else None
+        if counts:
+            run.failed = bool(run.failed) or counts.get('failed', 0) > 0
+    return runs
+
+def plan_retention(runs, policy, protected=(), now=None):
+    """Split runs (ReportRun list) into (kept, removed); removed holds (run, reason) pairs"""
+    now = time.time() if now is None else now
+    ordered = sorted(runs, key=lambda run: run.newest, reverse=True)
+
+    def is_protected(position, run):
+        return position == 0 or run.run_id in protected or now - run.newest < ACTIVE_RUN_SECONDS
+
+    kept, removed = [], []
+    counted = 0
+    for position, run in enumerate(ordered):
+        exempt = policy.keep_failing and run.failed
+        if is_protected(position, run):
+            kept.append(run)
+            counted += 1
+        elif policy.max_age_days is not None and now - run.newest > policy.max_age_days * 86400 and not exempt:
+            removed.append((run, REASON_AGE))
+        elif policy.keep_runs is not None and counted >= policy.keep_runs and not exempt:
+            removed.append((run, REASON_COUNT))
+        else:
+            kept.append(run)
+            counted += 0 if exempt else 1
+
+    if policy.max_bytes is not None:
+        total = sum(run.size for run in kept)
+        protected_ids = {run.run_id for position, run in enumerate(ordered) if is_protected(position, run)}
+        # Oldest first until the rest fits
+        for run in reversed(list(kept)):
+            if total <= policy.max_bytes:
+                break
+            if run.run_id in protected_ids or (policy.keep_failing and run.failed):
+                continue
+            kept.remove(run)
+            removed.append((run, REASON_SIZE))
+            total -= run.size
+    return kept, removed
+
+def _remove_empty_folders(reports_dir, directories):
+    """Remove the folders that became empty, up to (not including) reports_dir"""
+    root = os.path.abspath(reports_dir)
+    for directory in sorted(directories, key=len, reverse=True):
+        directory = os.path.abspath(directory)
+        while directory != root and directory.startswith(root + os.sep):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break  # not empty (or in use)
+            directory = os.path.dirname(directory)
+
+def apply_retention(reports_dir, policy, protected=(), dry_run=False, log=print):
+    """Delete the runs the policy doesn't keep (only list them with dry_run).
+
+    Returns (runs removed, bytes freed).
+    """
+    if not os.path.isdir(reports_dir):
+        return [], 0
+    runs = scan_runs(reports_dir)
+    kept, removed = plan_retention(list(runs.values()), policy, protected)
+    reasons = {
+        REASON_COUNT: f"beyond the last {policy.keep_runs} runs",
+        REASON_AGE: f"older than {policy.max_age_days:g} days" if policy.max_age_days is not None else "",
+        REASON_SIZE: f"folder over {format_size(policy.max_bytes)}" if policy.max_bytes is not None else "",
+    }
+
+    freed = 0
+    deleted = []
+    for run, reason in sorted(removed, key=lambda item: item[0].newest):
+        verb = "Would remove" if dry_run else "Removing"
+        log(f"🗑️  {verb} run {run.run_id}: {len(run.files)} files, {format_size(run.size)} ({reasons[reason]})")
+        if dry_run:
+            freed += run.size
+            continue
+        for path, size, _ in run.files:
+            try:
+                os.remove(path)
+            except OSError as e:
+                log(f"⚠️  Could not remove {path}: {e}")
+                continue
+            deleted.append(path)
+            freed += size
+
+    if deleted:
+        _remove_empty_folders(reports_dir, {os.path.dirname(path) for path in deleted})
+        manifest = ReportManifest(reports_dir)
+        if os.path.exists(manifest.manifest_path):
+            manifest.record_removed(deleted)
+    log(f"📊 Kept {len(kept)} runs ({format_size(sum(run.size for run in kept))}), "
+        f"{'would free' if dry_run else 'freed'} {format_size(freed)} from {len(removed)} runs")
+    return [run for run, _ in removed], freed
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Parsed Results Cache
+Stores a parsed RunSummary in a JSON sidecar next to the TRX/XML file it came from,
+so the report generators and the Teams notifier only parse a run once.
+
+The sidecar is valid when the source file's size and mtime match the recorded values.
+When only the mtime differs (e.g. the file was copied) the content hash is compared
+before the cache is discarded. The hash is taken by the parser from the bytes it reads,
+so a cold parse doesn't read the file a second time. Editing the failure or inference rule tables invalidates
+every sidecar.
+"""
+
+import os
+import json
+import hashlib
+
+from results_model import RunSummary, parse_results, apply_test_info, load_test_info
+import failure_rules
+import inference_rules
+from pipeline_trace import span
+
+# Bump whenever parsing or classification changes the records produced for the same input
+CACHE_VERSION = 2
+
+CACHE_SUFFIX = '.summary.json'
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def cache_path_for(result_file):
+    """Path of the sidecar cache for a result file"""
+    return result_file + CACHE_SUFFIX
+
+def file_sha256(path):
+    """Content hash of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+_rules_fingerprint = None
+
+def rules_fingerprint():
+    """Hash of the rule tables that shape the cached records"""
+    global _rules_fingerprint
+    if _rules_fingerprint is None:
+        digest = hashlib.sha256()
+        for rules_file in (failure_rules.rules_path(), inference_rules.rules_path()):
+            with open(rules_file, 'rb') as f:
+                digest.update(f.read())
+        _rules_fingerprint = digest.hexdigest()
+    return _rules_fingerprint
+
+def _read_cache(cache_file):
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_cache(cache_file, payload):
+    """Write the sidecar atomically; a read-only results directory just disables caching"""
+    temp_file = f"{cache_file}.{os.getpid()}.tmp"
+    try:
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, separators=(',', ':'))
+        os.replace(temp_file, cache_file)
+    except OSError as e:
+        print(f"Warning: Could not write results cache {cache_file}: {e}")
+        try:
+            os.remove(temp_file)
+        except OSError:
+            pass
+
+def load_cached_summary(result_file):
+    """Return the cached RunSummary for a result file, or None when the cache is missing or stale"""
+    cache_file = cache_path_for(result_file)
+    cached = _read_cache(cache_file)
+    if not cached or cached.get('version') != CACHE_VERSION or cached.get('rules') != rules_fingerprint():
+        return None
+
+    source = cached.get('source', {})
+    stat = os.stat(result_file)
+    if source.get('size') != stat.st_size:
+        return None
+
+    if source.get('mtime_ns') != stat.st_mtime_ns:
+        # Slow path: same size but different mtime, compare content
+        if source.get('sha256') != file_sha256(result_file):
+            return None
+        source['mtime_ns'] = stat.st_mtime_ns
+        _write_cache(cache_file, cached)
+
+    try:
+        summary = RunSummary.from_dict(cached['summary'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    summary.source_path = result_file
+    return summary
+
+def store_summary(result_file, summary, stat=None):
+    """Write the sidecar cache for a freshly parsed result file.
+
+    stat should be taken before parsing, so a file that changes meanwhile invalidates the cache.
+    """
+    stat = stat or os.stat(result_file)
+    _write_cache(cache_path_for(result_file), {
+        'version': CACHE_VERSION,
+        'rules': rules_fingerprint(),
+        'source': {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': summary.source_sha256 or file_sha256(result_file),
+        },
+        'summary': summary.to_dict(),
+    })
+
+def load_results(result_file, test_info=None, use_cache=True, stream=True):
+    """Parse a TRX or xUnit file, reusing the sidecar cache when it is still valid.
+
+    The cache holds the parse without TestInfo.json overlays so every consumer can share it;
+    test_info (TestInfo.json when not given) is applied after loading.
+    """
+    with span('load-results', 'parse', file=os.path.basename(result_file)) as attributes:
+        summary = load_cached_summary(result_file) if use_cache else None
+        attributes['cached'] = summary is not None
+        if summary is None:
+            stat = os.stat(result_file)
+            summary = parse_results(result_file, stream=stream)
+            if use_cache:
+                store_summary(result_file, summary, stat)
+    if test_info is None:
+        test_info = load_test_info()
+    return apply_test_info(summary, test_info)
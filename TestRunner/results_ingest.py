@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Result File Ingestion
+Reads a TRX/xUnit result file once (memory-mapped when large), sniffs its encoding from
+the BOM or XML declaration, trims junk around the document by byte offset and feeds the
+buffer straight to the XML parser. Further parse attempts reuse the same buffer, so they
+cost no extra I/O or copying. The content hash used by the results cache is taken from the
+same bytes.
+"""
+
+import re
+import mmap
+import codecs
+import hashlib
+import xml.etree.ElementTree as ET
+from contextlib import contextmanager
+
+# Files at least this large are memory-mapped instead of read into memory
+MMAP_THRESHOLD_BYTES = 8 * 1024 * 1024
+
+# Chunk size used when feeding the parser, so it never needs one huge contiguous copy
+FEED_CHUNK_BYTES = 1024 * 1024
+
+BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32-le'),
+    (codecs.BOM_UTF32_BE, 'utf-32-be'),
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF16_LE, 'utf-16-le'),
+    (codecs.BOM_UTF16_BE, 'utf-16-be'),
+)
+
+XML_DECLARATION_ENCODING = re.compile(rb'<\?xml[^>]*encoding\s*=\s*["\']([A-Za-z0-9._-]+)["\']')
+
+# Encodings whose markup is not ASCII-compatible and therefore cannot be trimmed by byte search
+WIDE_ENCODINGS = ('utf-16', 'utf-32')
+
+
+class ResultDocument:
+    """A result file's bytes plus the detected encoding and the trimmed document window"""
+
+    def __init__(self, buffer, encoding, start, end, sha256=None):
+        self.buffer = buffer
+        self.encoding = encoding
+        self.start = start
+        self.end = end
+        self.sha256 = sha256  # of the file as read (before any re-encoding)
+
+    def view(self):
+        """Zero-copy view of the trimmed document"""
+        return memoryview(self.buffer)[self.start:self.end]
+
+    def text(self, encoding=None):
+        """Decode the trimmed document (used by the tokenizer fallback)"""
+        with self.view() as view:
+            return codecs.decode(view, encoding or self.encoding, errors='replace')
+
+
+class HashingReader:
+    """Binary file wrapper that hashes the bytes as a parser reads them"""
+
+    def __init__(self, f):
+        self.f = f
+        self.digest = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.digest.update(data)
+        return data
+
+    def hexdigest(self):
+        """Hash of the whole file, including anything the parser left unread"""
+        for _ in iter(lambda: self.read(FEED_CHUNK_BYTES), b''):
+            pass
+        return self.digest.hexdigest()
+
+
+def detect_encoding(buffer):
+    """Detect the encoding from a byte order mark or the XML declaration; default to UTF-8"""
+    head = bytes(buffer[:4])
+    for bom, encoding in BOMS:
+        if head.startswith(bom):
+            return encoding
+    match = XML_DECLARATION_ENCODING.search(bytes(buffer[:256]))
+    if match:
+        encoding = match.group(1).decode('ascii').lower()
+        try:
+            codecs.lookup(encoding)
+            return encoding
+        except LookupError:
+            pass
+    return 'utf-8'
+
+def bom_length(buffer):
+    head = bytes(buffer[:4])
+    for bom, _ in BOMS:
+        if head.startswith(bom):
+            return len(bom)
+    return 0
+
+def find_document_window(buffer, root_tag):
+    """Return (start, end) byte offsets of the <root_tag>...</root_tag> document.
+
+    Leading junk before the root element and anything after its last closing tag are
+    excluded. When the closing tag is missing (truncated file) the window runs to the end.
+    """
+    open_marker = b'<' + root_tag
+    close_marker = b'</' + root_tag + b'>'
+
+    start = buffer.find(open_marker)
+    if start == -1:
+        start = bom_length(buffer)
+
+    end = buffer.rfind(close_marker)
+    end = len(buffer) if end == -1 else end + len(close_marker)
+    return start, end
+
+@contextmanager
+def open_result_document(path, root_tag=b'assemblies'):
+    """Read a result file once and yield a ResultDocument for it"""
+    with open(path, 'rb') as f:
+        size = f.seek(0, 2)
+        f.seek(0)
+        mapped = None
+        if size >= MMAP_THRESHOLD_BYTES:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            buffer = mapped
+        else:
+            buffer = f.read()
+
+    try:
+        sha256 = hashlib.sha256(buffer).hexdigest()
+        encoding = detect_encoding(buffer)
+        if encoding.startswith(WIDE_ENCODINGS):
+            # Re-encode wide documents once so markers can be located by byte offset
+            buffer = codecs.decode(buffer[bom_length(buffer):], encoding, errors='replace').encode('utf-8')
+            encoding = 'utf-8'
+        start, end = find_document_window(buffer, root_tag)
+        yield ResultDocument(buffer, encoding, start, end, sha256)
+    finally:
+        if mapped is not None:
+            mapped.close()
+
+def parse_document(document, encoding=None):
+    """Feed the trimmed document to an XMLParser and return the root element"""
+    parser = ET.XMLParser(encoding=encoding or document.encoding)
+    with document.view() as view:
+        for offset in range(0, len(view), FEED_CHUNK_BYTES):
+            with view[offset:offset + FEED_CHUNK_BYTES] as chunk:
+                parser.feed(chunk)
+    return parser.close()
+
+def candidate_encodings(document):
+    """Encodings to try, in order: the detected one, then latin-1 which accepts any byte"""
+    encodings = [document.encoding]
+    if codecs.lookup(document.encoding).name != 'iso8859-1':
+        encodings.append('latin-1')
+    return encodings
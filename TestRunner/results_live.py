@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Live Results Tracking
+Follows an in-progress test run and keeps running counters plus a partial JSON summary that
+dashboards (or anything else) can poll while the run is still going.
+
+Two sources are supported:
+  - the `dotnet test` console logger stream ("  Passed Name [12 ms]" lines), line by line
+  - a growing TRX/xUnit file, fed incrementally to the resumable ResultTokenizer
+
+The summary file is rewritten atomically (temp file + rename), at most once per interval.
+"""
+
+import os
+import re
+import json
+import time
+import codecs
+from datetime import datetime
+
+from results_model import (TestRecord, OUTCOME_PASSED, OUTCOME_FAILED, OUTCOME_SKIPPED,
+                           split_test_name, record_from_token, classify_record)
+from results_tokenizer import ResultTokenizer
+
+LIVE_SUMMARY_FILE = 'live-summary.json'
+SUMMARY_INTERVAL_SECONDS = 1.0
+RECENT_FAILURES = 20
+FOLLOW_CHUNK_BYTES = 64 * 1024
+
+STATUS_RUNNING = 'running'
+STATUS_COMPLETED = 'completed'
+
+# "  Passed VaxCareApiTests.Tests.InventoryApiTests.GetInventory [245 ms]"
+CONSOLE_RESULT_LINE = re.compile(r'^\s*(Passed|Failed|Skipped)\s+(\S.*?)\s+\[([^\]]*)\]\s*$')
+CONSOLE_ERROR_MESSAGE = re.compile(r'^\s*Error Message:\s*$')
+CONSOLE_STACK_TRACE = re.compile(r'^\s*Stack Trace:\s*$')
+DURATION_PART = re.compile(r'([\d.]+)\s*(ms|h|m|s)\b')
+DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+
+
+def parse_console_duration(text):
+    """Seconds from a console logger duration such as "245 ms", "1 m 3 s" or "< 1 ms" """
+    seconds = 0.0
+    for value, unit in DURATION_PART.findall(text):
+        try:
+            seconds += float(value) * DURATION_UNITS[unit]
+        except ValueError:
+            continue
+    return seconds
+
+
+class LiveRunTracker:
+    """Running counters for an in-progress run, with a periodically rewritten JSON summary"""
+
+    def __init__(self, summary_path=None, interval=SUMMARY_INTERVAL_SECONDS, source=None):
+        self.summary_path = summary_path
+        self.interval = interval
+        self.source = source
+        self.started = datetime.now()
+        self.counts = {OUTCOME_PASSED: 0, OUTCOME_FAILED: 0, OUTCOME_SKIPPED: 0}
+        self.total = 0
+        self.duration_seconds = 0.0
+        self.last_test = None
+        self.recent_failures = []
+        self.failure_rule_counts = {}
+        self._last_write = 0.0
+
+    @property
+    def success_rate(self):
+        executed_tests = self.counts[OUTCOME_PASSED] + self.counts[OUTCOME_FAILED]
+        return round((self.counts[OUTCOME_PASSED] / executed_tests) * 100, 1) if executed_tests > 0 else 0
+
+    def add_record(self, record):
+        """Count a finished test"""
+        self.total += 1
+        self.counts[record.outcome] = self.counts.get(record.outcome, 0) + 1
+        self.duration_seconds += record.duration
+        self.last_test = record.full_name
+        if record.outcome == OUTCOME_FAILED:
+            self.recent_failures.append({
+                'name': record.full_name,
+                'duration_ms': record.duration_ms,
+                'actual_result': record.actual_result,
+                'failure_reason': record.failure_reason,
+            })
+            del self.recent_failures[:-RECENT_FAILURES]
+            if record.failure_rule:
+                self.failure_rule_counts[record.failure_rule] = self.failure_rule_counts.get(record.failure_rule, 0) + 1
+        self.maybe_write()
+
+    def to_dict(self, status=STATUS_RUNNING):
+        now = datetime.now()
+        elapsed = (now - self.started).total_seconds()
+        return {
+            'status': status,
+            'source': self.source,
+            'started': self.started.isoformat(timespec='seconds'),
+            'updated': now.isoformat(timespec='seconds'),
+            'elapsed_seconds': round(elapsed, 1),
+            'total_tests': self.total,
+            'passed_tests': self.counts[OUTCOME_PASSED],
+            'failed_tests': self.counts[OUTCOME_FAILED],
+            'skipped_tests': self.counts[OUTCOME_SKIPPED],
+            'success_rate': self.success_rate,
+            'total_duration_seconds': round(self.duration_seconds, 3),
+            'tests_per_second': round(self.total / elapsed, 2) if elapsed > 0 else 0,
+            'last_test': self.last_test,
+            'recent_failures': self.recent_failures,
+            'failure_rule_counts': self.failure_rule_counts,
+        }
+
+    def maybe_write(self):
+        """Rewrite the summary if the interval has passed since the last write"""
+        if self.summary_path and time.monotonic() - self._last_write >= self.interval:
+            self.write()
+
+    def write(self, status=STATUS_RUNNING):
+        """Atomically rewrite the partial summary"""
+        if not self.summary_path:
+            return
+        self._last_write = time.monotonic()
+        temp_file = f"{self.summary_path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(self.to_dict(status), f, indent=2)
+            os.replace(temp_file, self.summary_path)
+        except OSError as e:
+            print(f"Warning: Could not write live summary {self.summary_path}: {e}")
+
+    def finish(self):
+        self.write(STATUS_COMPLETED)
+
+    def progress_line(self):
+        return (f"{self.total} done: {self.counts[OUTCOME_PASSED]} passed, "
+                f"{self.counts[OUTCOME_FAILED]} failed, {self.counts[OUTCOME_SKIPPED]} skipped")
+
+
+class ConsoleResultParser:
+    """Turns `dotnet test` console logger lines into TestRecords.
+
+    A failed test's "Error Message:" block is collected until its "Stack Trace:" (or the
+    next result line) and classified with the failure rules.
+    """
+
+    def __init__(self, on_record):
+        self.on_record = on_record
+        self._pending = None
+        self._error_lines = None
+
+    def feed_line(self, line):
+        line = line.rstrip('\r\n')
+        match = CONSOLE_RESULT_LINE.match(line)
+        if match:
+            self.flush()
+            outcome, full_name, duration = match.groups()
+            record = TestRecord(full_name, split_test_name(full_name), outcome, parse_console_duration(duration))
+            if outcome == OUTCOME_FAILED:
+                self._pending = record
+            else:
+                self.on_record(record)
+            return
+
+        if self._pending is None:
+            return
+        if CONSOLE_ERROR_MESSAGE.match(line):
+            self._error_lines = []
+        elif CONSOLE_STACK_TRACE.match(line):
+            self.flush()
+        elif self._error_lines is not None:
+            self._error_lines.append(line.strip())
+
+    def flush(self):
+        """Emit a failed test still waiting for its error message"""
+        if self._pending is None:
+            return
+        error_text = '\n'.join(self._error_lines) if self._error_lines else None
+        classify_record(self._pending, error_text, None)
+        self.on_record(self._pending)
+        self._pending = None
+        self._error_lines = None
+
+
+def follow_file(path, tracker, is_running, poll_interval=0.5):
+    """Tail a growing TRX/xUnit file until is_running() returns False, counting each result.
+
+    The file may not exist yet when following starts. Content is decoded incrementally and
+    fed to the resumable tokenizer, so each byte is read and scanned once.
+    """
+    tokenizer = ResultTokenizer()
+    decoder = codecs.getincrementaldecoder('utf-8-sig')(errors='replace')
+    handle = None
+    try:
+        while True:
+            running = is_running()
+            if handle is None and os.path.exists(path):
+                handle = open(path, 'rb')
+            if handle is not None:
+                while True:
+                    chunk = handle.read(FOLLOW_CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    for element in tokenizer.feed(decoder.decode(chunk)):
+                        tracker.add_record(record_from_token(element))
+            if not running:
+                break
+            time.sleep(poll_interval)
+        if handle is not None:
+            for element in tokenizer.feed(decoder.decode(b'', final=True)):
+                tracker.add_record(record_from_token(element))
+    finally:
+        if handle is not None:
+            handle.close()
+    tracker.finish()
+    return tracker
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Multi-File Results Merge
+Combines the TRX/xUnit files of a sharded or multi-project run into one RunSummary.
+
+Files are parsed in a process pool (largest first, so the whole merge takes about as long
+as the largest shard) and merged in the parent. The workers are spawned, not forked: the
+runner calls this from its stage threads, and forking a process with several threads can
+copy a lock another thread holds into the child, which then deadlocks.
+  - retried tests are de-duplicated by full name; the latest attempt wins
+  - the run time windows are unioned (earliest start to latest finish)
+  - counts are recomputed from the merged records
+"""
+
+import os
+import glob
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from results_model import RunSummary, parse_trx_timestamp, apply_test_info, load_test_info
+from results_cache import load_results, CACHE_SUFFIX
+import pipeline_trace
+
+FORMAT_MIXED = 'mixed'
+
+
+def expand_result_paths(patterns):
+    """Expand file paths, glob patterns and comma-separated lists into existing result files"""
+    if isinstance(patterns, str):
+        patterns = [patterns]
+
+    paths = []
+    for pattern in patterns:
+        for part in pattern.split(','):
+            part = part.strip()
+            if not part:
+                continue
+            matches = glob.glob(part, recursive=True) if glob.has_magic(part) else [part]
+            for path in sorted(matches):
+                if path.endswith(CACHE_SUFFIX) or not os.path.isfile(path):
+                    continue
+                if path not in paths:
+                    paths.append(path)
+    return paths
+
+def _load_summary_dict(path, use_cache, stream):
+    """Worker: parse one file and return it in the compact serialized form (with the spans
+    recorded while parsing it, for the parent's trace)"""
+    position = pipeline_trace.mark()
+    summary = load_results(path, test_info={}, use_cache=use_cache, stream=stream)
+    data = summary.to_dict()
+    data['trace_events'] = pipeline_trace.events_since(position)
+    return data
+
+def _sort_key(summary):
+    """Order runs by when they happened, so later attempts override earlier ones"""
+    for value in (summary.run_start, summary.run_finish):
+        if value:
+            try:
+                return (parse_trx_timestamp(value).timestamp(), summary.source_path or '')
+            except ValueError:
+                pass
+    try:
+        return (os.path.getmtime(summary.source_path), summary.source_path)
+    except (OSError, TypeError):
+        return (0, summary.source_path or '')
+
+def _window_edge(values, pick):
+    """Earliest (pick=min) or latest (pick=max) of some TRX timestamps, as the original string"""
+    parsed = []
+    for value in values:
+        if not value:
+            continue
+        try:
+            parsed.append((parse_trx_timestamp(value), value))
+        except ValueError:
+            continue
+    return pick(parsed)[1] if parsed else None
+
+def merge_summaries(summaries):
+    """Merge several RunSummary objects into one"""
+    summaries = sorted(summaries, key=_sort_key)
+
+    # Later attempts replace earlier ones but keep the position of the first occurrence
+    records_by_name = {}
+    for summary in summaries:
+        for record in summary.records:
+            records_by_name[record.full_name] = record
+    records = list(records_by_name.values())
+
+    formats = {summary.source_format for summary in summaries}
+    source_format = formats.pop() if len(formats) == 1 else FORMAT_MIXED
+
+    run_start = _window_edge([summary.run_start for summary in summaries], min)
+    run_finish = _window_edge([summary.run_finish for summary in summaries], max)
+
+    # Without run windows the shards are assumed to have run side by side
+    declared = [summary.declared_runtime for summary in summaries if summary.declared_runtime is not None]
+    declared_runtime = max(declared) if declared else None
+
+    merged = RunSummary(records, source_format, None, run_start, run_finish, declared_runtime)
+    merged.merged_from = [summary.source_path for summary in summaries]
+    merged.duplicates_dropped = sum(len(summary.records) for summary in summaries) - len(records)
+    return merged
+
+def load_merged_results(patterns, test_info=None, use_cache=True, stream=True, max_workers=None):
+    """Parse every file matched by patterns (in parallel) and merge them into one RunSummary.
+
+    A single file is parsed in-process. test_info (TestInfo.json when not given) is applied
+    once to the merged records.
+    """
+    paths = expand_result_paths(patterns)
+    if not paths:
+        raise FileNotFoundError(f"No result files match: {patterns}")
+
+    if len(paths) == 1:
+        return load_results(paths[0], test_info=test_info, use_cache=use_cache, stream=stream)
+
+    # Largest files first so the longest parse starts immediately
+    paths.sort(key=os.path.getsize, reverse=True)
+    workers = min(len(paths), max_workers or os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = [executor.submit(_load_summary_dict, path, use_cache, stream) for path in paths]
+        summaries = []
+        for future in futures:
+            data = future.result()
+            pipeline_trace.add_events(data.pop('trace_events', []))
+            summaries.append(RunSummary.from_dict(data))
+
+    merged = merge_summaries(summaries)
+    if test_info is None:
+        test_info = load_test_info()
+    return apply_test_info(merged, test_info)
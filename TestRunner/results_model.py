@@ -0,0 +1,596 @@
+#!/usr/bin/env python3
+"""
+Canonical Test Results Model
+Shared parser and compact per-test records used by every TestRunner script.
+
+A run is parsed once into a RunSummary holding slotted TestRecord objects.
+Both TRX (Visual Studio) and xUnit v2 XML result files are accepted by parse_results.
+"""
+
+import os
+import json
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from functools import cached_property, lru_cache
+
+from results_ingest import open_result_document, parse_document, candidate_encodings, HashingReader
+from results_tokenizer import scan_results
+from failure_rules import classify_failure
+from inference_rules import infer_test_info
+from pipeline_trace import span
+
+TRX_NS = '{http://microsoft.com/schemas/VisualStudio/TeamTest/2010}'
+
+OUTCOME_PASSED = 'Passed'
+OUTCOME_FAILED = 'Failed'
+OUTCOME_SKIPPED = 'Skipped'
+
+# xUnit result attribute values mapped onto the TRX outcome vocabulary
+XUNIT_OUTCOMES = {
+    'Pass': OUTCOME_PASSED,
+    'Fail': OUTCOME_FAILED,
+    'Skip': OUTCOME_SKIPPED,
+}
+
+STATUS_ICONS = {
+    OUTCOME_PASSED: '&#10004;',
+    OUTCOME_FAILED: '&#10008;',
+}
+DEFAULT_STATUS_ICON = '&#9193;'
+
+FORMAT_TRX = 'trx'
+FORMAT_XUNIT = 'xunit'
+
+
+class TestRecord:
+    """Compact record of a single test result"""
+
+    __slots__ = (
+        'full_name',
+        'class_name',
+        'outcome',
+        'duration',
+        'description',
+        'test_type',
+        'endpoint',
+        'expected_result',
+        'actual_result',
+        'failure_reason',
+        'failure_rule',
+    )
+
+    def __init__(self, full_name, class_name, outcome, duration=0.0, description='', test_type='',
+                 endpoint='', expected_result='', actual_result='', failure_reason='', failure_rule=''):
+        self.full_name = full_name
+        self.class_name = class_name
+        self.outcome = outcome
+        self.duration = duration  # seconds
+        self.description = description
+        self.test_type = test_type
+        self.endpoint = endpoint
+        self.expected_result = expected_result
+        self.actual_result = actual_result
+        self.failure_reason = failure_reason
+        self.failure_rule = failure_rule  # id of the failure rule that classified this test
+
+    @property
+    def name(self):
+        """Display name: the method part of the full name with underscores as spaces"""
+        return self.full_name.split('.')[-1].replace('_', ' ')
+
+    @property
+    def duration_ms(self):
+        return round(self.duration * 1000, 2)
+
+    @property
+    def status_icon(self):
+        return STATUS_ICONS.get(self.outcome, DEFAULT_STATUS_ICON)
+
+    def to_list(self):
+        """Serialize as a compact list in __slots__ order"""
+        return [getattr(self, field) for field in self.__slots__]
+
+    @classmethod
+    def from_list(cls, values):
+        return cls(*values)
+
+    def __repr__(self):
+        return f"TestRecord({self.full_name!r}, {self.outcome!r}, {self.duration!r})"
+
+
+class RunSummary:
+    """Parsed test run with lazily computed aggregates"""
+
+    def __init__(self, records, source_format, source_path=None, run_start=None, run_finish=None,
+                 declared_runtime=None):
+        self.records = records
+        self.source_format = source_format
+        self.source_path = source_path
+        self.run_start = run_start
+        self.run_finish = run_finish
+        self.declared_runtime = declared_runtime
+        self.merged_from = []         # source files when several runs were merged
+        self.duplicates_dropped = 0   # retried results replaced by a later attempt
+        self.source_sha256 = None     # content hash of the parsed file, taken while reading it
+
+    @cached_property
+    def outcome_counts(self):
+        counts = {}
+        for record in self.records:
+            counts[record.outcome] = counts.get(record.outcome, 0) + 1
+        return counts
+
+    @property
+    def total_tests(self):
+        return len(self.records)
+
+    @property
+    def passed_tests(self):
+        return self.outcome_counts.get(OUTCOME_PASSED, 0)
+
+    @property
+    def failed_tests(self):
+        return self.outcome_counts.get(OUTCOME_FAILED, 0)
+
+    @property
+    def skipped_tests(self):
+        return self.outcome_counts.get(OUTCOME_SKIPPED, 0)
+
+    @property
+    def executed_tests(self):
+        """Number of tests that were not skipped (the robust report's total)"""
+        return self.total_tests - self.skipped_tests
+
+    @property
+    def success_rate(self):
+        """Success rate excluding skipped tests from the denominator"""
+        executed_tests = self.passed_tests + self.failed_tests
+        return round((self.passed_tests / executed_tests) * 100, 1) if executed_tests > 0 else 0
+
+    @property
+    def pass_rate(self):
+        """Passed tests out of all tests, skipped included (the Teams card's success rate)"""
+        return round((self.passed_tests / self.total_tests) * 100, 1) if self.total_tests > 0 else 0
+
+    @cached_property
+    def total_duration_seconds(self):
+        """Sum of the individual test durations"""
+        return sum(record.duration for record in self.records)
+
+    @cached_property
+    def total_runtime_seconds(self):
+        """Wall time of the run from the run window or declared time; 0 when the result file records neither"""
+        runtime = calculate_runtime(self.run_start, self.run_finish)
+        if runtime is not None:
+            return runtime
+        if self.declared_runtime is not None:
+            return self.declared_runtime
+        return 0
+
+    @cached_property
+    def reported_tests(self):
+        """Records shown in reports (skipped tests are excluded)"""
+        return [record for record in self.records if record.outcome != OUTCOME_SKIPPED]
+
+    @cached_property
+    def failure_rule_counts(self):
+        """How often each failure rule fired in this run"""
+        counts = {}
+        for record in self.records:
+            if record.failure_rule:
+                counts[record.failure_rule] = counts.get(record.failure_rule, 0) + 1
+        return counts
+
+    @property
+    def failed_records(self):
+        return [record for record in self.records if record.outcome == OUTCOME_FAILED]
+
+    def to_dict(self):
+        """Serialize to a JSON-compatible dictionary"""
+        return {
+            'source_format': self.source_format,
+            'source_path': self.source_path,
+            'run_start': self.run_start,
+            'run_finish': self.run_finish,
+            'declared_runtime': self.declared_runtime,
+            'fields': list(TestRecord.__slots__),
+            'records': [record.to_list() for record in self.records],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('fields') != list(TestRecord.__slots__):
+            raise ValueError("Serialized record layout does not match TestRecord")
+        return cls(
+            [TestRecord.from_list(values) for values in data['records']],
+            data['source_format'],
+            data.get('source_path'),
+            data.get('run_start'),
+            data.get('run_finish'),
+            data.get('declared_runtime'),
+        )
+
+
+def parse_trx_timestamp(value):
+    """Parse a TRX timestamp, trimming the 7-digit fractional seconds to what fromisoformat accepts"""
+    # Fix datetime format by limiting microseconds precision
+    return datetime.fromisoformat(value[:26] + value[-6:])
+
+def calculate_runtime(start_attr, finish_attr):
+    """Seconds between two TRX timestamps, or None when they are missing or malformed"""
+    if not start_attr or not finish_attr:
+        return None
+    try:
+        return (parse_trx_timestamp(finish_attr) - parse_trx_timestamp(start_attr)).total_seconds()
+    except ValueError:
+        return None
+
+def parse_duration_seconds(duration):
+    """Convert a TRX duration like "00:00:00.1234567" (or plain seconds) to seconds"""
+    try:
+        if ':' in duration:
+            parts = duration.split(':')
+            hours = float(parts[0])
+            minutes = float(parts[1])
+            seconds = float(parts[2])
+            return hours * 3600 + minutes * 60 + seconds
+        return float(duration)
+    except (ValueError, IndexError, TypeError):
+        return 0.0
+
+def split_test_name(test_name):
+    """Return the class name part of a fully qualified test name"""
+    if '.' in test_name:
+        return test_name.split('.')[-2]
+    return 'Unknown'
+
+def class_from_type(test_type):
+    """Return the class name from an xUnit type attribute"""
+    if test_type and '.' in test_type:
+        return test_type.split('.')[-1]
+    return test_type if test_type else 'Unknown'
+
+def classify_record(record, error_text, output_text):
+    """Fill in actual result, failure reason and the rule that fired for a failed test"""
+    record.actual_result, record.failure_reason, record.failure_rule = classify_failure(error_text, output_text)
+
+def apply_definition(record, method_name):
+    """Fill in expected result and endpoint from the test definition name"""
+    record.expected_result, record.endpoint = infer_test_info(method_name, record.class_name)
+
+# TestInfo.json is looked up in the working directory, then in the project root
+TEST_INFO_FILE = "TestInfo.json"
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def find_test_info_file():
+    for directory in (os.getcwd(), PROJECT_ROOT):
+        test_info_path = os.path.join(directory, TEST_INFO_FILE)
+        if os.path.exists(test_info_path):
+            return test_info_path
+    return None
+
+@lru_cache(maxsize=8)
+def _read_test_info(test_info_path, mtime_ns):
+    with open(test_info_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+        return data.get('testInfo', {})
+
+def load_test_info(path=None):
+    """Load per-test descriptions from TestInfo.json (keyed by fully qualified test name).
+
+    The file is read once per process (again only if it changes).
+    """
+    try:
+        test_info_path = path or find_test_info_file()
+        if test_info_path and os.path.exists(test_info_path):
+            return _read_test_info(test_info_path, os.stat(test_info_path).st_mtime_ns)
+    except Exception as e:
+        print(f"Warning: Could not load test info: {e}")
+    return {}
+
+def apply_test_info(summary, test_info):
+    """Overlay TestInfo.json entries onto the parsed records; TestInfo wins over inferred values"""
+    if not test_info:
+        return summary
+    for record in summary.records:
+        info = test_info.get(record.full_name)
+        if not info:
+            continue
+        record.description = info.get('description', '') or record.description
+        record.test_type = info.get('testType', '') or record.test_type
+        record.endpoint = info.get('endpoint', '') or record.endpoint
+        record.expected_result = info.get('expectedResult', '') or record.expected_result
+    return summary
+
+# ---------------------------------------------------------------------------
+# TRX parsing
+# ---------------------------------------------------------------------------
+
+def _trx_failure_texts(result):
+    """Return the ErrorInfo message and StdOut text of a UnitTestResult element"""
+    error_text = None
+    output_text = None
+    output_elem = result.find(f'.//{TRX_NS}Output')
+    if output_elem is not None:
+        error_info_elem = output_elem.find(f'.//{TRX_NS}ErrorInfo')
+        if error_info_elem is not None:
+            message_elem = error_info_elem.find(f'.//{TRX_NS}Message')
+            if message_elem is not None:
+                error_text = message_elem.text
+        stdout_elem = output_elem.find(f'.//{TRX_NS}StdOut')
+        if stdout_elem is not None:
+            output_text = stdout_elem.text
+    return error_text, output_text
+
+def build_trx_record(result):
+    """Build a TestRecord from a UnitTestResult element (without definition info)"""
+    test_name = result.get('testName', 'Unknown Test')
+    outcome = result.get('outcome', 'Unknown')
+    record = TestRecord(
+        full_name=test_name,
+        class_name=split_test_name(test_name),
+        outcome=outcome,
+        duration=parse_duration_seconds(result.get('duration', '0')),
+    )
+    if outcome == OUTCOME_FAILED:
+        classify_record(record, *_trx_failure_texts(result))
+    return record
+
+def index_test_definitions(root):
+    """Build testId -> UnitTest definition and executionId -> testId maps in a single pass"""
+    definitions_by_id = {}
+    test_ids_by_execution = {}
+
+    test_definitions = root.find(f'{TRX_NS}TestDefinitions')
+    if test_definitions is not None:
+        for test_def in test_definitions.iter(f'{TRX_NS}UnitTest'):
+            definitions_by_id[test_def.get('id')] = test_def
+
+    test_entries = root.find(f'{TRX_NS}TestEntries')
+    if test_entries is not None:
+        for test_entry in test_entries.iter(f'{TRX_NS}TestEntry'):
+            test_ids_by_execution[test_entry.get('executionId')] = test_entry.get('testId')
+
+    return definitions_by_id, test_ids_by_execution
+
+def resolve_test_id(result, test_ids_by_execution):
+    """Return the testId of a result, falling back to the TestEntries executionId map"""
+    test_id = result.get('testId')
+    if test_id is None:
+        test_id = test_ids_by_execution.get(result.get('executionId'))
+    return test_id
+
+def parse_trx_tree(trx_file):
+    """Parse a TRX file into a RunSummary using a fully loaded element tree"""
+    with open(trx_file, 'rb') as f:
+        reader = HashingReader(f)
+        root = ET.parse(reader).getroot()
+        source_sha256 = reader.hexdigest()
+
+    # Index definitions once so the result/definition join is linear in the number of tests
+    definitions_by_id, test_ids_by_execution = index_test_definitions(root)
+
+    records = []
+    for result in root.iter(f'{TRX_NS}UnitTestResult'):
+        record = build_trx_record(result)
+        test_def = definitions_by_id.get(resolve_test_id(result, test_ids_by_execution))
+        if test_def is not None:
+            apply_definition(record, test_def.get('name', ''))
+        records.append(record)
+
+    run_start = run_finish = None
+    times_elem = root.find(f'.//{TRX_NS}Times')
+    if times_elem is not None:
+        run_start = times_elem.get('start')
+        run_finish = times_elem.get('finish')
+
+    summary = RunSummary(records, FORMAT_TRX, trx_file, run_start, run_finish)
+    summary.source_sha256 = source_sha256
+    return summary
+
+def parse_trx_stream(trx_file):
+    """Parse a TRX file incrementally with iterparse, keeping memory bounded for very large files.
+
+    Each UnitTestResult becomes a record as soon as its end tag is seen and is then detached
+    from the tree, so the (potentially huge) StdOut of finished tests is released immediately.
+    Definitions usually follow the results in a TRX file, so only the small testId -> name
+    maps are kept until the end of the document.
+    """
+    records = []
+    result_ids = []
+    definition_names = {}
+    test_ids_by_execution = {}
+    run_start = run_finish = None
+
+    # Elements that are consumed and then detached from their parent
+    consumed_tags = {
+        f'{TRX_NS}UnitTestResult',
+        f'{TRX_NS}UnitTest',
+        f'{TRX_NS}TestEntry',
+    }
+
+    parents = []
+    with open(trx_file, 'rb') as f:
+        reader = HashingReader(f)
+        for event, elem in ET.iterparse(reader, events=('start', 'end')):
+            if event == 'start':
+                parents.append(elem)
+                continue
+
+            parents.pop()
+            tag = elem.tag
+
+            if tag == f'{TRX_NS}UnitTestResult':
+                records.append(build_trx_record(elem))
+                result_ids.append((elem.get('testId'), elem.get('executionId')))
+            elif tag == f'{TRX_NS}UnitTest':
+                definition_names[elem.get('id')] = elem.get('name', '')
+            elif tag == f'{TRX_NS}TestEntry':
+                test_ids_by_execution[elem.get('executionId')] = elem.get('testId')
+            elif tag == f'{TRX_NS}Times':
+                run_start = elem.get('start')
+                run_finish = elem.get('finish')
+
+            if tag in consumed_tags:
+                elem.clear()
+                if parents:
+                    parents[-1].remove(elem)
+        source_sha256 = reader.hexdigest()
+
+    # Join results with their definitions now that the whole document has been seen
+    for record, (test_id, execution_id) in zip(records, result_ids):
+        if test_id is None:
+            test_id = test_ids_by_execution.get(execution_id)
+        if test_id in definition_names:
+            apply_definition(record, definition_names[test_id])
+
+    summary = RunSummary(records, FORMAT_TRX, trx_file, run_start, run_finish)
+    summary.source_sha256 = source_sha256
+    return summary
+
+# ---------------------------------------------------------------------------
+# xUnit parsing
+# ---------------------------------------------------------------------------
+
+def build_xunit_record(test):
+    """Build a TestRecord from an xUnit <test> element"""
+    test_name = test.get('name', 'Unknown Test')
+    result = test.get('result', 'Unknown')
+    try:
+        duration = float(test.get('time', 0))
+    except ValueError:
+        duration = 0.0
+
+    record = TestRecord(
+        full_name=test_name,
+        class_name=class_from_type(test.get('type', 'Unknown')),
+        outcome=XUNIT_OUTCOMES.get(result, result),
+        duration=duration,
+    )
+    apply_definition(record, test_name)
+
+    if record.outcome == OUTCOME_FAILED:
+        message_elem = test.find('failure/message')
+        output_elem = test.find('output')
+        classify_record(
+            record,
+            message_elem.text if message_elem is not None else None,
+            output_elem.text if output_elem is not None else None,
+        )
+    return record
+
+def extract_from_xunit_tree(tree, xml_file=None):
+    """Extract a RunSummary from a parsed xUnit <assemblies> tree"""
+    records = [build_xunit_record(test) for test in tree.iter('test')]
+
+    # Fall back to TRX elements without a namespace (hand-edited or repaired files)
+    if not records:
+        for result in tree.iter('UnitTestResult'):
+            test_name = result.get('testName', 'Unknown Test')
+            records.append(TestRecord(
+                full_name=test_name,
+                class_name=split_test_name(test_name),
+                outcome=result.get('outcome', 'Unknown'),
+                duration=parse_duration_seconds(result.get('duration', '0')),
+            ))
+
+    declared_runtime = None
+    assembly_times = [assembly.get('time') for assembly in tree.iter('assembly') if assembly.get('time')]
+    if assembly_times:
+        try:
+            declared_runtime = sum(float(value) for value in assembly_times)
+        except ValueError:
+            declared_runtime = None
+
+    return RunSummary(records, FORMAT_XUNIT, xml_file, declared_runtime=declared_runtime)
+
+def record_from_token(element):
+    """Build a TestRecord from a tokenizer result element (xUnit <test> or TRX <UnitTestResult>)"""
+    if element['_format'] == 'trx':
+        test_name = element.get('testName', 'Unknown Test')
+        record = TestRecord(
+            full_name=test_name,
+            class_name=split_test_name(test_name),
+            outcome=element.get('outcome', 'Unknown'),
+            duration=parse_duration_seconds(element.get('duration', '0')),
+        )
+    else:
+        test_name = element.get('name', 'Unknown Test')
+        try:
+            duration = float(element.get('time', 0))
+        except ValueError:
+            duration = 0.0
+        result = element.get('result', 'Unknown')
+        record = TestRecord(
+            full_name=test_name,
+            class_name=class_from_type(element.get('type', 'Unknown')),
+            outcome=XUNIT_OUTCOMES.get(result, result),
+            duration=duration,
+        )
+
+    apply_definition(record, test_name)
+    if record.outcome == OUTCOME_FAILED:
+        classify_record(record, element.get('_message'), element.get('_output'))
+    return record
+
+def parse_with_tokenizer(xml_file, content=None, source_sha256=None):
+    """Parse broken or truncated xUnit/TRX content with the single-pass fallback tokenizer"""
+    with span('parse-tokenizer', 'parse', file=os.path.basename(xml_file)) as attributes:
+        if content is None:
+            with open_result_document(xml_file) as document:
+                content = document.text()
+                source_sha256 = document.sha256
+        elements = scan_results(content)
+        source_format = FORMAT_TRX if elements and elements[0]['_format'] == FORMAT_TRX else FORMAT_XUNIT
+        attributes['tests'] = len(elements)
+        summary = RunSummary([record_from_token(element) for element in elements], source_format, xml_file)
+        summary.source_sha256 = source_sha256
+        return summary
+
+def parse_xunit(xml_file):
+    """Parse an xUnit XML file with multiple fallback methods.
+
+    The file is read once; every parse attempt (detected encoding, then latin-1, then the
+    tokenizer fallback) works on the same trimmed buffer.
+    """
+    with open_result_document(xml_file) as document:
+        for encoding in candidate_encodings(document):
+            try:
+                with span('parse-xunit', 'parse', file=os.path.basename(xml_file), encoding=encoding):
+                    summary = extract_from_xunit_tree(parse_document(document, encoding), xml_file)
+                summary.source_sha256 = document.sha256
+                return summary
+            except ET.ParseError:
+                continue
+        content = document.text()
+
+    return parse_with_tokenizer(xml_file, content, document.sha256)
+
+# ---------------------------------------------------------------------------
+# Entry point
+# ---------------------------------------------------------------------------
+
+def detect_format(path):
+    """Detect whether a result file is TRX or xUnit XML from its leading bytes"""
+    with open(path, 'rb') as f:
+        head = f.read(4096)
+    if b'<TestRun' in head or path.lower().endswith('.trx'):
+        return FORMAT_TRX
+    return FORMAT_XUNIT
+
+def parse_results(path, stream=True, test_info=None):
+    """Parse a TRX or xUnit result file into a RunSummary.
+
+    TRX files are streamed by default; pass stream=False to load the full tree instead.
+    test_info (from load_test_info) overlays descriptions and endpoints when given.
+    """
+    if detect_format(path) == FORMAT_TRX:
+        try:
+            with span('parse-trx-stream' if stream else 'parse-trx-tree', 'parse', file=os.path.basename(path)):
+                summary = parse_trx_stream(path) if stream else parse_trx_tree(path)
+        except ET.ParseError:
+            # Truncated or otherwise broken TRX (e.g. the test host crashed mid-write)
+            summary = parse_with_tokenizer(path)
+    else:
+        summary = parse_xunit(path)
+    return apply_test_info(summary, test_info)
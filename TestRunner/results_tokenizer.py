@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Fallback Result Tokenizer
+Single-pass tag scanner for broken or truncated xUnit/TRX files.
+
+Collects every attribute of each <test> / <UnitTestResult> element together with its
+nested failure message and captured output, regardless of attribute order. The scanner
+is resumable: content can be fed in pieces (e.g. while a results file is still growing)
+and only complete tags are consumed.
+"""
+
+import re
+import html
+
+TAG_PATTERN = re.compile(
+    r'<!\[CDATA\[.*?\]\]>'                                   # CDATA section (text)
+    r'|<!--.*?-->'                                          # comment
+    r'|<(/?)([A-Za-z_][\w:.-]*)((?:[^>"\']|"[^"]*"|\'[^\']*\')*)>',  # start, end or empty tag
+    re.S,
+)
+ATTRIBUTE_PATTERN = re.compile(r'([A-Za-z_][\w:.-]*)\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+
+# Result element name -> source format
+RESULT_ELEMENTS = {
+    'test': 'xunit',
+    'UnitTestResult': 'trx',
+}
+
+# Nested elements whose text is captured, by the key they are stored under
+TEXT_ELEMENTS = {
+    'message': 'message',    # xUnit <failure><message>
+    'Message': 'message',    # TRX <ErrorInfo><Message>
+    'output': 'output',      # xUnit <output>
+    'StdOut': 'output',      # TRX <Output><StdOut>
+}
+
+
+def _local_name(tag):
+    return tag.rsplit(':', 1)[-1]
+
+def parse_attributes(attribute_text):
+    """Parse all attributes of a tag into a dict, in any order"""
+    attributes = {}
+    for match in ATTRIBUTE_PATTERN.finditer(attribute_text):
+        value = match.group(2) if match.group(2) is not None else match.group(3)
+        attributes[match.group(1)] = html.unescape(value)
+    return attributes
+
+def _element_text(raw):
+    """Decode captured element content: unwrap CDATA, drop nested tags, unescape entities"""
+    parts = []
+    position = 0
+    for match in TAG_PATTERN.finditer(raw):
+        parts.append(html.unescape(raw[position:match.start()]))
+        token = match.group(0)
+        if token.startswith('<![CDATA['):
+            parts.append(token[9:-3])
+        position = match.end()
+    parts.append(html.unescape(raw[position:]))
+    return ''.join(parts)
+
+
+class ResultTokenizer:
+    """Resumable single-pass scanner producing one dict per result element.
+
+    Each emitted dict holds the element's attributes plus:
+      '_format'    -> 'xunit' or 'trx'
+      '_message'   -> failure message text (when present)
+      '_output'    -> captured output text (when present)
+      '_truncated' -> True when the file ended before the element was closed
+    """
+
+    def __init__(self):
+        self._buffer = ''
+        self._position = 0
+        self._current = None
+        self._capture_name = None
+        self._capture_key = None
+        self._capture_start = None
+        self._results = []
+
+    def feed(self, content):
+        """Consume more content; returns the result elements completed by it"""
+        self._buffer += content
+        buffer = self._buffer
+        for match in TAG_PATTERN.finditer(buffer, self._position):
+            closing, name, attribute_text = match.group(1), match.group(2), match.group(3)
+            self._position = match.end()
+            if name is None:
+                continue  # comment or CDATA outside of a captured element
+            self._handle_tag(closing == '/', _local_name(name), attribute_text or '', match, buffer)
+        self._compact()
+        return self._drain()
+
+    def close(self):
+        """Finish scanning; an element left open by a truncated file is still emitted"""
+        if self._current is not None:
+            if self._capture_key is not None:
+                self._current['_' + self._capture_key] = _element_text(self._buffer[self._capture_start:])
+            self._current['_truncated'] = True
+            self._results.append(self._current)
+            self._current = None
+        self._buffer = ''
+        self._position = 0
+        return self._drain()
+
+    def _handle_tag(self, is_closing, name, attribute_text, match, buffer):
+        is_empty = attribute_text.rstrip().endswith('/')
+        if is_empty:
+            attribute_text = attribute_text.rstrip()[:-1]
+
+        if self._capture_key is not None:
+            # Inside a captured element only its own end tag matters
+            if is_closing and name == self._capture_name:
+                self._current['_' + self._capture_key] = _element_text(buffer[self._capture_start:match.start()])
+                self._capture_name = self._capture_key = self._capture_start = None
+            return
+
+        if name in RESULT_ELEMENTS:
+            if is_closing:
+                if self._current is not None:
+                    self._results.append(self._current)
+                    self._current = None
+                return
+            if self._current is not None:
+                # A new result started before the previous one was closed
+                self._current['_truncated'] = True
+                self._results.append(self._current)
+            element = parse_attributes(attribute_text)
+            element['_format'] = RESULT_ELEMENTS[name]
+            if is_empty:
+                self._results.append(element)
+                self._current = None
+            else:
+                self._current = element
+            return
+
+        if self._current is not None and not is_closing and not is_empty and name in TEXT_ELEMENTS:
+            key = TEXT_ELEMENTS[name]
+            if '_' + key not in self._current:
+                self._capture_name = name
+                self._capture_key = key
+                self._capture_start = match.end()
+
+    def _compact(self):
+        """Drop consumed content, keeping any text still being captured"""
+        keep_from = self._position if self._capture_start is None else self._capture_start
+        if keep_from:
+            self._buffer = self._buffer[keep_from:]
+            self._position -= keep_from
+            if self._capture_start is not None:
+                self._capture_start -= keep_from
+
+    def _drain(self):
+        results, self._results = self._results, []
+        return results
+
+
+def scan_results(content):
+    """Scan a complete (possibly broken) document and return all result element dicts"""
+    tokenizer = ResultTokenizer()
+    results = tokenizer.feed(content)
+    results.extend(tokenizer.close())
+    return results
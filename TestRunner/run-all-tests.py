@@ -8,108 +8,426 @@ import os
 import sys
 import subprocess
 import argparse
-from datetime import datetime
+import glob
+import time
+import threading
 import shutil
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from results_live import LiveRunTracker, ConsoleResultParser, LIVE_SUMMARY_FILE
+from shard_planner import (discover_tests, load_duration_history, estimate_durations,
+                           plan_by_category, plan_by_duration, minimal_test_filter)
+from results_merge import expand_result_paths, load_merged_results, merge_summaries
+from results_model import OUTCOME_FAILED
+import build_fingerprint
+import report_pipeline
+import impact_analysis
+import preflight
+import pipeline_trace
+from pipeline_trace import span, traced
+from environment_matrix import EnvironmentRun, parse_environments, write_comparison_report
+from report_manifest import (ReportManifest, new_run_id, summary_counts, HTML_ARTIFACTS, ARTIFACT_TRX,
+                             ARTIFACT_XML, ARTIFACT_TRACE, ARTIFACT_PREFLIGHT, WATCH_RUN_DIR)
+from run_directory import RunDirectory, runs_dir
+from report_retention import RetentionPolicy, apply_retention, DEFAULT_KEEP_RUNS, RETENTION_LOG_FILE
+from watch_mode import SourceWatcher, publish_report, WATCH_PATTERNS, WATCH_REPORT_FILE, WATCH_RESULTS_FILE
+from command_runner import run_streaming, CommandResult
+from stage_scheduler import Stage, StageScheduler, DEFAULT_STAGE_TIMEOUT
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TESTS_DIR = os.path.join(PROJECT_ROOT, "Tests")
+# Test output lines shown when a command or shard fails (the full output is in its log)
+ERROR_TAIL_LINES = 40
+TEST_LOG_NAME = "dotnet-test.log"
+# --rerun-failed without a file: the latest run under the output directory
+RERUN_LATEST = "latest"
+RERUN_SUFFIX = "_rerun"
+PDF_SCRIPT = os.path.join(PROJECT_ROOT, "temp_unused_files", "generate-pdf-from-html.py")
+
 def safe_print(text):
     """Safely print text that may contain Unicode characters"""
     try:
-        print(text)
+        print(text, flush=True)
     except UnicodeEncodeError:
         # Fallback for Windows Command Prompt
-        print(text.encode('ascii', 'replace').decode('ascii'))
+        print(text.encode('ascii', 'replace').decode('ascii'), flush=True)
 
-def run_command(command, description):
-    """Run a command and return the result"""
-    safe_print(f"🔄 {description}...")
-    try:
-        result = subprocess.run(command, shell=True, capture_output=True, text=True, check=True)
-        safe_print(f"✅ {description} completed successfully")
-        return True, result.stdout, result.stderr
-    except subprocess.CalledProcessError as e:
-        safe_print(f"❌ {description} failed with exit code {e.returncode}")
-        safe_print(f"Error: {e.stderr}")
-        return False, e.stdout, e.stderr
-
-def run_command_with_env(command, description, env_vars=None):
-    """Run a command with environment variables and return the result"""
+def echo_line(line):
+    safe_print(line.rstrip('\r\n'))
+
+def run_command(command, description, env_vars=None, log_path=None, echo=False, on_line=()):
+    """Run a command, streaming its output (stdout and stderr merged) line by line.
+
+    Lines are echoed live with echo=True and passed to the on_line callbacks; with log_path
+    the full output goes straight to that file. Only the last lines are kept in memory.
+    Returns (success, output tail).
+    """
     safe_print(f"🔄 {description}...")
-    try:
+    env = None
+    if env_vars:
         # Merge with current environment
         env = os.environ.copy()
-        if env_vars:
-            env.update(env_vars)
-        
-        result = subprocess.run(command, shell=True, capture_output=True, text=True, check=True, env=env)
+        env.update(env_vars)
+    
+    callbacks = ([echo_line] if echo else []) + list(on_line)
+    result = run_streaming(command, callbacks, env=env, log_path=log_path)
+    if result.success:
         safe_print(f"✅ {description} completed successfully")
-        return True, result.stdout, result.stderr
-    except subprocess.CalledProcessError as e:
-        safe_print(f"❌ {description} failed with exit code {e.returncode}")
-        safe_print(f"Error: {e.stderr}")
-        return False, e.stdout, e.stderr
+        return True, result.output
+    safe_print(f"❌ {description} failed with exit code {result.returncode}")
+    if not echo:
+        safe_print(f"Error (last lines of output):\n{result.tail_text(ERROR_TAIL_LINES)}")
+    return False, result.output
+
+@traced('test')
+def run_test_command(command, env_vars=None, summary_path=None, log_path=None, progress_interval=10):
+    """Run `dotnet test` with its console output shown live.
+
+    Each line also goes to the full log file and to the console result parser, which keeps
+    pass/fail/skip counters (and, with --live, the partial JSON summary) up to date.
+    """
+    tracker = LiveRunTracker(summary_path, source='console')
+    if summary_path:
+        tracker.write()
+    parser = ConsoleResultParser(tracker.add_record)
+    last_progress = time.monotonic()
+
+    def report_progress(line):
+        nonlocal last_progress
+        if time.monotonic() - last_progress >= progress_interval:
+            safe_print(f"📈 {tracker.progress_line()}")
+            last_progress = time.monotonic()
+
+    success, output = run_command(command, "Running tests", env_vars, log_path=log_path, echo=True,
+                                  on_line=[parser.feed_line, report_progress])
+    parser.flush()
+    tracker.finish()
+    safe_print(f"📈 {tracker.progress_line()}")
+    return success, output
+
+@traced('plan-shards')
+def plan_shards(args, output_dir):
+    """Disjoint shards for --parallel-categories / --shards N, or None for a single run.
+
+    Shard sizes are predicted from the test durations in previous TRX files under output_dir;
+    --shards N balances individual tests across shards with LPT scheduling.
+    """
+    if not args:
+        return None
+    by_category = getattr(args, 'parallel_categories', False)
+    shard_count = getattr(args, 'shards', None) or 0
+    if not by_category and shard_count < 2:
+        return None
+
+    discovered = discover_tests(TESTS_DIR)
+    history, files_read = load_duration_history(output_dir)
+    estimates, default_estimate, unknown = estimate_durations(discovered, history)
+    safe_print(f"⚖️  Duration history: {files_read} TRX files; {unknown} tests without history estimated at {default_estimate:.1f}s")
+
+    if by_category:
+        shards = plan_by_category(discovered, run_specific_test_categories(), estimates)
+    else:
+        shards = plan_by_duration(discovered, shard_count, estimates)
+
+    for shard in shards:
+        safe_print(f"   {shard.name}: {shard.describe()}, predicted {shard.estimate:.1f}s")
+    safe_print(f"📐 Predicted makespan: {max(shard.estimate for shard in shards):.1f}s")
+    return shards
+
+def find_rerun_sources(output_dir, environment=None):
+    """TRX files of the latest run under output_dir: every shard of a sharded run, plus the
+    reruns made since (their results override the run's, so retry cycles can be repeated)"""
+    manifest = ReportManifest(output_dir)
+    trx_entries = [entry for entry in manifest.entries(ARTIFACT_TRX)
+                   if entry.get('environment') in (None, environment) and os.path.exists(manifest.path_of(entry))]
+    full_runs = [position for position, entry in enumerate(trx_entries) if not entry.get('partial')]
+    if not full_runs:
+        return []
+    latest_run = trx_entries[full_runs[-1]]['run_id']
+    first = next(position for position in full_runs if trx_entries[position]['run_id'] == latest_run)
+    sources = [entry for entry in trx_entries[first:]
+               if entry.get('partial') or entry['run_id'] == latest_run]
+    return [manifest.path_of(entry) for entry in sources]
+
+@traced('plan-rerun')
+def plan_rerun(rerun_spec, output_dir, environment=None):
+    """(source TRX files, filter selecting their failed tests) for --rerun-failed.
+
+    The filter is empty when nothing failed; the sources are None when no TRX was found.
+    """
+    if rerun_spec == RERUN_LATEST:
+        sources = find_rerun_sources(output_dir, environment)
+    else:
+        sources = expand_result_paths(rerun_spec)
+    if not sources:
+        safe_print(f"❌ No TRX file to rerun failures from ({rerun_spec})")
+        return None, None
+
+    # The existing parser and merge: with reruns included the latest attempt of each test counts
+    previous = load_merged_results(sources, test_info={})
+    failed = [record.full_name for record in previous.records if record.outcome == OUTCOME_FAILED]
+    safe_print(f"🔁 {len(failed)} of {previous.total_tests} tests failed in: {', '.join(sources)}")
+    if not failed:
+        return sources, ""
+
+    test_filter = minimal_test_filter(failed, discover_tests(TESTS_DIR))
+    safe_print(f"🎯 Rerun filter: {test_filter.count('|') + 1} terms")
+    return sources, test_filter
 
+@traced('plan-affected')
+def plan_affected(ref):
+    """Filter selecting the test classes affected by changes since ref (--affected).
+
+    Returns "" to run everything (a project-wide input changed) and None when no test is
+    affected. Raises RuntimeError when git can't answer.
+    """
+    base = impact_analysis.resolve_base(PROJECT_ROOT, ref)
+    changed = impact_analysis.changed_files(PROJECT_ROOT, base)
+    entries, rescanned = impact_analysis.load_dependency_index(PROJECT_ROOT)
+    safe_print(f"🔎 {len(changed)} files changed since {ref} ({base[:10]}); "
+               f"dependency index: {len(entries)} files, {rescanned} re-scanned")
+
+    classes = impact_analysis.affected_test_classes(PROJECT_ROOT, changed, entries, base)
+    return affected_filter(classes)
+
+def affected_filter(classes):
+    """Filter for the affected test classes: "" for all tests (classes is None), None for none"""
+    if classes is None:
+        safe_print("🌐 A project-wide input changed; running all tests")
+        return ""
+
+    discovered = discover_tests(TESTS_DIR)
+    tests = [test_name for class_name in sorted(classes) for test_name in discovered.get(class_name, [])]
+    if not tests:
+        return None
+    safe_print(f"🎯 {len(classes)} affected test classes ({len(tests)} tests):")
+    for class_name in sorted(classes):
+        safe_print(f"   {class_name}")
+    return minimal_test_filter(tests, discovered)
+
+@traced('test')
+def run_sharded_tests(shards, run_folder, timestamp, env_vars=None, live_summary=None):
+    """Run every shard as its own `dotnet test --no-build` process, all at the same time.
+
+    Each shard gets its own filter, results directory (shards/<shard> in run_folder) and full log. Returns the same as
+    run_command, with the shards' output tails concatenated.
+    """
+    safe_print(f"🧩 Running {len(shards)} shards in parallel...")
+    env = os.environ.copy()
+    if env_vars:
+        env.update(env_vars)
+
+    tracker = LiveRunTracker(live_summary, source='console') if live_summary else None
+    tracker_lock = threading.Lock()
+    if tracker:
+        tracker.write()
+
+    def add_record(record):
+        with tracker_lock:
+            tracker.add_record(record)
+
+    shard_root = os.path.join(run_folder, "shards")
+    results = {}
+
+    def follow_shard(shard, command, log_path):
+        parser = ConsoleResultParser(add_record) if tracker else None
+        started = time.monotonic()
+        try:
+            result = run_streaming(command, [parser.feed_line] if parser else [], env=env, log_path=log_path)
+            if parser:
+                parser.flush()
+        except Exception as e:
+            # The shard counts as failed, with the error where its output tail would be
+            result = CommandResult(1, [f"❌ Shard {shard.name} failed: {type(e).__name__}: {e}\n"], 0, log_path)
+        finally:
+            shard.elapsed = time.monotonic() - started
+        shard.returncode = result.returncode
+        results[shard.name] = result
+
+    threads = []
+    for shard in shards:
+        results_dir = os.path.join(shard_root, shard.name)
+        os.makedirs(results_dir, exist_ok=True)
+        shard_cmd = (
+            f"dotnet test --no-build --no-restore"
+            f" --logger \"trx;LogFileName=TestResults_{timestamp}_{shard.name}.trx\""
+            f" --logger \"xunit;LogFileName=TestResults_{timestamp}_{shard.name}.xml\""
+            f" --verbosity normal --results-directory \"{results_dir}\" --filter \"{shard.test_filter}\""
+        )
+        safe_print(f"   ▶️  {shard.name}: {shard.describe()}")
+        # One streaming reader thread per shard; each shard's full output goes to its own log
+        log_path = os.path.join(results_dir, TEST_LOG_NAME)
+        thread = threading.Thread(target=follow_shard, args=(shard, shard_cmd, log_path), daemon=True)
+        thread.start()
+        threads.append(thread)
+
+    for thread in threads:
+        thread.join()
+    if tracker:
+        tracker.finish()
+
+    for shard in shards:
+        status = "✅" if shard.returncode == 0 else "❌"
+        safe_print(f"   {status} {shard.name}: exit code {shard.returncode}, "
+                   f"actual {shard.elapsed:.1f}s (predicted {shard.estimate:.1f}s)")
+    safe_print(f"📐 Makespan: actual {max(shard.elapsed for shard in shards):.1f}s "
+               f"(predicted {max(shard.estimate for shard in shards):.1f}s)")
+
+    # Shard output isn't echoed (it would interleave); show the tail of each failed shard
+    for shard in shards:
+        if shard.returncode != 0:
+            safe_print(f"===== {shard.name} (last lines) =====")
+            safe_print(results[shard.name].tail_text(ERROR_TAIL_LINES))
+
+    output = "".join(f"===== {shard.name} =====\n{results[shard.name].output}" for shard in shards)
+    success = all(shard.returncode == 0 for shard in shards)
+    return success, output
+
+def find_run_result_files(results_dir, pattern, recursive=False):
+    """Result files matching pattern (which names the run) in results_dir, and with recursive
+    in its subfolders too (only for folders holding a single run, like a shard run's)"""
+    return sorted(glob.glob(os.path.join(results_dir, "**" if recursive else "", pattern), recursive=recursive))
+
+def record_artifacts(output_dir, paths, artifact_type, run_id, environment=None, **attributes):
+    """Add the files a run wrote to the report manifest"""
+    ReportManifest(output_dir).record_all([dict(attributes, path=path, artifact_type=artifact_type, run_id=run_id,
+                                                environment=environment) for path in paths])
+
+@traced('check-dotnet')
 def check_dotnet():
     """Check if .NET is available"""
-    success, stdout, stderr = run_command("dotnet --version", "Checking .NET installation")
+    success, output = run_command("dotnet --version", "Checking .NET installation")
     if success:
-        safe_print(f"📦 .NET version: {stdout.strip()}")
+        safe_print(f"📦 .NET version: {output.strip()}")
         return True
     else:
         safe_print("❌ .NET not found. Please install .NET SDK")
         return False
 
-def clean_and_restore():
-    """Clean and restore the project"""
+@traced('restore')
+def clean_and_restore(force=False):
+    """Clean and restore the project (skipped when the sources are unchanged since the last build)"""
+    if not force and build_fingerprint.is_build_current(PROJECT_ROOT):
+        safe_print("⏭️  Sources unchanged since the last successful build; skipping clean and restore (use --force-build to override)")
+        return True
+    
     safe_print("🧹 Cleaning and restoring project...")
     
     # Clean
     run_command("dotnet clean", "Cleaning project")
+    build_fingerprint.invalidate(PROJECT_ROOT)
     
-    # Restore packages
-    success, _, _ = run_command("dotnet restore", "Restoring packages")
+    # Restore packages (only needed when the project files changed)
+    if not force and build_fingerprint.is_restore_current(PROJECT_ROOT):
+        safe_print("⏭️  Project files unchanged; skipping restore")
+        return True
+    success, _ = run_command("dotnet restore", "Restoring packages")
+    if success:
+        build_fingerprint.record_restore(PROJECT_ROOT)
     return success
 
-def run_tests_with_reporting(test_filter=None, output_dir="TestReports", args=None):
-    """Run tests with comprehensive reporting"""
+@traced('build')
+def ensure_build(force=False):
+    """Build the project unless the build fingerprint shows it is already up to date"""
+    if not force and build_fingerprint.is_build_current(PROJECT_ROOT):
+        safe_print("⏭️  Build is up to date (sources unchanged); skipping restore and build")
+        return True
+    
+    safe_print("🔨 Building project...")
+    restore_flag = "" if force or not build_fingerprint.is_restore_current(PROJECT_ROOT) else " --no-restore"
+    fingerprints = build_fingerprint.current_fingerprints(PROJECT_ROOT)
+    build_success, _ = run_command(f"dotnet build{restore_flag}", "Building project")
+    if build_success:
+        build_fingerprint.record_build(PROJECT_ROOT, fingerprints)
+    return build_success
+
+def describe_environment(environment):
+    """The configuration line shown for an environment"""
+    if environment == 'QA':
+        return "Using QA configuration (vhapiqa.vaxcare.com)"
+    if environment == 'Production':
+        return "Using Production configuration"
+    return "Using Staging configuration"
+
+def check_preflight(result, output_dir, args=None, record=True):
+    """Report the pre-flight probe; on failure write the classified result (and the Teams
+    card) and return False so the run stops before any test times out. With record the
+    result file is added to the report manifest (not when it goes into a run folder, which
+    records its files when it is published)"""
+    if result.ok:
+        safe_print(f"📡 Pre-flight: {result.describe()}")
+        return True
+    
+    safe_print(f"🚫 Pre-flight check failed: {result.describe()}")
+    result_path = preflight.write_result(result, output_dir)
+    safe_print(f"📄 Pre-flight result: {result_path}")
+    if record and args and getattr(args, 'run_id', None):
+        record_artifacts(args.output, [result_path], ARTIFACT_PREFLIGHT, args.run_id, result.environment)
+    if args and args.teams:
+        report_pipeline.send_preflight_notification(result, result.environment, args.webhook)
+    safe_print("💡 Check VPN/DNS/network access to the environment, or use --skip-preflight to run anyway")
+    return False
+
+def run_tests_with_reporting(test_filter=None, output_dir="TestReports", args=None, base_result_files=None):
+    """Run tests with comprehensive reporting.
+
+    With base_result_files (a --rerun-failed run) the new results are merged over those files.
+    """
     safe_print("🧪 Running tests with enhanced reporting...")
     
     # Create output directory
     os.makedirs(output_dir, exist_ok=True)
     
-    # Set environment variable for tests
-    if args and hasattr(args, 'environment'):
-        environment = args.environment
-        safe_print(f"🌍 Setting test environment to: {environment}")
-        
-        # Set environment variable for the test process
-        if environment == 'QA':
-            os.environ['ASPNETCORE_ENVIRONMENT'] = 'QA'
-            safe_print("📋 Using QA configuration (vhapiqa.vaxcare.com)")
-        elif environment == 'Production':
-            os.environ['ASPNETCORE_ENVIRONMENT'] = 'Production'
-            safe_print("📋 Using Production configuration")
-        else:  # Staging (default)
-            os.environ['ASPNETCORE_ENVIRONMENT'] = 'Staging'
-            safe_print("📋 Using Staging configuration")
-    else:
-        os.environ['ASPNETCORE_ENVIRONMENT'] = 'Staging'
-        safe_print("📋 Using default Staging configuration")
+    # The environment is passed to the test process only (ASPNETCORE_ENVIRONMENT in its env),
+    # never set in this process, so several environments can run side by side
+    environment = args.environment if args and hasattr(args, 'environment') else 'Staging'
+    safe_print(f"🌍 Setting test environment to: {environment}")
+    safe_print(f"📋 {describe_environment(environment)}")
+
+    # Probe the environment's API while the project builds
+    probe = None
+    if not (args and getattr(args, 'skip_preflight', False)):
+        probe = preflight.PreflightProbe(PROJECT_ROOT, environment).start()
     
-    # Build the project first
-    safe_print("🔨 Building project...")
-    build_success, _, _ = run_command("dotnet build", "Building project")
+    # Build the project first (tests then run with --no-build --no-restore)
+    build_success = ensure_build(force=bool(args and getattr(args, 'force_build', False)))
     if not build_success:
         safe_print("❌ Build failed. Please fix build errors first.")
         return False
     
-    # Prepare test command
-    timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
-    trx_file = os.path.join(output_dir, f"TestResults_{timestamp}.trx")
-    xml_file = os.path.join(output_dir, f"TestResults_{timestamp}.xml")
+    if probe and not check_preflight(probe.result(), output_dir, args):
+        return False
+    
+    # The run id is also the timestamp in the result file names. Everything the run writes
+    # goes to its own folder, published (renamed into place) once it is complete
+    timestamp = getattr(args, 'run_id', None) or new_run_id()
+    run_dir = RunDirectory(output_dir, timestamp, environment, partial=bool(base_result_files)).create()
+    try:
+        return run_tests_in_directory(run_dir, test_filter, output_dir, environment, args, base_result_files)
+    finally:
+        # Also a run that ended early (no results, Ctrl+C) is published with what it wrote
+        run_dir.publish(log=safe_print)
+        print_test_logs(run_dir)
+        if args:
+            args.run_folder = run_dir.path
+
+def print_test_logs(run_dir):
+    """Show the full test logs (one per shard or environment) where the published run keeps them.
+
+    Only printed once the run is published: a run id that is already taken publishes as <id>-N.
+    """
+    for directory, _, files in sorted(os.walk(run_dir.path)):
+        if TEST_LOG_NAME in files:
+            safe_print(f"📝 Full test log: {os.path.join(directory, TEST_LOG_NAME)}")
+
+def run_tests_in_directory(run_dir, test_filter, output_dir, environment, args=None, base_result_files=None):
+    """Run the tests into run_dir's staging folder and report them"""
+    timestamp = run_dir.run_id
+    results_dir = run_dir.staging_path
     
     # Build test command
-    environment = args.environment if args and hasattr(args, 'environment') else 'Staging'
-    test_cmd = f"dotnet test --logger \"trx;LogFileName=TestResults_{timestamp}.trx\" --logger \"xunit;LogFileName=TestResults_{timestamp}.xml\" --verbosity normal --results-directory \"{output_dir}\""
+    file_tag = timestamp + RERUN_SUFFIX if base_result_files else timestamp
+    test_cmd = f"dotnet test --no-build --no-restore --logger \"trx;LogFileName=TestResults_{file_tag}.trx\" --logger \"xunit;LogFileName=TestResults_{file_tag}.xml\" --verbosity normal --results-directory \"{results_dir}\""
     
     if test_filter:
         test_cmd += f" --filter \"{test_filter}\""
@@ -118,127 +436,431 @@ def run_tests_with_reporting(test_filter=None, output_dir="TestReports", args=No
     env_vars = {'ASPNETCORE_ENVIRONMENT': environment}
     
     # Run tests with environment variables
-    success, stdout, stderr = run_command_with_env(test_cmd, "Running tests", env_vars)
+    live_summary = None
+    if args and getattr(args, 'live', False):
+        live_summary = os.path.join(output_dir, LIVE_SUMMARY_FILE)
+        safe_print(f"📡 Live summary: {live_summary}")
+
+    shards = plan_shards(args, output_dir)
+    if shards:
+        # The project was built above; every shard runs with --no-build
+        success, _ = run_sharded_tests(shards, results_dir, timestamp, env_vars, live_summary)
+    else:
+        # The output is shown as it arrives; the full log goes to a file, not into memory
+        log_path = os.path.join(results_dir, TEST_LOG_NAME)
+        success, _ = run_test_command(test_cmd, env_vars, live_summary, log_path)
     
     # Always try to generate reports and send notifications, even if some tests failed
     safe_print("📊 Test execution completed!")
-    safe_print(stdout)
-    if stderr:
-        safe_print("STDERR:")
-        safe_print(stderr)
-    
-    # Generate enhanced HTML report
-    # First try to use TRX file for actual results
-    trx_file_to_use = trx_file
-    xml_file_to_use = xml_file
-    
-    # Check if TRX file exists, if not try to find any TRX file
-    if not os.path.exists(trx_file):
-        import glob
-        trx_files = glob.glob(os.path.join(output_dir, "**", "TestResults_*.trx"), recursive=True)
-        if trx_files:
-            trx_file_to_use = max(trx_files, key=os.path.getmtime)
-            safe_print(f"📄 Using latest TRX file: {trx_file_to_use}")
+    
+    # Find the result files of this run in its own folder. Every TRX written by this run is
+    # used (multi-project and sharded runs produce several); they are merged into one run.
+    trx_files_to_use = find_run_result_files(results_dir, "*.trx", recursive=True)
+    xml_files_to_use = find_run_result_files(results_dir, "TestResults_*.xml", recursive=True)
+    manifest = ReportManifest(output_dir)
+    
+    # If this run wrote no TRX file, use the latest one recorded
+    if not trx_files_to_use:
+        latest_trx = manifest.latest(ARTIFACT_TRX)
+        if latest_trx:
+            trx_files_to_use = [latest_trx]
+            safe_print(f"📄 Using latest TRX file: {latest_trx}")
         else:
             safe_print("⚠️ No TRX test results file found, falling back to XML")
-            trx_file_to_use = None
-    
-    # Try to generate report with actual results using TRX file
-    if trx_file_to_use and os.path.exists(trx_file_to_use):
-        safe_print("📄 Generating enhanced HTML report with actual results...")
-        report_success, _, _ = run_command(
-            f"python3 TestRunner/generate-enhanced-html-report-with-actual-results.py --trx \"{trx_file_to_use}\" --output \"{output_dir}\" --environment \"{environment}\"",
-            "Generating HTML report with actual results"
-        )
-        
-        # If actual results parser fails, try Windows-compatible actual results parser
-        if not report_success:
-            safe_print("⚠️ Actual results parser failed, trying Windows-compatible actual results parser...")
-            report_success, _, _ = run_command(
-                f"python3 TestRunner/generate-enhanced-html-report-with-actual-results-windows.py --trx \"{trx_file_to_use}\" --output \"{output_dir}\" --environment \"{environment}\"",
-                "Generating HTML report with Windows-compatible actual results parser"
-            )
-    
-    # Send Teams notification if requested
-    if args and args.teams:
-        safe_print("📤 Sending Teams notification...")
-        # Teams notification script only works with XML files, not TRX files
-        # Use XML file for Teams notification
-        notification_file = xml_file_to_use
-        if notification_file and os.path.exists(notification_file):
-            # Use the simplified Teams notification script (no Skipped/Browser fields)
-            teams_success, _, _ = run_command(
-                f"python3 TestRunner/send-teams-notification.py --xml \"{notification_file}\" --environment \"{args.environment}\"",
-                "Sending Teams notification"
-            )
-        else:
-            safe_print("⚠️ No test results file found for Teams notification")
-            teams_success = False
-        
-        if teams_success:
-            safe_print("✅ Teams notification sent successfully!")
-        else:
-            safe_print("⚠️ Teams notification failed, but tests completed")
+    elif len(trx_files_to_use) > 1:
+        safe_print(f"📄 Merging {len(trx_files_to_use)} TRX files from this run")
     
-    # Open the HTML report automatically if requested
-    if args and not args.no_open:
-        open_html_report(output_dir)
-    
-    if not trx_file_to_use:
-        # Fall back to XML file
-        if not os.path.exists(xml_file):
-            # Try to find any XML file in the output directory or subdirectories
-            import glob
-            xml_files = glob.glob(os.path.join(output_dir, "**", "TestResults_*.xml"), recursive=True)
-            if xml_files:
-                # Get the most recent XML file
-                xml_file_to_use = max(xml_files, key=os.path.getmtime)
-                safe_print(f"📄 Using latest XML file: {xml_file_to_use}")
-            else:
-                fallback_xml = os.path.join(output_dir, "TestResults.xml")
-                if os.path.exists(fallback_xml):
-                    safe_print(f"📄 Using existing XML file: {fallback_xml}")
-                    xml_file_to_use = fallback_xml
-                else:
-                    safe_print("⚠️ No XML test results file found")
-                    return success  # Return the test success status
-        
-        if os.path.exists(xml_file_to_use):
-            safe_print("📄 Generating enhanced HTML report...")
-            # Try robust parser first, then fallback to Windows-compatible version
-            report_success, _, _ = run_command(
-                f"python3 TestRunner/generate-enhanced-html-report-robust.py --xml \"{xml_file_to_use}\" --output \"{output_dir}\"",
-                "Generating HTML report with robust parser"
-            )
-            
-            # If robust parser fails, try Windows-compatible version
-            if not report_success:
-                safe_print("⚠️ Robust parser failed, trying Windows-compatible version...")
-                report_success, _, _ = run_command(
-                    f"python3 TestRunner/generate-enhanced-html-report-windows.py --xml \"{xml_file_to_use}\" --output \"{output_dir}\"",
-                    "Generating HTML report with Windows-compatible parser"
-                )
-        
-        if report_success:
-            safe_print("✅ Enhanced HTML report generated successfully!")
+    # A rerun only holds the retried tests; report them merged over the original run
+    if base_result_files:
+        trx_files_to_use = list(base_result_files) + [f for f in trx_files_to_use if f not in base_result_files]
+        safe_print(f"🔁 Merging the rerun over {len(base_result_files)} earlier result file(s)")
+    
+    if not trx_files_to_use and not xml_files_to_use:
+        # Use the latest XML file recorded
+        latest_xml = manifest.latest(ARTIFACT_XML)
+        if latest_xml:
+            xml_files_to_use = [latest_xml]
+            safe_print(f"📄 Using latest XML file: {latest_xml}")
         else:
-            safe_print("⚠️ HTML report generation failed, but tests completed")
+            fallback_xml = os.path.join(output_dir, "TestResults.xml")
+            if os.path.exists(fallback_xml):
+                safe_print(f"📄 Using existing XML file: {fallback_xml}")
+                xml_files_to_use = [fallback_xml]
+            else:
+                safe_print("⚠️ No XML test results file found")
+                return success  # Return the test success status
+    
+    # Post-run steps only read the results, so they run as a small stage graph: the summary
+    # is parsed once, then the HTML report and the Teams notification run side by side,
+    # the run folder is published once the report (and PDF) are written, and opening the
+    # report waits for that
+    stages = build_post_run_stages(trx_files_to_use or xml_files_to_use, bool(trx_files_to_use),
+                                   run_dir, environment, args)
+    scheduler = StageScheduler(stages, max_workers=len(stages))
+    with span('post-run'):
+        scheduler.run()
+    safe_print("⏱️ Post-run stages:")
+    for line in scheduler.timing_table():
+        safe_print(line)
     
     return success
 
-def open_html_report(output_dir):
-    """Open the most recent HTML report in the default browser"""
+def build_post_run_stages(result_files, is_trx, run_dir, environment, args=None):
+    """The post-run stage graph: summary -> html -> pdf, then publish -> open;
+    summary -> teams"""
+    timeout = getattr(args, 'stage_timeout', None) or DEFAULT_STAGE_TIMEOUT
+    output_dir = run_dir.output_dir
+    
+    def parse_summary(_):
+        # Parse the results once; the report generators (and their fallbacks) and the Teams
+        # notification all run in this process on the same parsed data
+        results = report_pipeline.parse_results(result_files, log=safe_print)
+        return results if results is not None else False
+    
+    def generate_html(values):
+        if is_trx:
+            safe_print("📄 Generating enhanced HTML report with actual results...")
+            generators = report_pipeline.TRX_REPORT_GENERATORS
+        else:
+            safe_print("📄 Generating enhanced HTML report...")
+            generators = report_pipeline.XML_REPORT_GENERATORS
+        # Written in a scratch folder and moved into the run when complete (see RunDirectory.adopt)
+        scratch = run_dir.scratch('html')
+        report_path = report_pipeline.generate_html_report(values['summary'], scratch, environment, generators, log=safe_print)
+        if report_path:
+            report_path = run_dir.adopt(report_path, scratch, counts=summary_counts(values['summary']))
+        if report_path:
+            safe_print(f"✅ Enhanced HTML report generated successfully: {run_dir.published_path(report_path)}")
+            return report_path
+        safe_print("⚠️ HTML report generation failed, but tests completed")
+        return False
+    
+    def send_teams(values):
+        safe_print("📤 Sending Teams notification...")
+        # The notifier reports success itself
+        if report_pipeline.send_teams_notification(values['summary'], environment, getattr(args, 'webhook', None)):
+            return True
+        safe_print("⚠️ Teams notification failed, but tests completed")
+        return False
+    
+    def publish(_):
+        path = run_dir.publish(log=safe_print)
+        if path:
+            safe_print(f"📁 Run folder: {path}")
+        return path or False
+    
+    def open_report(values):
+        return open_html_report(output_dir, run_dir.published_path(values['html']))
+    
+    def convert_pdf(values):
+        return convert_report_in_run(run_dir, values['html'], timeout)
+    
+    stages = [Stage('summary', parse_summary, timeout=timeout),
+              Stage('html', generate_html, ['summary'], timeout=timeout)]
+    writers = ['html']
+    if args and args.teams:
+        stages.append(Stage('teams', send_teams, ['summary'], timeout=timeout))
+    if args and getattr(args, 'pdf', False):
+        stages.append(Stage('pdf', convert_pdf, ['html'], timeout=timeout))
+        writers.append('pdf')
+    # Once everything is written to the run folder, whether or not the report succeeded
+    stages.append(Stage('publish', publish, timeout=timeout, after=writers))
+    if args and not args.no_open:
+        stages.append(Stage('open', open_report, ['html', 'publish'], timeout=timeout))
+    return stages
+
+def run_environment_matrix(environments, test_filter=None, output_dir="TestReports", args=None):
+    """Run the suite against every environment at the same time and compare them side by side.
+
+    The project is built once; each environment then gets its own `dotnet test --no-build`
+    process with ASPNETCORE_ENVIRONMENT set in that process's env only, and its own results
+    directory, log and HTML report under <output>/runs/<run id>/<environment>, next to the
+    comparison report.
+    """
+    safe_print(f"🌍 Running tests against {', '.join(environments)} in parallel...")
+    timestamp = getattr(args, 'run_id', None) or new_run_id()
+    run_dir = RunDirectory(output_dir, timestamp).create()
+    try:
+        return run_matrix_in_directory(run_dir, environments, test_filter, args)
+    finally:
+        run_dir.publish(log=safe_print)
+        print_test_logs(run_dir)
+        if args:
+            args.run_folder = run_dir.path
+
+def run_matrix_in_directory(run_dir, environments, test_filter=None, args=None):
+    """Run the environments into run_dir's staging folder and compare them"""
+    timestamp = run_dir.run_id
+    runs = [EnvironmentRun(environment, os.path.join(run_dir.staging_path, environment)) for environment in environments]
+    for run in runs:
+        os.makedirs(run.output_dir, exist_ok=True)
+        safe_print(f"   📋 {run.environment}: {describe_environment(run.environment)}")
+
+    # Probe every environment's API while the project builds
+    probes = {}
+    if not (args and getattr(args, 'skip_preflight', False)):
+        probes = {run.environment: preflight.PreflightProbe(PROJECT_ROOT, run.environment).start() for run in runs}
+
+    if not ensure_build(force=bool(args and getattr(args, 'force_build', False))):
+        safe_print("❌ Build failed. Please fix build errors first.")
+        return False
+
+    # An unreachable environment is left out; the others still run
+    for run in runs:
+        if run.environment in probes:
+            result = probes[run.environment].result()
+            if not check_preflight(result, run.output_dir, args, record=False):
+                run.preflight = result
+    ready = [run for run in runs if run.preflight is None]
+
+    def run_environment(run):
+        command = (
+            f"dotnet test --no-build --no-restore"
+            f" --logger \"trx;LogFileName=TestResults_{timestamp}_{run.environment}.trx\""
+            f" --logger \"xunit;LogFileName=TestResults_{timestamp}_{run.environment}.xml\""
+            f" --verbosity normal --results-directory \"{run.output_dir}\""
+        )
+        if test_filter:
+            command += f" --filter \"{test_filter}\""
+        env = os.environ.copy()
+        env['ASPNETCORE_ENVIRONMENT'] = run.environment
+        run.log_path = os.path.join(run.output_dir, TEST_LOG_NAME)
+        started = time.monotonic()
+        with span('test', environment=run.environment):
+            result = run_streaming(command, env=env, log_path=run.log_path)
+        run.returncode = result.returncode
+        run.elapsed = time.monotonic() - started
+        run.output_tail = result.tail_text(ERROR_TAIL_LINES)
+
+        # Parse while the other environments are still running
+        run.result_files = find_run_result_files(run.output_dir, "*.trx")
+        if not run.result_files:
+            run.result_files = find_run_result_files(run.output_dir, "TestResults_*.xml")
+        if run.result_files:
+            run.summary = report_pipeline.parse_results(
+                run.result_files, log=lambda line: safe_print(f"   [{run.environment}] {line}"))
+
+    matrix_started = time.monotonic()
+    threads = []
+    for run in ready:
+        safe_print(f"   ▶️  {run.environment}: {run_dir.published_path(run.output_dir)}")
+        thread = threading.Thread(target=run_environment, args=(run,), daemon=True)
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    wall_time = time.monotonic() - matrix_started
+
+    safe_print("📊 Test execution completed!")
+    for run in runs:
+        status = "✅" if run.success else "❌"
+        safe_print(f"   {status} {run.environment}: {run.describe()}")
+    if ready:
+        safe_print(f"📐 Wall time: {wall_time:.1f}s (environment runs add up to {sum(run.elapsed for run in ready):.1f}s)")
+
+    # Environment output isn't echoed (it would interleave); show the tail of each failed run
+    for run in ready:
+        if run.returncode != 0:
+            safe_print(f"===== {run.environment} (last lines) =====")
+            safe_print(run.output_tail)
+
+    stages = build_matrix_stages(runs, run_dir, wall_time, args)
+    scheduler = StageScheduler(stages, max_workers=len(stages))
+    with span('post-run'):
+        scheduler.run()
+    safe_print("⏱️ Post-run stages:")
+    for line in scheduler.timing_table():
+        safe_print(line)
+
+    return all(run.success for run in runs)
+
+def build_matrix_stages(runs, run_dir, wall_time, args=None):
+    """Post-run stages of an environment matrix: comparison -> pdf, and per environment its
+    own HTML report and Teams card; then publish -> open"""
+    timeout = getattr(args, 'stage_timeout', None) or DEFAULT_STAGE_TIMEOUT
+    output_dir = run_dir.output_dir
+
+    def write_comparison(_):
+        scratch = run_dir.scratch('comparison')
+        report_path = run_dir.adopt(write_comparison_report(runs, scratch, wall_time), scratch)
+        if not report_path:
+            return False
+        safe_print(f"✅ Environment comparison report generated: {run_dir.published_path(report_path)}")
+        return report_path
+
+    def environment_html(run):
+        def generate(_):
+            generators = (report_pipeline.TRX_REPORT_GENERATORS if run.result_files[0].endswith('.trx')
+                          else report_pipeline.XML_REPORT_GENERATORS)
+            scratch = run_dir.scratch(f'html-{run.environment}')
+            report_path = report_pipeline.generate_html_report(run.summary, scratch, run.environment,
+                                                               generators, log=safe_print)
+            if report_path:
+                run.report_path = run_dir.adopt(report_path, scratch, run.environment, summary_counts(run.summary))
+            return run.report_path or False
+        return generate
+
+    def environment_teams(run):
+        def send(_):
+            return report_pipeline.send_teams_notification(run.summary, run.environment, getattr(args, 'webhook', None))
+        return send
+
+    def publish(_):
+        path = run_dir.publish(log=safe_print)
+        if path:
+            safe_print(f"📁 Run folder: {path}")
+        return path or False
+
+    stages = [Stage('comparison', write_comparison, timeout=timeout)]
+    writers = ['comparison']
+    for run in runs:
+        if run.summary is None:
+            continue
+        stages.append(Stage(f'html:{run.environment}', environment_html(run), timeout=timeout))
+        writers.append(f'html:{run.environment}')
+        if args and args.teams:
+            stages.append(Stage(f'teams:{run.environment}', environment_teams(run), timeout=timeout))
+    if args and getattr(args, 'pdf', False):
+        stages.append(Stage('pdf', lambda values: convert_report_in_run(run_dir, values['comparison'], timeout),
+                            ['comparison'], timeout=timeout))
+        writers.append('pdf')
+    stages.append(Stage('publish', publish, timeout=timeout, after=writers))
+    if args and not args.no_open:
+        stages.append(Stage('open', lambda values: open_html_report(output_dir, run_dir.published_path(values['comparison'])),
+                            ['comparison', 'publish'], timeout=timeout))
+    return stages
+
+def watch_tests(test_filter=None, output_dir="TestReports", args=None):
+    """--watch: rebuild and rerun the affected test classes after every change, until Ctrl+C.
+
+    Each cycle's results are merged (in memory) over the latest full run in output_dir and the
+    earlier cycles, like a --rerun-failed rerun. Every cycle reuses one folder,
+    <output>/runs/watch: its TRX, log and the report (EnhancedTestReport_Watch.html) are
+    rewritten in place, and cycles are not recorded in the report manifest.
+    """
+    environment = args.environment if args and hasattr(args, 'environment') else 'Staging'
+    force_build = bool(args and getattr(args, 'force_build', False))
+    watch_dir = os.path.join(output_dir, *WATCH_RUN_DIR.split('/'))
+    os.makedirs(watch_dir, exist_ok=True)
+    report_path = os.path.join(watch_dir, WATCH_REPORT_FILE)
+    cycle_results = os.path.join(watch_dir, WATCH_RESULTS_FILE)
+    safe_print(f"👀 Watch mode ({environment}): report at {report_path}")
+
+    probe = None
+    if not (args and getattr(args, 'skip_preflight', False)):
+        probe = preflight.PreflightProbe(PROJECT_ROOT, environment).start()
+    # Build up front, so the first change builds incrementally
+    if not ensure_build(force=force_build):
+        safe_print("❌ Build failed. Please fix build errors first.")
+        return False
+    if probe and not check_preflight(probe.result(), output_dir, args):
+        return False
+
+    # Results reported: the latest run plus its reruns, then every watch cycle on top
+    session = None
+    base_results = find_rerun_sources(output_dir, environment)
+    if base_results:
+        safe_print(f"📄 Reporting changes over: {', '.join(base_results)}")
+        session = report_pipeline.parse_results(base_results, log=safe_print)
+    watcher = SourceWatcher(PROJECT_ROOT)
+    entries, _ = impact_analysis.load_dependency_index(PROJECT_ROOT)
+    opened = False
+
+    try:
+        while True:
+            safe_print(f"👀 Watching {', '.join(WATCH_PATTERNS)} for changes (Ctrl+C to stop)...")
+            changed = watcher.wait_for_changes()
+            cycle_started = time.monotonic()
+            shown = ', '.join(changed[:5]) + (f" (+{len(changed) - 5} more)" if len(changed) > 5 else "")
+            safe_print(f"✏️  {len(changed)} file(s) changed: {shown}")
+
+            # Deleted files are looked up in the index as it was before the change
+            previous_entries = entries
+            entries, _ = impact_analysis.load_dependency_index(PROJECT_ROOT)
+            lookup = dict(entries)
+            lookup.update({relative: previous_entries[relative] for relative in changed
+                           if relative not in entries and relative in previous_entries})
+            cycle_filter = affected_filter(impact_analysis.affected_test_classes(PROJECT_ROOT, changed, lookup))
+            if cycle_filter is None:
+                safe_print("🎉 No tests are affected by the changes")
+                continue
+            if test_filter:
+                cycle_filter = f"({test_filter})&({cycle_filter})" if cycle_filter else test_filter
+
+            if not ensure_build(force=force_build):
+                safe_print("❌ Build failed; waiting for the next change")
+                continue
+
+            # The previous cycle's results are already merged into the session
+            if os.path.exists(cycle_results):
+                os.remove(cycle_results)
+            test_cmd = (f"dotnet test --no-build --no-restore --logger \"trx;LogFileName={WATCH_RESULTS_FILE}\""
+                        f" --verbosity normal --results-directory \"{watch_dir}\"")
+            if cycle_filter:
+                test_cmd += f" --filter \"{cycle_filter}\""
+            run_test_command(test_cmd, {'ASPNETCORE_ENVIRONMENT': environment}, None,
+                             os.path.join(watch_dir, TEST_LOG_NAME))
+
+            if not os.path.exists(cycle_results):
+                safe_print("⚠️ The test run wrote no TRX file; report not updated")
+                continue
+            cycle = report_pipeline.parse_results([cycle_results], log=safe_print)
+            if cycle is None:
+                continue
+            session = merge_summaries([session, cycle]) if session else cycle
+            generated = report_pipeline.generate_html_report(session, watch_dir, environment, log=safe_print)
+            if generated:
+                publish_report(generated, report_path)
+                safe_print(f"✅ Report updated: {report_path}")
+                if not opened and args and not args.no_open:
+                    opened = open_html_report(output_dir, report_path)
+            safe_print(f"⚡ Change to result: {time.monotonic() - cycle_started:.1f}s")
+    except KeyboardInterrupt:
+        safe_print("\n👋 Watch mode stopped")
+    return True
+
+@traced('pdf')
+def convert_report_in_run(run_dir, html_file, timeout):
+    """Convert a report of the run in a scratch folder and move the PDF next to the report"""
+    scratch = run_dir.scratch('pdf')
+    pdf_file = convert_report_to_pdf(html_file, timeout,
+                                     os.path.join(scratch, os.path.splitext(os.path.basename(html_file))[0] + '.pdf'))
+    if not pdf_file:
+        return False
+    folder = os.path.relpath(os.path.dirname(html_file), run_dir.staging_path)
+    pdf_file = run_dir.adopt(pdf_file, scratch, '' if folder == os.curdir else folder)
+    if not pdf_file:
+        return False
+    safe_print(f"✅ PDF report generated: {run_dir.published_path(pdf_file)}")
+    return pdf_file
+
+def convert_report_to_pdf(html_file, timeout, pdf_file=None):
+    """Convert the HTML report with the PDF script (to pdf_file, default next to it); returns
+    the PDF path, or False on failure"""
+    pdf_file = pdf_file or os.path.splitext(html_file)[0] + '.pdf'
+    safe_print(f"📄 Converting HTML report to PDF: {os.path.basename(pdf_file)}")
+    # A separate process, so a hanging renderer can be killed at the stage timeout
+    try:
+        process = subprocess.run([sys.executable, PDF_SCRIPT, '--html', html_file, '--output', pdf_file],
+                                 capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        safe_print(f"⚠️ PDF conversion did not finish within {timeout:g}s")
+        return False
+    if process.returncode != 0 or not os.path.exists(pdf_file):
+        safe_print(f"⚠️ PDF conversion failed (exit code {process.returncode})")
+        return False
+    return pdf_file
+
+@traced('open-report')
+def open_html_report(output_dir, report_path=None):
+    """Open report_path (default: the most recent HTML report) in the default browser"""
     try:
-        import glob
         import webbrowser
-        from pathlib import Path
         
-        # Find the most recent HTML report
-        html_files = glob.glob(os.path.join(output_dir, "**", "EnhancedTestReport*.html"), recursive=True)
+        # The most recent HTML report, from the report manifest
+        latest_html = report_path or ReportManifest(output_dir).latest(HTML_ARTIFACTS)
         
-        if html_files:
-            # Get the most recent HTML file
-            latest_html = max(html_files, key=os.path.getmtime)
+        if latest_html:
             safe_print(f"🌐 Opening HTML report: {latest_html}")
             
             # Convert to absolute path for better compatibility
@@ -247,12 +869,14 @@ def open_html_report(output_dir):
             # Open in default browser
             webbrowser.open(f"file://{abs_path}")
             safe_print("✅ HTML report opened in default browser")
+            return True
         else:
             safe_print("⚠️ No HTML report found to open")
             
     except Exception as e:
         safe_print(f"⚠️ Could not open HTML report: {e}")
         safe_print(f"📁 Reports are available in: {output_dir}")
+    return False
 
 def run_specific_test_categories():
     """Run tests by category"""
@@ -270,88 +894,70 @@ def run_specific_test_categories():
     
     return categories
 
-def clean_test_reports():
-    """Clean TestReports folder, keeping only the latest files of each type"""
+@traced('retention')
+def clean_test_reports(output_dir, policy, protected=(), dry_run=False):
+    """Delete the runs in output_dir that the retention policy doesn't keep (never the
+    protected run ids, e.g. the run in progress)"""
+    safe_print(f"🧹 Cleaning {output_dir}: {policy.describe()}{' (dry run)' if dry_run else ''}...")
     try:
-        import glob
-        
-        reports_dir = "TestReports"
-        if not os.path.exists(reports_dir):
-            return
-        
-        # Define file patterns to clean (keep latest of each type)
-        file_patterns = {
-            'HTML Reports': '*.html',
-            'TRX Files': '*.trx', 
-            'XML Files': '*.xml',
-            'JSON Files': '*.json',
-            'MD Files': '*.md',
-            'PDF Files': '*.pdf'
-        }
-        
-        total_removed = 0
-        safe_print(f"🧹 Cleaning TestReports folder...")
-        safe_print(f"📁 Cleaning all file types, keeping latest of each...")
-        
-        for file_type, pattern in file_patterns.items():
-            # Find all files matching this pattern
-            files = glob.glob(os.path.join(reports_dir, pattern))
-            
-            if len(files) <= 1:
-                # Keep all if 1 or fewer files
-                continue
-            
-            # Sort by modification time (newest first)
-            files.sort(key=os.path.getmtime, reverse=True)
-            
-            # Keep only the latest file
-            latest_file = files[0]
-            files_to_delete = files[1:]
-            
-            safe_print(f"📄 {file_type}: Keeping {os.path.basename(latest_file)}")
-            
-            for file_to_delete in files_to_delete:
-                try:
-                    os.remove(file_to_delete)
-                    safe_print(f"🗑️  Removed: {os.path.basename(file_to_delete)}")
-                    total_removed += 1
-                except Exception as e:
-                    safe_print(f"⚠️  Could not remove {os.path.basename(file_to_delete)}: {e}")
-        
-        # Also clean any subdirectories that might contain old reports
-        subdirs = [d for d in os.listdir(reports_dir) if os.path.isdir(os.path.join(reports_dir, d))]
-        for subdir in subdirs:
-            subdir_path = os.path.join(reports_dir, subdir)
-            
-            # Clean all file types in subdirectories too
-            for file_type, pattern in file_patterns.items():
-                subdir_files = glob.glob(os.path.join(subdir_path, pattern))
-                if len(subdir_files) > 1:
-                    subdir_files.sort(key=os.path.getmtime, reverse=True)
-                    files_to_delete = subdir_files[1:]
-                    for file_to_delete in files_to_delete:
-                        try:
-                            os.remove(file_to_delete)
-                            safe_print(f"🗑️  Removed from {subdir}: {os.path.basename(file_to_delete)}")
-                            total_removed += 1
-                        except Exception as e:
-                            safe_print(f"⚠️  Could not remove {os.path.basename(file_to_delete)}: {e}")
-            
-            # If the subdirectory is empty after cleaning, remove it
-            try:
-                remaining_files = os.listdir(subdir_path)
-                if not remaining_files:
-                    os.rmdir(subdir_path)
-                    safe_print(f"🗑️  Removed empty subdirectory: {subdir}")
-            except Exception as e:
-                safe_print(f"⚠️  Could not remove subdirectory {subdir}: {e}")
-        
-        safe_print(f"✅ TestReports folder cleaned successfully!")
-        safe_print(f"📊 Total files removed: {total_removed}")
-        
-    except Exception as e:
-        safe_print(f"⚠️  Error cleaning TestReports folder: {e}")
+        apply_retention(output_dir, policy, protected, dry_run, log=safe_print)
+    except OSError as e:
+        safe_print(f"⚠️  Error cleaning {output_dir}: {e}")
+        return False
+    return True
+
+def start_retention(output_dir, args):
+    """Apply the retention options after a run has recorded everything it wrote: in a
+    detached `--clean-reports` process, so the run doesn't wait for the deletions (its output
+    goes to <output>/retention.log); a dry run in this process, to list the runs on the
+    console. The published run is the newest, so the retention keeps it."""
+    policy = retention_policy(args)
+    if args.retention_dry_run:
+        return clean_test_reports(output_dir, policy, dry_run=True)
+    command = [sys.executable, os.path.abspath(__file__), '--clean-reports', '--output', os.path.abspath(output_dir)]
+    for option, value in (('--keep-runs', args.keep_runs), ('--max-age-days', args.max_age_days),
+                          ('--max-reports-mb', args.max_reports_mb)):
+        if value is not None:
+            command += [option, str(value)]
+    if args.keep_failing_runs:
+        command.append('--keep-failing-runs')
+    if os.name == 'nt':
+        detach = {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP | subprocess.DETACHED_PROCESS}
+    else:
+        detach = {'start_new_session': True}
+    log_path = os.path.join(output_dir, RETENTION_LOG_FILE)
+    try:
+        with open(log_path, 'w', encoding='utf-8') as log:
+            subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT,
+                             env={**os.environ, 'PYTHONIOENCODING': 'utf-8'}, **detach)
+    except OSError as e:
+        safe_print(f"⚠️  Could not start the report retention: {e}")
+        return False
+    safe_print(f"🧹 Cleaning {output_dir} in the background: {policy.describe()} (log: {log_path})")
+    return True
 
+def retention_policy(args):
+    """The retention policy given on the command line"""
+    max_bytes = int(args.max_reports_mb * 1024 * 1024) if args.max_reports_mb is not None else None
+    return RetentionPolicy(args.keep_runs, args.max_age_days, max_bytes, args.keep_failing_runs)
+
+def write_pipeline_trace(output_dir, run_id, run_folder=None):
+    """Print the per-phase timing table and write the run's Chrome trace into its run folder
+    (runs/<run id>, created for runs that ended before writing anything)"""
+    lines = pipeline_trace.summary_lines()
+    if not lines:
+        return
+    safe_print("⏱️ Pipeline timing:")
+    for line in lines:
+        safe_print(line)
+    try:
+        run_folder = run_folder or os.path.join(runs_dir(output_dir), run_id)
+        trace_path = pipeline_trace.write_trace(run_folder)
+    except OSError as e:
+        safe_print(f"⚠️ Could not write the pipeline trace: {e}")
+        return
+    record_artifacts(output_dir, [trace_path], ARTIFACT_TRACE, os.path.basename(run_folder))
+    safe_print(f"🧭 Trace: {trace_path} (open in chrome://tracing or https://ui.perfetto.dev)")
 
 def main():
     parser = argparse.ArgumentParser(description='Run all tests with enhanced HTML reporting')
@@ -359,15 +965,32 @@ def main():
     parser.add_argument('--category', choices=['inventory', 'patients', 'setup', 'insurance', 'appointment'], 
                        help='Run tests by category')
     parser.add_argument('--output', default='TestReports', help='Output directory for reports')
-    parser.add_argument('--clean', action='store_true', help='Clean and restore before running')
+    parser.add_argument('--clean', action='store_true', help='Clean and restore before running (skipped when sources are unchanged since the last build)')
+    parser.add_argument('--force-build', action='store_true', help='Always clean/restore/build, ignoring the build fingerprint')
     parser.add_argument('--list-categories', action='store_true', help='List available test categories')
     parser.add_argument('--teams', action='store_true', help='Send results to Microsoft Teams')
     parser.add_argument('--webhook', help='Microsoft Teams webhook URL')
     parser.add_argument('--environment', choices=['Staging', 'QA', 'Production'], default='Staging', 
                        help='Environment to run tests against (Staging, QA, Production)')
+    parser.add_argument('--environments', metavar='ENV,ENV', help='Run against several environments at the same time (e.g. Staging,QA) and write a side-by-side comparison report')
     parser.add_argument('--browser', default='N/A', help='Browser information for Teams notification')
     parser.add_argument('--open-report', action='store_true', default=True, help='Open HTML report in browser after completion (default: True)')
     parser.add_argument('--no-open', action='store_true', help='Do not open HTML report automatically')
+    parser.add_argument('--shards', type=int, help='Split the suite into N shards balanced per test by their past durations (whole test classes when a per-test filter would be too long) and run them in parallel')
+    parser.add_argument('--parallel-categories', action='store_true', help='Run one shard per test category in parallel')
+    parser.add_argument('--live', action='store_true', help='Follow the test run as it happens and keep TestReports/live-summary.json up to date')
+    parser.add_argument('--affected', nargs='?', const='HEAD', metavar='REF', help='Run only the test classes affected by files changed since REF (e.g. origin/main; default: uncommitted changes)')
+    parser.add_argument('--rerun-failed', nargs='?', const=RERUN_LATEST, metavar='TRX', help='Rerun only the tests that failed in TRX (path or glob; default: the latest run in the output directory) and report them merged over it')
+    parser.add_argument('--watch', action='store_true', help='Keep running: after every change to Tests/, Services/, Models/ or appsettings, rebuild, rerun the affected test classes and update TestReports/runs/watch/EnhancedTestReport_Watch.html')
+    parser.add_argument('--skip-preflight', action='store_true', help='Do not check that the environment\'s API is reachable before running tests')
+    parser.add_argument('--pdf', action='store_true', help='Also convert the HTML report to PDF (runs alongside the Teams notification)')
+    parser.add_argument('--keep-runs', type=int, metavar='N', help='After reporting, delete all but the last N runs from the output directory')
+    parser.add_argument('--max-age-days', type=float, metavar='DAYS', help='After reporting, delete runs older than DAYS')
+    parser.add_argument('--max-reports-mb', type=float, metavar='MB', help='After reporting, delete the oldest runs until the output directory is under MB')
+    parser.add_argument('--keep-failing-runs', action='store_true', help='Never delete runs with failed tests, whatever their age')
+    parser.add_argument('--retention-dry-run', action='store_true', help='Only list the runs the retention options would delete')
+    parser.add_argument('--clean-reports', action='store_true', help=f'Apply the retention options to the output directory and exit (default: keep the last {DEFAULT_KEEP_RUNS} runs)')
+    parser.add_argument('--stage-timeout', type=float, help=f'Seconds each post-run stage (report, Teams, open, PDF) may take (default: {DEFAULT_STAGE_TIMEOUT:g})')
     
     args = parser.parse_args()
     
@@ -379,6 +1002,29 @@ def main():
         run_specific_test_categories()
         return
     
+    # Every phase is timed; the spans go to <output>/runs/<run id>/trace.json, also on failure.
+    # The run id also names the run's result files and groups its artifacts in the manifest.
+    args.run_id = new_run_id()
+    try:
+        run_selected_tests(args)
+    finally:
+        # --clean-reports is not a run: it gets no run folder
+        if not args.clean_reports:
+            write_pipeline_trace(args.output, args.run_id, getattr(args, 'run_folder', None))
+            # Only once the trace is recorded, so the retention is the only writer of the manifest
+            if getattr(args, 'run_folder', None) and retention_policy(args).enabled:
+                start_retention(args.output, args)
+
+def run_selected_tests(args):
+    """Check prerequisites, plan the run, run the tests and report them"""
+    if args.clean_reports:
+        policy = retention_policy(args)
+        if not policy.enabled:
+            policy.keep_runs = DEFAULT_KEEP_RUNS
+        if not clean_test_reports(args.output, policy, (), args.retention_dry_run):
+            sys.exit(1)
+        return
+    
     # Check prerequisites
     if not check_dotnet():
         sys.exit(1)
@@ -386,9 +1032,33 @@ def main():
     
     # Clean and restore if requested
     if args.clean:
-        if not clean_and_restore():
+        if not clean_and_restore(force=args.force_build):
             sys.exit(1)
     
+    if (args.shards or args.parallel_categories) and (args.filter or args.category):
+        safe_print("❌ --shards/--parallel-categories cannot be combined with --filter/--category")
+        sys.exit(1)
+    if (args.rerun_failed or args.affected) and (args.filter or args.category or args.shards or args.parallel_categories
+                                                  or (args.rerun_failed and args.affected)):
+        safe_print("❌ --rerun-failed/--affected cannot be combined with each other, --filter/--category or sharding")
+        sys.exit(1)
+    
+    environments = None
+    if args.environments:
+        try:
+            environments = parse_environments(args.environments)
+        except ValueError as e:
+            safe_print(f"❌ --environments: {e}")
+            sys.exit(1)
+        if args.shards or args.parallel_categories or args.rerun_failed or args.live:
+            safe_print("❌ --environments cannot be combined with sharding, --rerun-failed or --live")
+            sys.exit(1)
+    
+    if args.watch and (environments or args.shards or args.parallel_categories or args.rerun_failed
+                       or args.affected or args.live):
+        safe_print("❌ --watch cannot be combined with --environments, sharding, --rerun-failed, --affected or --live")
+        sys.exit(1)
+    
     # Determine test filter
     test_filter = None
     if args.filter:
@@ -397,8 +1067,36 @@ def main():
         categories = run_specific_test_categories()
         test_filter = categories[args.category]
     
+    # Run only the tests affected by the changes since a git ref
+    if args.affected:
+        try:
+            test_filter = plan_affected(args.affected)
+        except RuntimeError as e:
+            safe_print(f"❌ Could not determine affected tests: {e}")
+            sys.exit(1)
+        if test_filter is None:
+            safe_print("🎉 No tests are affected by the changes")
+            return
+    
+    # Rerun only what failed last time
+    rerun_sources = None
+    if args.rerun_failed:
+        rerun_sources, test_filter = plan_rerun(args.rerun_failed, args.output, args.environment)
+        if rerun_sources is None:
+            sys.exit(1)
+        if not test_filter:
+            safe_print("🎉 No failed tests to rerun")
+            return
+    
+    if args.watch:
+        watch_tests(test_filter, args.output, args)
+        return
+    
     # Run tests
-    success = run_tests_with_reporting(test_filter, args.output, args)
+    if environments:
+        success = run_environment_matrix(environments, test_filter, args.output, args)
+    else:
+        success = run_tests_with_reporting(test_filter, args.output, args, rerun_sources)
     
     if success:
         safe_print("\n🎉 Test execution completed successfully!")
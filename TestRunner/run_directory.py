@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Run Directories
+Every run writes its artifacts (results, logs, reports, PDF, trace) into its own folder,
+TestReports/runs/<run id>/, instead of side by side in TestReports.
+
+The folder is written as TestReports/runs/.<run id>.tmp and renamed into place when the run
+has finished writing, so a reader never sees a half-written TRX or report: the folder is
+either absent or complete. Post-run writers (reports, PDF) work in their own scratch folder
+and move each finished file into the run with adopt(); a writer abandoned at its stage
+timeout can only leave files in its scratch folder, which publishing discards.
+
+Publishing also records the artifacts in the report manifest and points
+TestReports/runs/latest at the run (a symlink, replaced atomically; on Windows, where
+symlinks need extra privileges, the run id in TestReports/runs/latest.txt).
+"""
+
+import os
+import shutil
+import threading
+
+from report_manifest import (ReportManifest, classify_artifact, ENVIRONMENT_DIRS, ARTIFACT_TRX, ARTIFACT_XML,
+                             HTML_ARTIFACTS)
+
+RUNS_DIR = 'runs'
+STAGING_SUFFIX = '.tmp'
+LATEST_LINK = 'latest'
+LATEST_POINTER = 'latest.txt'
+
+
+def runs_dir(output_dir):
+    return os.path.join(output_dir, RUNS_DIR)
+
+def update_latest(output_dir, run_name):
+    """Point runs/latest at run_name; returns the link or pointer file path"""
+    directory = runs_dir(output_dir)
+    link = os.path.join(directory, LATEST_LINK)
+    temp_path = f"{link}.{os.getpid()}.{threading.get_ident()}{STAGING_SUFFIX}"
+    if os.name != 'nt':
+        try:
+            os.symlink(run_name, temp_path, target_is_directory=True)
+            os.replace(temp_path, link)
+            return link
+        except OSError:
+            if os.path.lexists(temp_path):
+                os.remove(temp_path)
+    pointer = os.path.join(directory, LATEST_POINTER)
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(run_name + '\n')
+    os.replace(temp_path, pointer)
+    return pointer
+
+def latest_run_dir(output_dir):
+    """Folder of the run published last, or None"""
+    directory = runs_dir(output_dir)
+    link = os.path.join(directory, LATEST_LINK)
+    if os.path.islink(link):
+        run_name = os.readlink(link)
+    else:
+        try:
+            with open(os.path.join(directory, LATEST_POINTER), 'r', encoding='utf-8') as f:
+                run_name = f.read().strip()
+        except OSError:
+            return None
+    path = os.path.join(directory, run_name)
+    return path if run_name and os.path.isdir(path) else None
+
+
+class RunDirectory:
+    """The folder of one run: written under a temporary name, then published"""
+
+    def __init__(self, output_dir, run_id, environment=None, partial=False):
+        self.output_dir = output_dir
+        self.run_id = run_id
+        self.environment = environment
+        self.partial = partial    # results of a rerun (only the retried tests)
+        self.staging_path = os.path.join(runs_dir(output_dir), f".{run_id}{STAGING_SUFFIX}")
+        self.path = os.path.join(runs_dir(output_dir), run_id)
+        self.counts = {}          # report path -> summary counts, recorded with the report
+        self.scratch_paths = []
+        self.published = False
+        self._lock = threading.Lock()
+
+    def create(self):
+        os.makedirs(self.staging_path, exist_ok=True)
+        # Paths printed before publishing name the folder the run will most likely get
+        self.path = self._free_path()
+        return self
+
+    def _free_path(self):
+        # Two runs started within the same second get the same id
+        path, number = os.path.join(runs_dir(self.output_dir), self.run_id), 1
+        while os.path.exists(path):
+            number += 1
+            path = f"{os.path.join(runs_dir(self.output_dir), self.run_id)}-{number}"
+        return path
+
+    def published_path(self, path):
+        """Where a file written to the staging folder is once the run is published"""
+        if not path:
+            return path
+        relative = os.path.relpath(path, self.staging_path)
+        if relative.startswith('..'):
+            return path
+        return os.path.join(self.path, relative)
+
+    def add_counts(self, report_path, counts):
+        """Test counts to record with a report written to the staging folder"""
+        self.counts[self.published_path(report_path)] = counts
+
+    def scratch(self, name):
+        """A new private folder, next to the staging folder, for one writer"""
+        path = os.path.join(runs_dir(self.output_dir), f".{self.run_id}.{name.replace(':', '-')}{STAGING_SUFFIX}")
+        os.makedirs(path, exist_ok=True)
+        with self._lock:
+            self.scratch_paths.append(path)
+        return path
+
+    def adopt(self, path, scratch_path, folder='', counts=None):
+        """Move a finished file from a scratch folder into the run (folder within it), with
+        the report's test counts. Returns its path in the staging folder, or None when the run
+        was already published (the writer finished after its stage timed out)."""
+        with self._lock:
+            if self.published:
+                shutil.rmtree(scratch_path, ignore_errors=True)
+                return None
+            target = os.path.join(self.staging_path, folder, os.path.relpath(path, scratch_path))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(path, target)
+            if counts is not None:
+                self.add_counts(target, counts)
+            return target
+
+    def _discard_scratch(self):
+        # An abandoned writer may still have files open here; what can't be removed now is
+        # left as a hidden .tmp folder, which readers and the retention skip
+        for path in self.scratch_paths:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def publish(self, log=print):
+        """Rename the run into place, record its artifacts and make it the latest run;
+        returns the run folder (None if it couldn't be moved). Only the first call acts."""
+        with self._lock:
+            if self.published:
+                return self.path
+            self.published = True
+            self._discard_scratch()
+            if not os.path.isdir(self.staging_path):
+                return None
+            final_path = self._free_path()
+            try:
+                os.rename(self.staging_path, final_path)
+            except OSError as e:
+                log(f"⚠️ Could not publish the run folder {self.staging_path}: {e}")
+                self.path = self.staging_path  # the files stay where they were written
+                return None
+            self.counts = {os.path.join(final_path, os.path.relpath(report, self.path)): counts
+                           for report, counts in self.counts.items()}
+            self.path = final_path
+
+            self._record_artifacts(os.path.basename(final_path))
+            try:
+                update_latest(self.output_dir, os.path.basename(final_path))
+            except OSError as e:
+                log(f"⚠️ Could not update the latest run pointer: {e}")
+            return self.path
+
+    def _record_artifacts(self, run_id):
+        artifacts = []
+        for directory, _, files in os.walk(self.path):
+            for file_name in sorted(files):
+                artifact_type = classify_artifact(file_name)
+                if artifact_type is None:
+                    continue
+                path = os.path.join(directory, file_name)
+                relative_parts = os.path.relpath(path, self.path).split(os.sep)
+                environment = next((part for part in relative_parts if part in ENVIRONMENT_DIRS), self.environment)
+                is_result = artifact_type in (ARTIFACT_TRX, ARTIFACT_XML)
+                counts = self.counts.get(path) if artifact_type in HTML_ARTIFACTS else None
+                artifacts.append({'path': path, 'artifact_type': artifact_type, 'run_id': run_id,
+                                  'environment': environment, 'counts': counts,
+                                  'partial': True if self.partial and is_result else None})
+        ReportManifest(self.output_dir).record_all(artifacts)
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Test Shard Planner
+Splits the test suite into disjoint shards that can run as concurrent `dotnet test` processes.
+
+Test classes and methods are discovered from the C# sources (any [Fact]/[Theory]-style
+attribute, including custom ones such as [ReportingFact]). Every test lands in exactly one
+shard, so merged results never double count and nothing is left out.
+
+Shard sizes are estimated from the per-test durations recorded in previous TRX files;
+plan_by_duration packs individual tests into N shards with longest-processing-time-first
+scheduling. Filters are kept under MAX_FILTER_LENGTH so the `dotnet test` command line fits
+the Windows limit; longer ones fall back to whole-class terms.
+"""
+
+import os
+import re
+import glob
+import heapq
+import statistics
+
+from report_manifest import ReportManifest, ARTIFACT_TRX
+from results_cache import load_results
+from results_model import OUTCOME_PASSED, OUTCOME_FAILED
+
+TEST_ATTRIBUTE = re.compile(r'\[\s*(?:\w+\.)*\w*(?:Fact|Theory)\b')
+NAMESPACE_DECLARATION = re.compile(r'^\s*namespace\s+([\w.]+)', re.M)
+CLASS_DECLARATION = re.compile(r'\bclass\s+(\w+)')
+METHOD_DECLARATION = re.compile(r'\b(?:Task|void)\s+(\w+)\s*\(')
+
+OTHER_SHARD = 'other'
+
+# Newest TRX files read for duration history, and the estimate when there is no history at all
+HISTORY_FILES = 10
+DEFAULT_TEST_SECONDS = 5.0
+
+# cmd.exe, which runs the dotnet commands on Windows, accepts 8191 characters per command line;
+# the rest of a `dotnet test` command (loggers, results directory) takes well under 1000
+MAX_FILTER_LENGTH = 7000
+
+
+class Shard:
+    """A group of tests run by one `dotnet test` process"""
+
+    def __init__(self, name):
+        self.name = name
+        self.classes = []   # fully qualified class names, run whole
+        self.tests = []     # fully qualified test names, when planned per test
+        self.estimate = 0.0  # predicted seconds
+        self.returncode = None
+        self.elapsed = None
+
+    @property
+    def test_filter(self):
+        if self.tests:
+            return '|'.join(f'FullyQualifiedName={test_name}' for test_name in self.tests)
+        # The trailing dot keeps InventoryApiTests from also matching InventoryApiTestsWithReporting
+        return '|'.join(f'FullyQualifiedName~{class_name}.' for class_name in self.classes)
+
+    def describe(self):
+        return f"{len(self.tests)} tests" if self.tests else f"{len(self.classes)} classes"
+
+    def __repr__(self):
+        return f"Shard({self.name!r}, {self.describe()}, {self.estimate:.1f}s)"
+
+
+def tests_in_source(source):
+    """Map each test class declared in C# source (fully qualified) to its test methods, in order"""
+    discovered = {}
+    namespace_match = NAMESPACE_DECLARATION.search(source)
+    namespace = namespace_match.group(1) + '.' if namespace_match else ''
+    classes = [(match.start(), namespace + match.group(1)) for match in CLASS_DECLARATION.finditer(source)]
+
+    for attribute in TEST_ATTRIBUTE.finditer(source):
+        owner = None
+        for start, class_name in classes:
+            if start > attribute.start():
+                break
+            owner = class_name
+        method = METHOD_DECLARATION.search(source, attribute.end())
+        if owner is None or method is None:
+            continue
+        tests = discovered.setdefault(owner, [])
+        test_name = f"{owner}.{method.group(1)}"
+        if test_name not in tests:
+            tests.append(test_name)
+    return discovered
+
+def discover_tests(tests_dir):
+    """Map each test class (fully qualified) to its test methods (fully qualified), in source order"""
+    discovered = {}
+    for source_file in sorted(glob.glob(os.path.join(tests_dir, '**', '*.cs'), recursive=True)):
+        with open(source_file, 'r', encoding='utf-8-sig', errors='replace') as f:
+            for class_name, tests in tests_in_source(f.read()).items():
+                known = discovered.setdefault(class_name, [])  # partial classes span files
+                known.extend(test_name for test_name in tests if test_name not in known)
+    return discovered
+
+def load_duration_history(results_dir, max_files=HISTORY_FILES):
+    """Median observed duration (seconds) per test method over the newest TRX files.
+
+    Theory cases ("Method(x: 1)") are summed into their method, since a method filter runs
+    all of them. Skipped and not-executed results carry no timing and are ignored.
+    Returns (durations, number of files read).
+    """
+    manifest = ReportManifest(results_dir)
+    trx_files = [manifest.path_of(entry) for entry in manifest.entries(ARTIFACT_TRX, newest_first=True)[:max_files]]
+
+    observations = {}
+    files_read = 0
+    for trx_file in trx_files:
+        try:
+            summary = load_results(trx_file, test_info={})
+        except Exception:
+            continue  # unreadable history is just less history
+        files_read += 1
+        per_method = {}
+        for record in summary.records:
+            if record.outcome not in (OUTCOME_PASSED, OUTCOME_FAILED):
+                continue
+            method_name = record.full_name.split('(', 1)[0]
+            per_method[method_name] = per_method.get(method_name, 0.0) + record.duration
+        for method_name, duration in per_method.items():
+            observations.setdefault(method_name, []).append(duration)
+
+    return {name: statistics.median(values) for name, values in observations.items()}, files_read
+
+def estimate_durations(discovered, history):
+    """Predicted seconds per discovered test; tests without history get the median of the
+    known ones (or DEFAULT_TEST_SECONDS). Returns (estimates, default estimate, unknown count)."""
+    tests = [test_name for tests in discovered.values() for test_name in tests]
+    known = [history[test_name] for test_name in tests if test_name in history]
+    default_estimate = statistics.median(known) if known else DEFAULT_TEST_SECONDS
+    estimates = {test_name: history.get(test_name, default_estimate) for test_name in tests}
+    return estimates, default_estimate, len(tests) - len(known)
+
+def _filter_substring(test_filter):
+    """The substring of a "FullyQualifiedName~X" category filter"""
+    return test_filter.split('~', 1)[-1]
+
+def plan_by_category(discovered, categories, estimates=None):
+    """One shard per category. Each class goes to the most specific (longest) matching category,
+    classes matching none go to an extra 'other' shard."""
+    shards = {name: Shard(name) for name in categories}
+    other = Shard(OTHER_SHARD)
+    for class_name, tests in discovered.items():
+        matches = [(len(_filter_substring(test_filter)), name) for name, test_filter in categories.items()
+                   if _filter_substring(test_filter) in class_name]
+        shard = shards[max(matches)[1]] if matches else other
+        shard.classes.append(class_name)
+        shard.estimate += sum(estimates.get(test_name, 0.0) for test_name in tests) if estimates else len(tests)
+    planned = [shard for shard in shards.values() if shard.classes]
+    if other.classes:
+        planned.append(other)
+    return planned
+
+def _pack_longest_first(items, shard_count, add):
+    """LPT scheduling: each (name, seconds) item, longest first, onto the least loaded shard.
+    add(shard, name) puts the item on the shard."""
+    shards = [Shard(f"shard{index + 1}") for index in range(max(1, shard_count))]
+    loads = [(0.0, index) for index in range(len(shards))]
+    for name, seconds in sorted(items, key=lambda item: (-item[1], item[0])):
+        load, index = heapq.heappop(loads)
+        shard = shards[index]
+        add(shard, name)
+        shard.estimate = load + seconds
+        heapq.heappush(loads, (shard.estimate, index))
+    return [shard for shard in shards if shard.tests or shard.classes]
+
+def plan_by_duration(discovered, shard_count, estimates, max_filter_length=MAX_FILTER_LENGTH):
+    """Pack individual tests into N shards, longest predicted test first onto the least loaded
+    shard (LPT scheduling). Each shard filters on an explicit list of test names.
+
+    When a shard's list would be longer than max_filter_length, whole classes are packed
+    instead (one filter term per class, at the cost of a coarser balance).
+    """
+    tests = [(test_name, estimates[test_name]) for tests in discovered.values() for test_name in tests]
+    shards = _pack_longest_first(tests, shard_count, lambda shard, test_name: shard.tests.append(test_name))
+    if all(len(shard.test_filter) <= max_filter_length for shard in shards):
+        return shards
+
+    classes = [(class_name, sum(estimates[test_name] for test_name in tests))
+               for class_name, tests in discovered.items() if tests]
+    return _pack_longest_first(classes, shard_count, lambda shard, class_name: shard.classes.append(class_name))
+
+def minimal_test_filter(test_names, discovered, max_length=MAX_FILTER_LENGTH):
+    """The shortest `dotnet test --filter` selecting test_names: a class whose tests are all
+    listed is selected as a whole, the rest by exact method name (a theory runs all its cases).
+
+    A filter longer than max_length selects the whole classes of the remaining methods instead,
+    so it still fits on the command line (running more tests than asked).
+    """
+    methods = {test_name.split('(', 1)[0] for test_name in test_names}
+    terms = []
+    for class_name, tests in discovered.items():
+        if tests and methods.issuperset(tests):
+            terms.append(f'FullyQualifiedName~{class_name}.')
+            methods.difference_update(tests)
+    test_filter = '|'.join(terms + [f'FullyQualifiedName={method_name}' for method_name in sorted(methods)])
+    if len(test_filter) <= max_length:
+        return test_filter
+
+    for class_name, tests in discovered.items():
+        if methods.intersection(tests):
+            terms.append(f'FullyQualifiedName~{class_name}.')
+            methods.difference_update(tests)
+    # Methods no longer found in the sources keep their exact term
+    return '|'.join(terms + [f'FullyQualifiedName={method_name}' for method_name in sorted(methods)])
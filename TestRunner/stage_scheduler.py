@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Post-Run Stage Scheduler
+Runs the steps that follow a test run (HTML report, Teams notification, opening the report,
+PDF conversion...) as a small dependency graph on a thread pool.
+
+Each stage declares the stages it needs; a stage starts as soon as all of them succeeded
+and is skipped when one of them failed or timed out. Stages listed in `after` only order
+it: it waits for them to finish, whatever their outcome, and gets the values of those that
+succeeded. Independent stages run side by side,
+so a slow webhook or PDF renderer doesn't hold up the others. A stage still running at its
+timeout is reported as timed out and its dependents are skipped. Python can't kill a thread,
+so every stage runs on a daemon thread: a timed-out stage is abandoned and neither the
+scheduler nor the interpreter's exit waits for it. Stages that write files should make sure
+an abandoned attempt can't leave half-written output behind (see RunDirectory.scratch).
+"""
+
+import time
+import queue
+import threading
+
+from pipeline_trace import span
+
+STATUS_OK = 'ok'
+STATUS_FAILED = 'failed'
+STATUS_TIMEOUT = 'timeout'
+STATUS_SKIPPED = 'skipped'
+
+STATUS_ICONS = {STATUS_OK: '✅', STATUS_FAILED: '❌', STATUS_TIMEOUT: '⏱️', STATUS_SKIPPED: '⏭️'}
+
+DEFAULT_STAGE_TIMEOUT = 300.0
+
+
+class Stage:
+    """A post-run step: func(values) gets the return values of the stages it depends on
+    (and of the `after` stages that succeeded).
+
+    Returning False (or raising) fails the stage; any other value is passed to dependents.
+    """
+
+    def __init__(self, name, func, depends=(), timeout=DEFAULT_STAGE_TIMEOUT, after=()):
+        self.name = name
+        self.func = func
+        self.depends = tuple(depends)
+        self.after = tuple(after)
+        self.timeout = timeout
+
+
+class StageResult:
+    def __init__(self, name, status, started=0.0, elapsed=0.0, value=None, detail=''):
+        self.name = name
+        self.status = status
+        self.started = started    # seconds after the scheduler started
+        self.elapsed = elapsed
+        self.value = value
+        self.detail = detail
+
+    def __repr__(self):
+        return f"StageResult({self.name!r}, {self.status}, {self.elapsed:.2f}s)"
+
+
+def _check_graph(stages):
+    """Reject unknown dependencies and cycles up front, so the scheduler can't stall"""
+    by_name = {stage.name: stage for stage in stages}
+    if len(by_name) != len(stages):
+        raise ValueError("Duplicate stage names")
+    for stage in stages:
+        unknown = [name for name in stage.depends + stage.after if name not in by_name]
+        if unknown:
+            raise ValueError(f"Stage {stage.name!r} depends on unknown stage(s): {', '.join(unknown)}")
+
+    resolved = set()
+    remaining = list(stages)
+    while remaining:
+        ready = [stage for stage in remaining if all(name in resolved for name in stage.depends + stage.after)]
+        if not ready:
+            raise ValueError(f"Stage dependency cycle among: {', '.join(stage.name for stage in remaining)}")
+        resolved.update(stage.name for stage in ready)
+        remaining = [stage for stage in remaining if stage.name not in resolved]
+
+
+class StageScheduler:
+    def __init__(self, stages, max_workers=4):
+        _check_graph(stages)
+        self.stages = list(stages)
+        self.max_workers = max_workers
+        self.results = {}
+        self.elapsed = 0.0
+
+    def _run_stage(self, stage, values, finished):
+        """Thread body: run the stage and report (name, value, error) on the finished queue"""
+        try:
+            with span(stage.name, 'stage') as attributes:
+                value = stage.func(values)
+                attributes['ok'] = value is not False
+        except Exception as e:
+            finished.put((stage.name, None, e))
+        else:
+            finished.put((stage.name, value, None))
+
+    def run(self):
+        """Run every stage; returns the StageResults in declaration order"""
+        clock_start = time.monotonic()
+        pending = list(self.stages)
+        values = {}
+        running = {}  # stage name -> (stage, start time)
+        finished = queue.Queue()
+
+        while pending or running:
+            # Start (or skip) every stage whose dependencies are settled
+            for stage in list(pending):
+                dependencies = [self.results.get(name) for name in stage.depends]
+                if any(result is not None and result.status != STATUS_OK for result in dependencies):
+                    failed = next(result.name for result in dependencies
+                                  if result is not None and result.status != STATUS_OK)
+                    self.results[stage.name] = StageResult(stage.name, STATUS_SKIPPED, detail=f"{failed} did not succeed")
+                    pending.remove(stage)
+                elif (len(running) < max(1, self.max_workers)
+                      and all(self.results.get(name) is not None for name in stage.depends + stage.after)):
+                    stage_values = {name: values[name] for name in stage.depends + stage.after
+                                    if self.results[name].status == STATUS_OK}
+                    threading.Thread(target=self._run_stage, args=(stage, stage_values, finished),
+                                     name=f"stage-{stage.name}", daemon=True).start()
+                    running[stage.name] = (stage, time.monotonic())
+                    pending.remove(stage)
+
+            if not running:
+                continue  # skips above may have settled more stages
+
+            next_deadline = min(start + stage.timeout for stage, start in running.values())
+            try:
+                name, value, error = finished.get(timeout=max(0.0, next_deadline - time.monotonic()))
+            except queue.Empty:
+                name = None
+
+            now = time.monotonic()
+            if name in running:  # not a stage that already timed out
+                stage, start = running.pop(name)
+                if error is not None:
+                    result = StageResult(name, STATUS_FAILED, start - clock_start, now - start, detail=str(error))
+                else:
+                    status = STATUS_FAILED if value is False else STATUS_OK
+                    result = StageResult(name, status, start - clock_start, now - start, value)
+                    values[name] = value
+                self.results[name] = result
+
+            for name, (stage, start) in list(running.items()):
+                if now - start >= stage.timeout:
+                    # Abandoned: its daemon thread finishes (or not) in the background
+                    self.results[name] = StageResult(name, STATUS_TIMEOUT, start - clock_start, now - start,
+                                                     detail=f"still running after {stage.timeout:g}s")
+                    del running[name]
+
+        self.elapsed = time.monotonic() - clock_start
+        return [self.results[stage.name] for stage in self.stages]
+
+    def timing_table(self):
+        """Lines of a per-stage timing table"""
+        width = max([len('Stage')] + [len(stage.name) for stage in self.stages])
+        lines = [f"   {'Stage':<{width}}  {'Status':<9} {'Start':>7} {'Time':>8}  Details"]
+        for stage in self.stages:
+            result = self.results.get(stage.name)
+            if result is None:
+                continue
+            icon = STATUS_ICONS.get(result.status, '')
+            timing = (f"{result.started:>6.2f}s {result.elapsed:>7.2f}s" if result.status != STATUS_SKIPPED
+                      else f"{'-':>7} {'-':>8}")
+            lines.append(f"{icon} {stage.name:<{width}}  {result.status:<9} {timing}  {result.detail}".rstrip())
+        lines.append(f"   {'total':<{width}}  {'':<9} {'':>7} {self.elapsed:>7.2f}s")
+        return lines
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Watch Mode
+Polls the test sources (Tests/, Services/, Models/), the project file and the appsettings
+files for changes, so run-all-tests.py --watch can rebuild incrementally and rerun only the
+affected test classes after every save.
+
+Polling (size + mtime of a few dozen files) is used instead of inotify/FSEvents so it works
+the same on Linux, macOS and Windows without extra packages. A burst of saves (an editor
+writing several files, a git checkout) is debounced into one change set.
+"""
+
+import os
+import time
+
+from build_fingerprint import matching_files
+
+WATCH_PATTERNS = ('Tests/**/*.cs', 'Services/**/*.cs', 'Models/**/*.cs', '*.csproj', 'appsettings*.json')
+POLL_INTERVAL_SECONDS = 0.5
+DEBOUNCE_SECONDS = 0.4
+# The watch report reloads itself in the browser this often
+REPORT_REFRESH_SECONDS = 3
+WATCH_REPORT_FILE = 'EnhancedTestReport_Watch.html'
+# Each cycle's results, replaced by the next cycle once merged into the report
+WATCH_RESULTS_FILE = 'TestResults_watch.trx'
+
+
+def snapshot(project_root, patterns=WATCH_PATTERNS):
+    """(size, mtime) of every watched file, by relative path"""
+    state = {}
+    for relative in matching_files(project_root, patterns):
+        try:
+            stat = os.stat(os.path.join(project_root, relative))
+        except FileNotFoundError:
+            continue
+        state[relative] = (stat.st_size, stat.st_mtime_ns)
+    return state
+
+
+class SourceWatcher:
+    """Reports the watched files added, modified or deleted since the last call"""
+
+    def __init__(self, project_root, patterns=WATCH_PATTERNS, interval=POLL_INTERVAL_SECONDS,
+                 debounce=DEBOUNCE_SECONDS):
+        self.project_root = project_root
+        self.patterns = patterns
+        self.interval = interval
+        self.debounce = debounce
+        self.state = snapshot(project_root, patterns)
+
+    def poll(self):
+        """Relative paths changed since the previous poll"""
+        current = snapshot(self.project_root, self.patterns)
+        changed = {path for path in current.keys() | self.state.keys() if current.get(path) != self.state.get(path)}
+        self.state = current
+        return changed
+
+    def wait_for_changes(self):
+        """Block until something changed and then stayed quiet for the debounce period"""
+        changed = set()
+        while not changed:
+            time.sleep(self.interval)
+            changed = self.poll()
+        quiet_since = time.monotonic()
+        while time.monotonic() - quiet_since < self.debounce:
+            time.sleep(min(self.interval, self.debounce))
+            more = self.poll()
+            if more:
+                changed |= more
+                quiet_since = time.monotonic()
+        return sorted(changed)
+
+
+def publish_report(generated_path, report_path, refresh_seconds=REPORT_REFRESH_SECONDS):
+    """Replace report_path with a freshly generated report that reloads itself in the browser"""
+    with open(generated_path, 'r', encoding='utf-8') as f:
+        html_content = f.read()
+    refresh = f'<meta http-equiv="refresh" content="{refresh_seconds}">'
+    html_content = html_content.replace('<head>', f'<head>\n    {refresh}', 1)
+    temp_path = f"{report_path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(html_content)
+    os.replace(temp_path, report_path)
+    os.remove(generated_path)
+    return report_path
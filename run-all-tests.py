@@ -1,11 +1,11 @@
 #!/usr/bin/env python3
 """
 Test Runner Wrapper
-This script calls the main test runner in the TestRunner folder
+This script runs the main test runner in the TestRunner folder (in this interpreter)
 """
 
 import sys
-import subprocess
+import runpy
 import os
 
 def main():
@@ -20,13 +20,11 @@ def main():
         print("Please ensure the TestRunner folder contains the test runner script.")
         sys.exit(1)
     
-    # Pass all arguments to the TestRunner script
-    cmd = [sys.executable, test_runner_script] + sys.argv[1:]
+    # Run the TestRunner script as __main__ with all arguments, without starting another interpreter
+    sys.argv = [test_runner_script] + sys.argv[1:]
     
     try:
-        # Run the TestRunner script with all arguments
-        result = subprocess.run(cmd, check=False)
-        sys.exit(result.returncode)
+        runpy.run_path(test_runner_script, run_name="__main__")
     except KeyboardInterrupt:
         print("\n🛑 Test execution interrupted by user")
         sys.exit(1)
@@ -35,4 +33,4 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
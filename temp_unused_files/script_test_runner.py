@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Shared runner for the test scripts in this folder
+Runs plain test_* functions, reports each one as passed or failed (any exception fails the
+test, not the whole script) and exits non-zero when one failed
+"""
+
+import sys
+import traceback
+
+def run_tests(title, tests):
+    print(title)
+    print("=" * len(title))
+
+    failures = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            failures += 1
+            print(f"❌ {test.__name__}: {e}")
+        except Exception as e:
+            failures += 1
+            print(f"❌ {test.__name__}: {type(e).__name__}: {e}")
+            traceback.print_exc(limit=-3)
+
+    print("=" * len(title))
+    print(f"{len(tests) - failures}/{len(tests)} passed")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Test script for the build fingerprint cache
+Checks that a recorded build is current only while its sources and output are unchanged,
+what counts as a source, the restore fingerprint and invalidation
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'TestRunner'))
+from script_test_runner import run_tests
+from build_fingerprint import (is_build_current, is_restore_current, record_build, record_restore, invalidate,
+                               current_fingerprints, compute_fingerprint, FINGERPRINT_FILE)
+
+def write_file(root, relative, text='x'):
+    path = os.path.join(root, relative)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    return path
+
+def new_project(root):
+    write_file(root, 'VaxCareApiTests.csproj', '<Project />')
+    write_file(root, 'appsettings.json', '{}')
+    write_file(root, os.path.join('Tests', 'InventoryApiTests.cs'), 'class InventoryApiTests {}')
+    write_file(root, os.path.join('bin', 'Debug', 'net8.0', 'VaxCareApiTests.dll'))
+
+def test_current_until_sources_change():
+    """A recorded build is current until a source is edited, added or removed"""
+    with tempfile.TemporaryDirectory() as root:
+        new_project(root)
+        assert not is_build_current(root)
+        record_build(root)
+        assert is_build_current(root)
+
+        source = write_file(root, os.path.join('Tests', 'InventoryApiTests.cs'), 'class InventoryApiTests { }')
+        assert not is_build_current(root)
+        record_build(root)
+        write_file(root, os.path.join('Models', 'Patient.cs'), 'class Patient {}')
+        assert not is_build_current(root)
+        record_build(root)
+        os.remove(source)
+        assert not is_build_current(root)
+        record_build(root)
+        write_file(root, 'appsettings.QA.json', '{}')
+        assert not is_build_current(root)
+
+def test_ignored_files():
+    """Build output, reports and files that aren't sources don't change the fingerprint"""
+    with tempfile.TemporaryDirectory() as root:
+        new_project(root)
+        record_build(root)
+        write_file(root, os.path.join('obj', 'Generated.cs'))
+        write_file(root, os.path.join('bin', 'Debug', 'Other.cs'))
+        write_file(root, os.path.join('TestReports', 'runs', 'EnhancedTestReport.html'))
+        write_file(root, 'README.md')
+        assert is_build_current(root)
+
+def test_stale_fingerprint_from_before_build():
+    """Fingerprints taken before a build that saw a file change mid-build are stale"""
+    with tempfile.TemporaryDirectory() as root:
+        new_project(root)
+        before = current_fingerprints(root)
+        write_file(root, os.path.join('Tests', 'InventoryApiTests.cs'), 'class InventoryApiTests { /* saved */ }')
+        record_build(root, before)
+        assert not is_build_current(root)
+
+def test_requires_build_output():
+    """Without the test assembly under bin/ (e.g. after a clean) the build isn't current"""
+    with tempfile.TemporaryDirectory() as root:
+        new_project(root)
+        record_build(root)
+        os.remove(os.path.join(root, 'bin', 'Debug', 'net8.0', 'VaxCareApiTests.dll'))
+        assert not is_build_current(root)
+
+def test_restore_and_invalidate():
+    """Restore is current while project files and assets are unchanged; invalidate forgets
+    only the build"""
+    with tempfile.TemporaryDirectory() as root:
+        new_project(root)
+        write_file(root, os.path.join('obj', 'project.assets.json'), '{}')
+        record_build(root)
+        write_file(root, os.path.join('Tests', 'New.cs'), 'class New {}')
+        assert is_restore_current(root) and not is_build_current(root)
+        record_build(root)
+
+        invalidate(root)
+        assert not is_build_current(root) and is_restore_current(root)
+        write_file(root, 'VaxCareApiTests.csproj', '<Project Sdk="Microsoft.NET.Sdk" />')
+        assert not is_restore_current(root)
+        record_restore(root)
+        assert is_restore_current(root)
+
+def test_corrupt_record():
+    """An unreadable fingerprint file means nothing was recorded"""
+    with tempfile.TemporaryDirectory() as root:
+        new_project(root)
+        write_file(root, FINGERPRINT_FILE, '{not json')
+        assert not is_build_current(root) and not is_restore_current(root)
+        record_build(root)
+        assert is_build_current(root)
+        assert compute_fingerprint(root) == current_fingerprints(root)['build']
+
+if __name__ == "__main__":
+    run_tests("Testing Build Fingerprint", [
+        test_current_until_sources_change,
+        test_ignored_files,
+        test_stale_fingerprint_from_before_build,
+        test_requires_build_output,
+        test_restore_and_invalidate,
+        test_corrupt_record,
+    ])
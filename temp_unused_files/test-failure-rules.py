@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Test script for the failure classification rule engine
+Checks rule priority, source restrictions, the new TLS/429/5xx categories and hit counters
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'TestRunner'))
+from script_test_runner import run_tests
+from failure_rules import (FailureClassifier, load_rules, first_meaningful_line,
+                           RULE_FIRST_LINE, RULE_UNCLASSIFIED)
+
+def new_classifier():
+    return FailureClassifier(load_rules())
+
+def test_existing_categories():
+    """The original classification chain is reproduced rule for rule"""
+    classifier = new_classifier()
+    cases = [
+        ("System.InvalidOperationException : Network connectivity required for POST", "network-required"),
+        ("System.Net.Http.HttpRequestException : nodename nor servname provided, or not known", "dns-nodename"),
+        ("System.Net.Http.HttpRequestException : Name or service not known (vhapistg.vaxcare.com:443)", "dns-unknown-host"),
+        ("System.Net.Http.HttpRequestException : Connection refused", "http-request-failed"),
+        ("System.Threading.Tasks.TaskCanceledException : The request was canceled", "task-canceled"),
+        ("System.TimeoutException : The operation has timed out", "timeout"),
+        ("Xunit.Sdk.AssertionException : values differ", "assertion"),
+    ]
+    for error_text, rule_id in cases:
+        assert classifier.classify(error_text, None)[2] == rule_id, (error_text, rule_id)
+
+def test_rule_priority():
+    """Earlier rules win even when a later rule's pattern appears first in the text"""
+    classifier = new_classifier()
+    text = "Assertion failed after retry\nSystem.Net.Http.HttpRequestException : Name or service not known"
+    actual_result, failure_reason, rule_id = classifier.classify(text, None)
+    assert rule_id == "dns-unknown-host", rule_id
+    assert failure_reason == "API endpoint not reachable - hostname not found"
+
+def test_invalid_operation_only_in_error_text():
+    """The network-required rule applies to the exception message, not to captured output"""
+    classifier = new_classifier()
+    output = "System.InvalidOperationException: Network connectivity required\nmore output"
+    actual_result, failure_reason, rule_id = classifier.classify(None, output)
+    assert rule_id == RULE_FIRST_LINE, rule_id
+    assert failure_reason == "System.InvalidOperationException: Network connectivity required"
+
+def test_new_categories():
+    """TLS, 429 and 5xx failures get their own categories"""
+    classifier = new_classifier()
+    cases = [
+        ("System.Net.Http.HttpRequestException : The SSL connection could not be established, see inner exception.", "tls-handshake"),
+        ("Expected response.StatusCode to be HttpStatusCode.OK {value: 200}, but found HttpStatusCode.TooManyRequests {value: 429}.", "rate-limited"),
+        ("Expected response.StatusCode to be HttpStatusCode.OK {value: 200}, but found HttpStatusCode.BadGateway {value: 502}.", "server-error"),
+    ]
+    for error_text, rule_id in cases:
+        assert classifier.classify(error_text, None)[2] == rule_id, (error_text, rule_id)
+
+    output = "Request: GET /api/inventory\nResponse Status: ServiceUnavailable\nResponse Reason: Service Unavailable"
+    assert classifier.classify("Expected True but found False", output)[2] == RULE_FIRST_LINE
+    assert classifier.classify(None, output)[2] == "server-error"
+
+def test_generic_fallback():
+    """Empty texts fall back to the generic message"""
+    classifier = new_classifier()
+    assert classifier.classify(None, None) == (
+        "Test execution failed", "Test failed without specific error details", RULE_UNCLASSIFIED)
+    assert first_meaningful_line("\n  \nTest: x\nDescription: y\n  Boom  \n") == "Boom"
+
+def test_hit_counters():
+    """Hit counters accumulate across classifications"""
+    classifier = new_classifier()
+    for _ in range(3):
+        classifier.classify("System.TimeoutException", None)
+    classifier.classify(None, None)
+    assert classifier.hits == {"timeout": 3, RULE_UNCLASSIFIED: 1}, classifier.hits
+
+def test_large_output():
+    """Multi-megabyte output is classified from a single scan"""
+    classifier = new_classifier()
+    output = ("Request: GET /api/inventory\nResponse: OK\n" * 200000) + "System.TimeoutException: timed out\n"
+    assert classifier.classify(None, output)[2] == "timeout"
+
+def test_invalid_pattern_rejected():
+    """Bad patterns are reported with their rule id"""
+    try:
+        FailureClassifier([{"id": "broken", "patterns": ["("], "actual_result": "x"}])
+    except ValueError as e:
+        assert "broken" in str(e)
+    else:
+        assert False, "invalid pattern accepted"
+
+if __name__ == "__main__":
+    run_tests("Testing Failure Classification Rules", [
+        test_existing_categories,
+        test_rule_priority,
+        test_invalid_operation_only_in_error_text,
+        test_new_categories,
+        test_generic_fallback,
+        test_hit_counters,
+        test_large_output,
+        test_invalid_pattern_rejected,
+    ])
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Test script for the single-pass fallback tokenizer used on broken xUnit/TRX files
+Feeds truncated and attribute-reordered documents and checks every test is recovered
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'TestRunner'))
+from script_test_runner import run_tests
+from results_tokenizer import ResultTokenizer, scan_results
+from results_model import parse_results, parse_with_tokenizer
+
+XUNIT_REORDERED = """<?xml version="1.0" encoding="utf-8"?>
+<assemblies>
+  <assembly name="VaxCareApiTests.dll" total="3">
+    <collection name="Test collection">
+      <test type="VaxCareApiTests.Tests.InventoryApiTests" time="0.25" result="Pass" name="VaxCareApiTests.Tests.InventoryApiTests.GetInventory_ShouldReturnInventoryProducts" method="GetInventory_ShouldReturnInventoryProducts" />
+      <test result='Fail' name='VaxCareApiTests.Tests.PatientsClinicTests.GetClinic_ShouldReturnClinicData' time='1.5' type='VaxCareApiTests.Tests.PatientsClinicTests'>
+        <failure exception-type="System.Net.Http.HttpRequestException">
+          <message><![CDATA[System.Net.Http.HttpRequestException : Name or service not known (vhapistg.vaxcare.com:443)]]></message>
+          <stack-trace>at VaxCareApiTests.Services.HttpClientService.GetAsync()</stack-trace>
+        </failure>
+      </test>
+      <test time="0" name="VaxCareApiTests.Tests.SetupCheckDataTests.GetCheckData_ShouldReturnCheckData" type="VaxCareApiTests.Tests.SetupCheckDataTests" result="Skip"><reason>skipped</reason></test>
+    </collection>
+  </assembly>
+</assemblies>
+"""
+
+TRX_TRUNCATED = """<?xml version="1.0" encoding="utf-8"?>
+<TestRun id="1" xmlns="http://microsoft.com/schemas/VisualStudio/TeamTest/2010">
+  <Results>
+    <UnitTestResult outcome="Passed" duration="00:00:01.5000000" testName="VaxCareApiTests.Tests.SetupLocationDataTests.GetLocation_ShouldReturnLocationData" testId="a" />
+    <UnitTestResult testName="VaxCareApiTests.Tests.PatientsAppointmentSyncTests.Sync_ShouldReturnAppointmentData" outcome="Failed" duration="00:01:02.0000000" testId="b">
+      <Output>
+        <StdOut>Request: GET /api/patients/appointment/sync
+Response: {"error": "timeout &amp; retry"}
+System.Threading.Tasks.TaskCanceledException: The request was canceled</StdOut>
+        <ErrorInfo>
+          <Message>System.Threading.Tasks.TaskCanceledException : The operation was canc"""
+
+def test_reordered_attributes():
+    """Attributes are collected regardless of their order or quoting"""
+    elements = scan_results(XUNIT_REORDERED)
+    assert len(elements) == 3, elements
+    assert elements[0]['result'] == 'Pass'
+    assert elements[0]['time'] == '0.25'
+    assert elements[1]['result'] == 'Fail'
+    assert elements[1]['type'] == 'VaxCareApiTests.Tests.PatientsClinicTests'
+    assert 'Name or service not known' in elements[1]['_message']
+    assert elements[2]['result'] == 'Skip'
+
+def test_reordered_attributes_through_model():
+    """The tokenizer fallback produces the same records as the XML tree parser"""
+    path = write_temp(XUNIT_REORDERED, '.xml')
+    try:
+        tree_records = [record.to_list() for record in parse_results(path).records]
+        token_records = [record.to_list() for record in parse_with_tokenizer(path).records]
+        assert tree_records == token_records, (tree_records, token_records)
+        failed = parse_with_tokenizer(path).failed_records[0]
+        assert failed.actual_result == "Network connectivity issue", failed.actual_result
+    finally:
+        os.remove(path)
+
+def test_truncated_xunit():
+    """Tests before the truncation point are recovered; the open one is flagged"""
+    cut = XUNIT_REORDERED.index('<stack-trace>')
+    elements = scan_results(XUNIT_REORDERED[:cut])
+    assert len(elements) == 2, elements
+    assert elements[1].get('_truncated') is True
+    assert 'Name or service not known' in elements[1]['_message']
+
+def test_truncated_trx():
+    """A TRX cut off inside an ErrorInfo message still yields both results"""
+    elements = scan_results(TRX_TRUNCATED)
+    assert len(elements) == 2, elements
+    assert elements[0]['outcome'] == 'Passed'
+    assert elements[1]['outcome'] == 'Failed'
+    assert elements[1]['_truncated'] is True
+    assert 'timeout & retry' in elements[1]['_output']
+    assert elements[1]['_message'].startswith('System.Threading.Tasks.TaskCanceledException')
+
+def test_truncated_trx_through_model():
+    """Truncated TRX files fall back to the tokenizer and keep their failure classification"""
+    path = write_temp(TRX_TRUNCATED, '.trx')
+    try:
+        summary = parse_results(path)
+        assert summary.total_tests == 2
+        assert summary.failed_tests == 1
+        assert summary.failed_records[0].actual_result == "Request timeout"
+    finally:
+        os.remove(path)
+
+def test_chunked_feed_matches_single_pass():
+    """Feeding the document in small pieces gives the same result as one pass"""
+    for chunk_size in (1, 7, 64, 1000):
+        tokenizer = ResultTokenizer()
+        elements = []
+        for offset in range(0, len(XUNIT_REORDERED), chunk_size):
+            elements.extend(tokenizer.feed(XUNIT_REORDERED[offset:offset + chunk_size]))
+        elements.extend(tokenizer.close())
+        assert elements == scan_results(XUNIT_REORDERED), chunk_size
+
+def write_temp(content, suffix):
+    handle, path = tempfile.mkstemp(suffix=suffix)
+    with os.fdopen(handle, 'w', encoding='utf-8') as f:
+        f.write(content)
+    return path
+
+if __name__ == "__main__":
+    run_tests("Testing Fallback Result Tokenizer", [
+        test_reordered_attributes,
+        test_reordered_attributes_through_model,
+        test_truncated_xunit,
+        test_truncated_trx,
+        test_truncated_trx_through_model,
+        test_chunked_feed_matches_single_pass,
+    ])
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Test script for the test impact analysis
+Builds a small C# project in a temporary git repository and checks which test classes a
+change selects: transitive type references, namespace-only files, project-wide inputs,
+deleted files, and the incremental dependency index
+"""
+
+import os
+import sys
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'TestRunner'))
+from script_test_runner import run_tests
+from impact_analysis import (affected_test_classes, load_dependency_index, changed_files, resolve_base,
+                             analyze_source)
+
+SOURCES = {
+    'Models/Patient.cs': """namespace VaxCareApiTests.Models
+{
+    public class Patient { public string Name { get; set; } }
+}
+""",
+    'Services/PatientService.cs': """using VaxCareApiTests.Models;
+namespace VaxCareApiTests.Services
+{
+    public class PatientService { public Patient Load() => new Patient(); }
+}
+""",
+    'Services/Constants.cs': """namespace VaxCareApiTests.Services.Settings;
+// No types here, only attributes applied to the assembly
+[assembly: System.Reflection.AssemblyMetadata("api", "v1")]
+""",
+    'Tests/PatientsTests.cs': """using VaxCareApiTests.Services;
+namespace VaxCareApiTests.Tests
+{
+    public class PatientsTests
+    {
+        [Fact]
+        public void Load_ShouldReturnPatient() { new PatientService().Load(); }
+    }
+}
+""",
+    'Tests/SettingsTests.cs': """using VaxCareApiTests.Services.Settings;
+namespace VaxCareApiTests.Tests
+{
+    public class SettingsTests
+    {
+        [Fact]
+        public void Settings_ShouldLoad() { }
+    }
+}
+""",
+    'Tests/InventoryApiTests.cs': """namespace VaxCareApiTests.Tests
+{
+    public class InventoryApiTests
+    {
+        [Fact]
+        public void GetInventory_ShouldReturnInventoryProducts() { }
+    }
+}
+""",
+    'VaxCareApiTests.csproj': '<Project />\n',
+}
+
+PATIENTS = 'VaxCareApiTests.Tests.PatientsTests'
+SETTINGS = 'VaxCareApiTests.Tests.SettingsTests'
+INVENTORY = 'VaxCareApiTests.Tests.InventoryApiTests'
+
+def git(root, *args):
+    subprocess.run(['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com', *args],
+                   cwd=root, check=True, capture_output=True)
+
+def write_file(root, relative, text):
+    path = os.path.join(root, *relative.split('/'))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    return path
+
+def new_repository(root):
+    for relative, text in SOURCES.items():
+        write_file(root, relative, text)
+    git(root, 'init', '-q')
+    git(root, 'add', '-A')
+    git(root, 'commit', '-q', '-m', 'base')
+
+def affected(root, *relatives):
+    entries, _ = load_dependency_index(root)
+    return affected_test_classes(root, [os.path.join(*relative.split('/')) for relative in relatives],
+                                 entries, resolve_base(root, 'HEAD'))
+
+def test_transitive_dependents():
+    """A model change reaches the tests through the service that references it"""
+    with tempfile.TemporaryDirectory() as root:
+        new_repository(root)
+        assert affected(root, 'Models/Patient.cs') == {PATIENTS}
+        assert affected(root, 'Services/PatientService.cs') == {PATIENTS}
+        assert affected(root, 'Tests/InventoryApiTests.cs') == {INVENTORY}
+
+def test_namespace_only_file():
+    """A file declaring no types selects the files using its namespace"""
+    with tempfile.TemporaryDirectory() as root:
+        new_repository(root)
+        assert affected(root, 'Services/Constants.cs') == {SETTINGS}
+
+def test_project_wide_and_other_files():
+    """Project files select everything (None); files outside the C# sources select nothing"""
+    with tempfile.TemporaryDirectory() as root:
+        new_repository(root)
+        assert affected(root, 'VaxCareApiTests.csproj') is None
+        assert affected(root, 'appsettings.Staging.json') is None
+        assert affected(root, 'TestRunner/run-all-tests.py', 'README.md') == set()
+
+def test_changes_from_git():
+    """Committed, unstaged and untracked changes are found; a deleted type still selects
+    the files that referenced it"""
+    with tempfile.TemporaryDirectory() as root:
+        new_repository(root)
+        base = resolve_base(root, 'HEAD')
+        write_file(root, 'Tests/NewTests.cs', SOURCES['Tests/InventoryApiTests.cs'].replace('InventoryApiTests', 'NewTests'))
+        write_file(root, 'Services/PatientService.cs', SOURCES['Services/PatientService.cs'] + '// edited\n')
+        os.remove(os.path.join(root, 'Models', 'Patient.cs'))
+        changed = changed_files(root, base)
+        assert sorted(changed) == sorted([os.path.join('Models', 'Patient.cs'), os.path.join('Services', 'PatientService.cs'),
+                                          os.path.join('Tests', 'NewTests.cs')]), changed
+
+        entries, _ = load_dependency_index(root)
+        assert affected_test_classes(root, changed, entries, base) == {PATIENTS, 'VaxCareApiTests.Tests.NewTests'}
+
+def test_incremental_index():
+    """Only files whose size or mtime changed are re-scanned"""
+    with tempfile.TemporaryDirectory() as root:
+        new_repository(root)
+        entries, rescanned = load_dependency_index(root)
+        assert rescanned == len(entries) == 6
+        assert load_dependency_index(root)[1] == 0
+        write_file(root, 'Models/Patient.cs', SOURCES['Models/Patient.cs'].replace('Patient', 'Person'))
+        entries, rescanned = load_dependency_index(root)
+        assert rescanned == 1 and entries[os.path.join('Models', 'Patient.cs')]['types'] == ['Person']
+
+def test_analyze_source():
+    """Declared types are not their own references; usings and test classes are listed"""
+    entry = analyze_source(SOURCES['Services/PatientService.cs'])
+    assert entry['types'] == ['PatientService'] and 'Patient' in entry['references']
+    assert 'PatientService' not in entry['references']
+    assert entry['usings'] == ['VaxCareApiTests.Models'] and entry['test_classes'] == []
+
+if __name__ == "__main__":
+    run_tests("Testing Impact Analysis", [
+        test_transitive_dependents,
+        test_namespace_only_file,
+        test_project_wide_and_other_files,
+        test_changes_from_git,
+        test_incremental_index,
+        test_analyze_source,
+    ])
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Test script for the pipeline trace (span API and Chrome trace export)
+Checks span nesting and attributes, error capture, spans from worker processes and the
+trace.json / summary table output
+"""
+
+import os
+import sys
+import json
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'TestRunner'))
+from script_test_runner import run_tests
+import pipeline_trace
+from pipeline_trace import span, traced
+
+def spans_named(name):
+    return [event for event in pipeline_trace.events() if event['name'] == name]
+
+def test_nested_spans():
+    """An inner span lies within its outer span, on the same thread, with its attributes"""
+    with span('outer-test', 'test'):
+        with span('inner-test', 'test', size=3) as attributes:
+            attributes['ok'] = True
+    outer, inner = spans_named('outer-test')[-1], spans_named('inner-test')[-1]
+    assert outer['ts'] <= inner['ts'] and inner['ts'] + inner['dur'] <= outer['ts'] + outer['dur']
+    assert outer['tid'] == inner['tid'] and inner['args'] == {'size': 3, 'ok': True}, inner
+
+def test_error_recorded():
+    """A span that raises is still recorded, with the error, and the error propagates"""
+    try:
+        with span('failing-test', 'test'):
+            raise ValueError('boom')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("the error was swallowed")
+    assert spans_named('failing-test')[-1]['args']['error'] == 'ValueError: boom'
+
+def test_threads_and_decorator():
+    """traced() records every call; spans from other threads get their own tid"""
+    @traced('decorated-test', 'test')
+    def work():
+        return 42
+
+    thread = threading.Thread(target=work)
+    thread.start()
+    thread.join()
+    assert work() == 42
+    events = spans_named('decorated-test')
+    assert len(events) == 2 and events[0]['tid'] != events[1]['tid'], events
+
+def _worker(_):
+    position = pipeline_trace.mark()
+    with span('worker-test', 'test'):
+        pass
+    return pipeline_trace.events_since(position)
+
+def test_worker_events():
+    """Spans returned from a worker process carry its pid and only its own events"""
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        events = executor.submit(_worker, None).result()
+    assert [event['name'] for event in events] == ['worker-test'], events
+    assert events[0]['pid'] != os.getpid()
+    pipeline_trace.add_events(events)
+
+def test_write_trace():
+    """trace.json is valid Chrome trace JSON and the summary covers every span name"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = pipeline_trace.write_trace(directory)
+        with open(path, 'r', encoding='utf-8') as f:
+            trace = json.load(f)
+    complete = [event for event in trace['traceEvents'] if event['ph'] == 'X']
+    assert len(complete) == len(pipeline_trace.events())
+    assert any(event['ph'] == 'M' and event['name'] == 'thread_name' for event in trace['traceEvents'])
+    table = '\n'.join(pipeline_trace.summary_lines())
+    for name in ('outer-test', 'inner-test', 'decorated-test', 'worker-test', 'wall time'):
+        assert name in table, table
+
+def test_finish_trace():
+    """A script run on its own prints the table and writes its own trace, next to a run's trace.json"""
+    with tempfile.TemporaryDirectory() as directory:
+        lines = []
+        path = pipeline_trace.finish_trace(directory, 'report-test', log=lines.append)
+        assert path == os.path.join(directory, 'report-test.trace.json')
+        assert not os.path.exists(os.path.join(directory, pipeline_trace.TRACE_FILE))
+        with open(path, 'r', encoding='utf-8') as f:
+            trace = json.load(f)
+    assert {'name': 'report-test'} in [event['args'] for event in trace['traceEvents'] if event['name'] == 'process_name']
+    assert lines[0] == 'Pipeline timing:' and lines[-1].startswith('Trace: ')
+
+if __name__ == "__main__":
+    run_tests("Testing Pipeline Trace", [
+        test_nested_spans,
+        test_error_recorded,
+        test_threads_and_decorator,
+        test_worker_events,
+        test_write_trace,
+        test_finish_trace,
+    ])
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Test script for the report manifest
+Checks recording and look-ups (latest, by run, list), removals, the incremental index, the
+pointer files behind latest/by run and creating the manifest from a directory of older reports
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'TestRunner'))
+from script_test_runner import run_tests
+from report_manifest import (ReportManifest, ARTIFACT_TRX, ARTIFACT_HTML, ARTIFACT_COMPARISON, HTML_ARTIFACTS,
+                             MANIFEST_FILE, INDEX_FILE, POINTER_DIR, COMPACT_AFTER_LINES)
+
+def write_file(directory, *parts):
+    path = os.path.join(directory, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('x')
+    return path
+
+def test_record_and_lookups():
+    """latest/by_run/entries answer from what was recorded, newest last"""
+    with tempfile.TemporaryDirectory() as directory:
+        manifest = ReportManifest(directory)
+        first = write_file(directory, 'TestResults_2025-01-01_10-00-00.trx')
+        manifest.record(first, ARTIFACT_TRX, 'run-1', 'Staging')
+        second = write_file(directory, 'environments', 'run-2', 'QA', 'TestResults_run-2_QA.trx')
+        manifest.record(second, ARTIFACT_TRX, 'run-2', 'QA')
+        report = write_file(directory, 'EnhancedTestReport_run-2.html')
+        manifest.record(report, ARTIFACT_HTML, 'run-2', 'QA', {'total': 3, 'passed': 2, 'failed': 1, 'skipped': 0})
+
+        fresh = ReportManifest(directory)
+        assert fresh.latest(ARTIFACT_TRX) == second
+        assert fresh.latest(ARTIFACT_TRX, environment='Staging') == first
+        assert fresh.latest(HTML_ARTIFACTS) == report
+        assert [entry['path'] for entry in fresh.by_run('run-2')] == [
+            'environments/run-2/QA/TestResults_run-2_QA.trx', 'EnhancedTestReport_run-2.html']
+        assert fresh.entries(ARTIFACT_HTML)[0]['counts']['failed'] == 1
+        assert fresh.runs() == ['run-1', 'run-2']
+
+def test_removed_and_deleted():
+    """A removal is dropped from the index; a file deleted behind its back is skipped"""
+    with tempfile.TemporaryDirectory() as directory:
+        manifest = ReportManifest(directory)
+        older = write_file(directory, 'EnhancedTestReport_1.html')
+        manifest.record(older, ARTIFACT_HTML, 'run-1')
+        newer = write_file(directory, 'EnvironmentComparison_2.html')
+        manifest.record(newer, ARTIFACT_COMPARISON, 'run-2')
+        newest = write_file(directory, 'EnhancedTestReport_3.html')
+        manifest.record(newest, ARTIFACT_HTML, 'run-3')
+
+        os.remove(newest)
+        assert ReportManifest(directory).latest(HTML_ARTIFACTS) == newer
+        os.remove(newer)
+        ReportManifest(directory).record_removed([newer])
+        fresh = ReportManifest(directory)
+        assert fresh.latest(HTML_ARTIFACTS) == older
+        assert 'run-2' not in fresh.runs()
+
+def test_incremental_index():
+    """The index folds in appended lines and is rewritten once many are not in it"""
+    with tempfile.TemporaryDirectory() as directory:
+        manifest = ReportManifest(directory)
+        path = write_file(directory, 'TestResults_a.trx')
+        manifest.record(path, ARTIFACT_TRX, 'run-0')
+        ReportManifest(directory).entries()
+        with open(os.path.join(directory, INDEX_FILE), 'r', encoding='utf-8') as f:
+            covered = json.load(f)['covered']
+
+        for number in range(1, COMPACT_AFTER_LINES):
+            manifest.record(path, ARTIFACT_TRX, f'run-{number}')
+        assert ReportManifest(directory).entries()[0]['run_id'] == f'run-{COMPACT_AFTER_LINES - 1}'
+        with open(os.path.join(directory, INDEX_FILE), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        assert index['covered'] > covered and index['covered'] == os.path.getsize(os.path.join(directory, MANIFEST_FILE))
+
+        # A corrupt index is rebuilt from the manifest
+        with open(os.path.join(directory, INDEX_FILE), 'w', encoding='utf-8') as f:
+            f.write('{not json')
+        assert ReportManifest(directory).runs() == [f'run-{COMPACT_AFTER_LINES - 1}']
+
+def test_pointer_lookups():
+    """latest and by_run read the small pointer files, never the index; a manifest from before
+    the pointers gets them once, and a file recorded again leaves its old run"""
+    with tempfile.TemporaryDirectory() as directory:
+        manifest = ReportManifest(directory)
+        trx = write_file(directory, 'runs', 'run-1', 'TestResults_run-1.trx')
+        manifest.record(trx, ARTIFACT_TRX, 'run-1')
+        report = write_file(directory, 'runs', 'run-2', 'EnhancedTestReport_run-2.html')
+        manifest.record(report, ARTIFACT_HTML, 'run-2')
+        watch = write_file(directory, 'EnhancedTestReport_Watch.html')
+        manifest.record(watch, ARTIFACT_HTML, 'run-3')
+        manifest.record(watch, ARTIFACT_HTML, 'run-4')
+
+        def no_index():
+            raise AssertionError("the index was loaded")
+        fresh = ReportManifest(directory)
+        fresh._load_index = no_index
+        assert fresh.latest(ARTIFACT_TRX) == trx and fresh.latest(HTML_ARTIFACTS) == watch
+        assert [entry['path'] for entry in fresh.by_run('run-2')] == ['runs/run-2/EnhancedTestReport_run-2.html']
+        assert fresh.by_run('run-3') == [] and fresh.by_run('run-4')[0]['path'] == 'EnhancedTestReport_Watch.html'
+
+        # Pointers are recreated from the manifest when missing, and follow removals
+        shutil.rmtree(os.path.join(directory, POINTER_DIR))
+        assert ReportManifest(directory).latest(ARTIFACT_TRX) == trx
+        assert os.path.isdir(os.path.join(directory, POINTER_DIR))
+        os.remove(watch)
+        ReportManifest(directory).record_removed([watch])
+        fresh = ReportManifest(directory)
+        fresh._load_index = no_index
+        assert fresh.latest(HTML_ARTIFACTS) == report and fresh.by_run('run-4') == []
+
+def test_created_from_existing_reports():
+    """A directory of older reports (no manifest yet) is scanned once to create it (without
+    the watch folder)"""
+    with tempfile.TemporaryDirectory() as directory:
+        full_run = write_file(directory, 'TestResults_2025-01-01_10-00-00.trx')
+        rerun = write_file(directory, 'TestResults_2025-01-01_10-05-00_rerun.trx')
+        os.utime(full_run, (time.time() - 60, time.time() - 60))
+        write_file(directory, 'environments', '2025-01-02_09-00-00', 'QA', 'EnhancedTestReport_x.html')
+        write_file(directory, 'notes.txt')
+        write_file(directory, 'runs', 'watch', 'TestResults_watch.trx')
+
+        manifest = ReportManifest(directory)
+        assert manifest.latest(ARTIFACT_TRX) == rerun
+        entries = {entry['path']: entry for entry in manifest.entries()}
+        assert len(entries) == 3 and entries['TestResults_2025-01-01_10-05-00_rerun.trx']['partial']
+        report = entries['environments/2025-01-02_09-00-00/QA/EnhancedTestReport_x.html']
+        assert report['environment'] == 'QA' and report['run_id'] == '2025-01-02_09-00-00'
+        assert os.path.exists(os.path.join(directory, MANIFEST_FILE))
+
+if __name__ == "__main__":
+    run_tests("Testing Report Manifest", [
+        test_record_and_lookups,
+        test_removed_and_deleted,
+        test_incremental_index,
+        test_pointer_lookups,
+        test_created_from_existing_reports,
+    ])
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Test script for the report retention
+Checks the count/age/size policies, failing and in-flight runs being kept, unpublished runs
+never being scanned, dry runs and deleting whole runs (with the manifest updated)
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'TestRunner'))
+from script_test_runner import run_tests
+from report_manifest import ReportManifest, ARTIFACT_TRX, ARTIFACT_HTML, ARTIFACT_PREFLIGHT
+from report_retention import (RetentionPolicy, ReportRun, plan_retention, apply_retention, scan_runs,
+                              REASON_COUNT, REASON_AGE, REASON_SIZE, RETENTION_LOG_FILE)
+
+DAY = 86400
+NOW = time.time()
+
+def make_run(run_id, days_old, size=100, failed=False):
+    run = ReportRun(run_id)
+    run.add(f'{run_id}.trx', size, NOW - days_old * DAY)
+    run.failed = failed
+    return run
+
+def removed_ids(removed):
+    return {run.run_id: reason for run, reason in removed}
+
+def test_keep_last_runs():
+    """Only the newest N runs are kept; failing runs don't count with keep_failing"""
+    runs = [make_run(f'r{days}', days, failed=(days == 3)) for days in range(1, 6)]
+    _, removed = plan_retention(runs, RetentionPolicy(keep_runs=2), now=NOW)
+    assert removed_ids(removed) == {'r3': REASON_COUNT, 'r4': REASON_COUNT, 'r5': REASON_COUNT}
+    _, removed = plan_retention(runs, RetentionPolicy(keep_runs=2, keep_failing=True), now=NOW)
+    assert removed_ids(removed) == {'r4': REASON_COUNT, 'r5': REASON_COUNT}
+
+def test_age_and_size():
+    """Runs over the age are removed unless failing with keep_failing; the size limit removes
+    oldest first"""
+    runs = [make_run(f'r{days}', days, size=100, failed=(days == 9)) for days in (1, 2, 3, 8, 9)]
+    _, removed = plan_retention(runs, RetentionPolicy(max_age_days=5), now=NOW)
+    assert removed_ids(removed) == {'r8': REASON_AGE, 'r9': REASON_AGE}
+    _, removed = plan_retention(runs, RetentionPolicy(max_age_days=5, keep_failing=True), now=NOW)
+    assert removed_ids(removed) == {'r8': REASON_AGE}
+    runs = [run for run in runs if run.run_id != 'r8']
+    kept, removed = plan_retention(runs, RetentionPolicy(max_bytes=250, keep_failing=True), now=NOW)
+    assert removed_ids(removed) == {'r3': REASON_SIZE, 'r2': REASON_SIZE}, removed_ids(removed)
+    assert [run.run_id for run in kept] == ['r1', 'r9']
+
+def test_protected_runs():
+    """The newest run, protected run ids and recently written runs are never removed"""
+    runs = [make_run('in-flight', 0.001), make_run('current', 4), make_run('old', 5), make_run('older', 6)]
+    _, removed = plan_retention(runs, RetentionPolicy(keep_runs=0, max_age_days=1), protected=('current',), now=NOW)
+    assert removed_ids(removed) == {'old': REASON_AGE, 'older': REASON_AGE}
+    _, removed = plan_retention([make_run('only', 30)], RetentionPolicy(max_age_days=1), now=NOW)
+    assert not removed
+
+def write_old_file(path, days_old):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('x')
+    os.utime(path, (NOW - days_old * DAY, NOW - days_old * DAY))
+    return path
+
+def test_unpublished_runs_not_scanned():
+    """Staging and scratch folders, an unrecorded preflight.json, the retention log and the
+    watch folder are never scanned, however old"""
+    with tempfile.TemporaryDirectory() as directory:
+        runs = os.path.join(directory, 'runs')
+        published = write_old_file(os.path.join(runs, '2025-01-01_10-00-00', 'TestResults_2025-01-01_10-00-00.trx'), 30)
+        ReportManifest(directory).record(published, ARTIFACT_TRX, '2025-01-01_10-00-00')
+        unpublished = [
+            write_old_file(os.path.join(runs, '.2025-01-02_10-00-00.tmp', 'TestResults_2025-01-02_10-00-00.trx'), 30),
+            write_old_file(os.path.join(runs, '.2025-01-02_10-00-00.tmp', 'QA', 'dotnet-test.log'), 30),
+            write_old_file(os.path.join(runs, '.2025-01-02_10-00-00.pdf.tmp', 'Report.pdf'), 30),
+            write_old_file(os.path.join(directory, 'preflight.json'), 30),
+            write_old_file(os.path.join(directory, RETENTION_LOG_FILE), 30),
+            write_old_file(os.path.join(runs, 'watch', 'TestResults_watch.trx'), 30),
+        ]
+        assert list(scan_runs(directory)) == ['2025-01-01_10-00-00']
+        apply_retention(directory, RetentionPolicy(keep_runs=0, max_age_days=1), log=lambda line: None)
+        assert all(os.path.exists(path) for path in unpublished)
+
+        # Once recorded, the preflight result belongs to its (aborted) run
+        ReportManifest(directory).record(unpublished[3], ARTIFACT_PREFLIGHT, '2025-01-03_10-00-00')
+        assert sorted(scan_runs(directory)) == ['2025-01-01_10-00-00', '2025-01-03_10-00-00']
+
+def test_apply_removes_whole_runs():
+    """Every file of a removed run goes (not with dry_run), empty folders too, and the
+    manifest no longer lists it"""
+    with tempfile.TemporaryDirectory() as directory:
+        manifest = ReportManifest(directory)
+        for run_id, days_old in (('2025-01-01_10-00-00', 3), ('2025-01-02_10-00-00', 2), ('2025-01-03_10-00-00', 1)):
+            folder = os.path.join(directory, 'shards', run_id, 'shard1')
+            os.makedirs(folder)
+            for name, artifact_type in ((f'TestResults_{run_id}.trx', ARTIFACT_TRX), (f'Report_{run_id}.html', ARTIFACT_HTML)):
+                path = os.path.join(folder, name)
+                with open(path, 'w', encoding='utf-8') as f:
+                    f.write('x')
+                os.utime(path, (NOW - days_old * DAY, NOW - days_old * DAY))
+                manifest.record(path, artifact_type, run_id)
+        assert len(scan_runs(directory)) == 3
+
+        removed, _ = apply_retention(directory, RetentionPolicy(keep_runs=1), dry_run=True, log=lambda line: None)
+        assert len(removed) == 2 and len(scan_runs(directory)) == 3
+        removed, freed = apply_retention(directory, RetentionPolicy(keep_runs=1), log=lambda line: None)
+        assert freed == 4 and list(scan_runs(directory)) == ['2025-01-03_10-00-00']
+        assert os.listdir(os.path.join(directory, 'shards')) == ['2025-01-03_10-00-00']
+        assert ReportManifest(directory).runs() == ['2025-01-03_10-00-00']
+
+if __name__ == "__main__":
+    run_tests("Testing Report Retention", [
+        test_keep_last_runs,
+        test_age_and_size,
+        test_protected_runs,
+        test_unpublished_runs_not_scanned,
+        test_apply_removes_whole_runs,
+    ])
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Test script for the parsed results cache
+Checks cache hits, the size/mtime/content-hash validation, invalidation by the rule tables
+and CACHE_VERSION, and that a cold parse doesn't read the file again to hash it
+"""
+
+import os
+import sys
+import time
+import json
+import hashlib
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'TestRunner'))
+from script_test_runner import run_tests
+import results_cache
+from results_cache import load_results, load_cached_summary, cache_path_for
+
+XUNIT = """<?xml version="1.0" encoding="utf-8"?>
+<assemblies>
+  <assembly name="VaxCareApiTests.dll" total="2" time="1.75">
+    <collection name="Test collection">
+      <test name="VaxCareApiTests.Tests.InventoryApiTests.GetInventory_ShouldReturnInventoryProducts" type="VaxCareApiTests.Tests.InventoryApiTests" time="0.25" result="Pass" />
+      <test name="VaxCareApiTests.Tests.PatientsClinicTests.GetClinic_ShouldReturnClinicData" type="VaxCareApiTests.Tests.PatientsClinicTests" time="1.5" result="Fail">
+        <failure><message>System.Net.Http.HttpRequestException : Connection refused</message></failure>
+      </test>
+    </collection>
+  </assembly>
+</assemblies>
+"""
+
+TRX = """<?xml version="1.0" encoding="utf-8"?>
+<TestRun id="1" xmlns="http://microsoft.com/schemas/VisualStudio/TeamTest/2010">
+  <Results>
+    <UnitTestResult testId="t1" testName="VaxCareApiTests.Tests.InventoryApiTests.GetInventory_ShouldReturnInventoryProducts" duration="00:00:01.5000000" outcome="Passed" />
+  </Results>
+  <TestDefinitions><UnitTest id="t1" name="GetInventory_ShouldReturnInventoryProducts" /></TestDefinitions>
+</TestRun>
+"""
+
+class Patched:
+    """Temporarily replace a results_cache attribute"""
+
+    def __init__(self, name, value):
+        self.name = name
+        self.value = value
+
+    def __enter__(self):
+        self.original = getattr(results_cache, self.name)
+        setattr(results_cache, self.name, self.value)
+
+    def __exit__(self, *exc):
+        setattr(results_cache, self.name, self.original)
+
+def no_parse(*args, **kwargs):
+    raise AssertionError("parsed although the cache is valid")
+
+def write_file(directory, name, content):
+    path = os.path.join(directory, name)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    return path
+
+def records(summary):
+    return [record.to_list() for record in summary.records]
+
+def test_hit_without_parsing():
+    """The first load parses and writes the sidecar; the next one comes from it"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = write_file(directory, 'run.xml', XUNIT)
+        first = load_results(path, test_info={})
+        assert os.path.exists(cache_path_for(path))
+        with Patched('parse_results', no_parse):
+            second = load_results(path, test_info={})
+        assert records(second) == records(first) and second.total_runtime_seconds == 1.75
+        assert second.source_path == path
+
+def test_cold_parse_hashes_while_reading():
+    """The stored hash comes from the parse (TRX and xUnit) without reading the file again"""
+    def no_rehash(path):
+        raise AssertionError("result file read again to hash it")
+    with tempfile.TemporaryDirectory() as directory:
+        for name, content in (('run.xml', XUNIT), ('run.trx', TRX)):
+            path = write_file(directory, name, content)
+            with Patched('file_sha256', no_rehash):
+                load_results(path, test_info={})
+            with open(cache_path_for(path), 'r', encoding='utf-8') as f:
+                stored = json.load(f)['source']['sha256']
+            with open(path, 'rb') as f:
+                assert stored == hashlib.sha256(f.read()).hexdigest(), name
+
+def test_size_and_content_changes():
+    """A different size is a miss; the same size with a new mtime is checked by hash"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = write_file(directory, 'run.xml', XUNIT)
+        load_results(path, test_info={})
+
+        # Touched (e.g. copied) but unchanged: still valid, and the new mtime is recorded
+        later = time.time() + 60
+        os.utime(path, (later, later))
+        assert load_cached_summary(path) is not None
+        with open(cache_path_for(path), 'r', encoding='utf-8') as f:
+            assert json.load(f)['source']['mtime_ns'] == os.stat(path).st_mtime_ns
+
+        # Same size, different content
+        write_file(directory, 'run.xml', XUNIT.replace('result="Fail"', 'result="Pass"'))
+        assert load_cached_summary(path) is None
+        assert load_results(path, test_info={}).failed_tests == 0
+
+        write_file(directory, 'run.xml', XUNIT.replace('time="0.25"', 'time="0.5"'))
+        assert load_cached_summary(path) is None
+
+def test_rules_and_version_invalidate():
+    """Editing the rule tables or bumping CACHE_VERSION discards existing sidecars"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = write_file(directory, 'run.xml', XUNIT)
+        load_results(path, test_info={})
+        assert load_cached_summary(path) is not None
+        with Patched('_rules_fingerprint', 'edited rules'):
+            assert load_cached_summary(path) is None
+        with Patched('CACHE_VERSION', results_cache.CACHE_VERSION + 1):
+            assert load_cached_summary(path) is None
+        assert load_cached_summary(path) is not None
+
+def test_corrupt_sidecar_and_no_cache():
+    """A corrupt sidecar is a miss; use_cache=False neither reads nor writes one"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = write_file(directory, 'run.xml', XUNIT)
+        load_results(path, test_info={}, use_cache=False)
+        assert not os.path.exists(cache_path_for(path))
+        write_file(directory, 'run.xml' + results_cache.CACHE_SUFFIX, '{not json')
+        assert load_cached_summary(path) is None
+        assert load_results(path, test_info={}).total_tests == 2
+        assert load_cached_summary(path) is not None
+
+if __name__ == "__main__":
+    run_tests("Testing Results Cache", [
+        test_hit_without_parsing,
+        test_cold_parse_hashes_while_reading,
+        test_size_and_content_changes,
+        test_rules_and_version_invalidate,
+        test_corrupt_sidecar_and_no_cache,
+    ])
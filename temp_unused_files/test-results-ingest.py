@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Test script for result file ingestion
+Checks encoding detection (UTF-8/UTF-16 byte order marks, XML declaration), the latin-1
+retry, trimming junk around the document by byte offset, memory-mapping of large files and
+a truncated file
+"""
+
+import os
+import sys
+import mmap
+import codecs
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'TestRunner'))
+from script_test_runner import run_tests
+import results_ingest
+from results_ingest import open_result_document, parse_document, detect_encoding, candidate_encodings
+from results_model import parse_results, OUTCOME_PASSED, OUTCOME_FAILED
+
+XUNIT = """<?xml version="1.0" encoding="{encoding}"?>
+<assemblies>
+  <assembly name="VaxCareApiTests.dll" total="2" time="1.75">
+    <collection name="Test collection">
+      <test name="VaxCareApiTests.Tests.InventoryApiTests.GetInventory_ShouldReturnInventoryProducts" type="VaxCareApiTests.Tests.InventoryApiTests" time="0.25" result="Pass" />
+      <test name="VaxCareApiTests.Tests.PatientsClinicTests.GetClinic_ShouldReturn{suffix}" type="VaxCareApiTests.Tests.PatientsClinicTests" time="1.5" result="Fail">
+        <failure><message>System.Net.Http.HttpRequestException : Connection refused</message></failure>
+      </test>
+    </collection>
+  </assembly>
+</assemblies>"""
+
+def xunit(encoding='utf-8', suffix='ClinicData'):
+    return XUNIT.format(encoding=encoding, suffix=suffix)
+
+def write_bytes(directory, name, data):
+    path = os.path.join(directory, name)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+def check_summary(summary, suffix='ClinicData'):
+    assert [record.outcome for record in summary.records] == [OUTCOME_PASSED, OUTCOME_FAILED], summary.records
+    assert summary.records[1].full_name.endswith(f'GetClinic_ShouldReturn{suffix}'), summary.records[1].full_name
+
+def test_byte_order_marks():
+    """UTF-8 (utf-8-sig), UTF-16 LE and UTF-16 BE files are detected and parsed by the tree parser"""
+    cases = (
+        ('utf-8-sig', codecs.BOM_UTF8 + xunit('utf-8').encode('utf-8')),
+        ('utf-16-le', codecs.BOM_UTF16_LE + xunit('utf-16').encode('utf-16-le')),
+        ('utf-16-be', codecs.BOM_UTF16_BE + xunit('utf-16').encode('utf-16-be')),
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        for name, data in cases:
+            path = write_bytes(directory, f'{name}.xml', data)
+            with open_result_document(path) as document:
+                assert document.encoding == 'utf-8', (name, document.encoding)  # wide encodings are re-encoded once
+                assert bytes(document.buffer[document.start:document.start + 11]) == b'<assemblies', name
+                assert parse_document(document).tag == 'assemblies'
+            summary = parse_results(path)
+            check_summary(summary)
+            assert summary.records[0].duration == 0.25, name
+
+def test_declared_encoding():
+    """Without a BOM the XML declaration decides; a missing or unknown one means UTF-8"""
+    assert detect_encoding(xunit('ISO-8859-1').encode('latin-1')) == 'iso-8859-1'
+    assert detect_encoding(xunit('no-such-codec').encode('utf-8')) == 'utf-8'
+    assert detect_encoding(b'<assemblies />') == 'utf-8'
+
+def test_latin1_retry():
+    """A file declared UTF-8 but written as latin-1 fails the first parse and is read as latin-1"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = write_bytes(directory, 'latin1.xml', xunit('utf-8', 'CaféData').encode('latin-1'))
+        with open_result_document(path) as document:
+            assert candidate_encodings(document) == ['utf-8', 'latin-1']
+        summary = parse_results(path)
+        check_summary(summary, 'CaféData')
+        assert summary.total_runtime_seconds == 1.75  # from the tree parse, not the tokenizer
+
+def test_trimmed_by_byte_offset():
+    """Console noise before the root element and after its closing tag is cut off"""
+    with tempfile.TemporaryDirectory() as directory:
+        data = b'Build succeeded.\r\n' + xunit().encode('utf-8') + b'\nTest run finished.\n<junk'
+        path = write_bytes(directory, 'noisy.xml', data)
+        with open_result_document(path) as document:
+            window = bytes(document.view())
+            assert window.startswith(b'<assemblies') and window.endswith(b'</assemblies>')
+            assert document.start == data.index(b'<assemblies')
+        check_summary(parse_results(path))
+
+def test_memory_mapped_large_file():
+    """Files at the threshold are memory-mapped, smaller ones read; both parse the same"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = write_bytes(directory, 'run.xml', xunit().encode('utf-8'))
+        with open_result_document(path) as document:
+            assert isinstance(document.buffer, bytes)
+        original = results_ingest.MMAP_THRESHOLD_BYTES
+        results_ingest.MMAP_THRESHOLD_BYTES = os.path.getsize(path)
+        try:
+            with open_result_document(path) as document:
+                assert isinstance(document.buffer, mmap.mmap)
+                buffer = document.buffer
+            assert buffer.closed
+            check_summary(parse_results(path))
+        finally:
+            results_ingest.MMAP_THRESHOLD_BYTES = original
+
+def test_truncated_file():
+    """A file cut off mid-test has no closing tag: the window runs to the end and the
+    tokenizer recovers the complete tests"""
+    with tempfile.TemporaryDirectory() as directory:
+        data = xunit().encode('utf-8')
+        data = data[:data.index(b'<failure>') + 20]
+        path = write_bytes(directory, 'truncated.xml', data)
+        with open_result_document(path) as document:
+            assert document.end == len(data)
+        summary = parse_results(path)
+        assert summary.records[0].outcome == OUTCOME_PASSED
+        assert summary.source_sha256 is not None
+
+if __name__ == "__main__":
+    run_tests("Testing Result File Ingestion", [
+        test_byte_order_marks,
+        test_declared_encoding,
+        test_latin1_retry,
+        test_trimmed_by_byte_offset,
+        test_memory_mapped_large_file,
+        test_truncated_file,
+    ])
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Test script for merging several result files
+Checks the retried-test de-duplication (latest attempt wins), the run window union, the
+declared runtime of shards without a window, path expansion and the parallel load
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'TestRunner'))
+from script_test_runner import run_tests
+from results_model import RunSummary, TestRecord, FORMAT_TRX, FORMAT_XUNIT, OUTCOME_PASSED, OUTCOME_FAILED
+from results_merge import merge_summaries, expand_result_paths, load_merged_results, FORMAT_MIXED
+from results_cache import CACHE_SUFFIX
+
+TRX = """<?xml version="1.0" encoding="utf-8"?>
+<TestRun id="{name}" xmlns="http://microsoft.com/schemas/VisualStudio/TeamTest/2010">
+  <Times start="{start}" finish="{finish}" />
+  <Results>
+{results}
+  </Results>
+</TestRun>
+"""
+TRX_RESULT = '    <UnitTestResult testName="VaxCareApiTests.Tests.{name}" duration="00:00:01" outcome="{outcome}" />'
+
+def summary(name, records, start=None, finish=None, declared=None, source_format=FORMAT_TRX):
+    return RunSummary([TestRecord(f'VaxCareApiTests.Tests.{test}', test.split('.')[0], outcome)
+                       for test, outcome in records], source_format, name, start, finish, declared)
+
+def write_trx(directory, name, start, finish, results):
+    path = os.path.join(directory, name)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(TRX.format(name=name, start=start, finish=finish, results='\n'.join(
+            TRX_RESULT.format(name=test, outcome=outcome) for test, outcome in results)))
+    return path
+
+def test_latest_attempt_wins():
+    """A retried test keeps its first position but takes the outcome of the later run,
+    whatever order the files are given in"""
+    first = summary('run.trx', [('A.One', OUTCOME_PASSED), ('A.Two', OUTCOME_FAILED), ('B.Three', OUTCOME_FAILED)],
+                    '2025-01-01T10:00:00.0000000+00:00', '2025-01-01T10:05:00.0000000+00:00')
+    rerun = summary('rerun.trx', [('B.Three', OUTCOME_PASSED), ('A.Two', OUTCOME_PASSED)],
+                    '2025-01-01T11:00:00.0000000+00:00', '2025-01-01T11:01:00.0000000+00:00')
+    for order in ([first, rerun], [rerun, first]):
+        merged = merge_summaries(order)
+        assert [(record.full_name.split('.')[-1], record.outcome) for record in merged.records] == [
+            ('One', OUTCOME_PASSED), ('Two', OUTCOME_PASSED), ('Three', OUTCOME_PASSED)]
+        assert merged.duplicates_dropped == 2 and merged.failed_tests == 0
+        assert merged.merged_from == ['run.trx', 'rerun.trx']
+
+def test_run_window_union():
+    """Shards that overlap count once: earliest start to latest finish, across time zones"""
+    shard1 = summary('s1.trx', [('A.One', OUTCOME_PASSED)],
+                     '2025-01-01T10:00:00.0000000+00:00', '2025-01-01T10:02:00.0000000+00:00')
+    shard2 = summary('s2.trx', [('B.Two', OUTCOME_PASSED)],
+                     '2025-01-01T06:01:00.0000000-04:00', '2025-01-01T06:03:30.0000000-04:00')
+    merged = merge_summaries([shard1, shard2])
+    assert merged.run_start == shard1.run_start and merged.run_finish == shard2.run_finish
+    assert merged.total_runtime_seconds == 210.0
+    assert merged.source_format == FORMAT_TRX and merged.total_tests == 2
+
+def test_declared_runtime_is_longest_shard():
+    """xUnit shards without a run window ran side by side: the runtime is the longest one,
+    not the sum; mixed formats are reported as such"""
+    merged = merge_summaries([
+        summary('a.xml', [('A.One', OUTCOME_PASSED)], declared=12.0, source_format=FORMAT_XUNIT),
+        summary('b.xml', [('B.Two', OUTCOME_PASSED)], declared=30.0, source_format=FORMAT_XUNIT),
+        summary('c.trx', [('C.Three', OUTCOME_PASSED)]),
+    ])
+    assert merged.declared_runtime == 30.0 and merged.total_runtime_seconds == 30.0
+    assert merged.source_format == FORMAT_MIXED
+
+def test_expand_paths():
+    """Globs, comma lists and plain paths expand to existing files, without cache sidecars
+    or duplicates"""
+    with tempfile.TemporaryDirectory() as directory:
+        paths = [os.path.join(directory, 'shards', name, f'TestResults_{name}.trx') for name in ('s1', 's2')]
+        for path in paths + [paths[0] + CACHE_SUFFIX]:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, 'w').close()
+        pattern = os.path.join(directory, 'shards', '**', '*.trx*')
+        assert expand_result_paths(pattern) == paths
+        assert expand_result_paths(f"{paths[1]}, {paths[0]},{paths[1]}") == [paths[1], paths[0]]
+        assert expand_result_paths([os.path.join(directory, 'missing.trx')]) == []
+
+def test_parallel_load():
+    """Several files are parsed in worker processes and merged like merge_summaries"""
+    with tempfile.TemporaryDirectory() as directory:
+        write_trx(directory, 'shard1.trx', '2025-01-01T10:00:00.0000000+00:00', '2025-01-01T10:01:00.0000000+00:00',
+                  [('A.One', 'Passed'), ('A.Two', 'Failed')])
+        write_trx(directory, 'shard2.trx', '2025-01-01T10:00:30.0000000+00:00', '2025-01-01T10:02:00.0000000+00:00',
+                  [('B.Three', 'Passed')])
+        write_trx(directory, 'rerun.trx', '2025-01-01T10:10:00.0000000+00:00', '2025-01-01T10:10:05.0000000+00:00',
+                  [('A.Two', 'Passed')])
+        merged = load_merged_results(os.path.join(directory, '*.trx'), test_info={}, use_cache=False)
+        assert (merged.total_tests, merged.passed_tests, merged.duplicates_dropped) == (3, 3, 1)
+        assert merged.total_runtime_seconds == 605.0
+        assert len(merged.merged_from) == 3
+
+if __name__ == "__main__":
+    run_tests("Testing Results Merge", [
+        test_latest_attempt_wins,
+        test_run_window_union,
+        test_declared_runtime_is_longest_shard,
+        test_expand_paths,
+        test_parallel_load,
+    ])
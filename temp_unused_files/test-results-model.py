@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Test script for the shared results model
+Parses small TRX and xUnit files and checks the records (fields, definition join, failure
+classification), the counts and rates, skipped handling and the TestInfo overlay
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'TestRunner'))
+from script_test_runner import run_tests
+from results_model import (parse_results, apply_test_info, RunSummary, OUTCOME_PASSED, OUTCOME_FAILED,
+                           OUTCOME_SKIPPED, FORMAT_TRX, FORMAT_XUNIT)
+from report_pipeline import load_script, XML_REPORT_SCRIPT
+
+# Results come before their definitions, as dotnet test writes them; the second result has
+# no testId and is joined to its definition through TestEntries
+TRX = """<?xml version="1.0" encoding="utf-8"?>
+<TestRun id="1" xmlns="http://microsoft.com/schemas/VisualStudio/TeamTest/2010">
+  <Times creation="2025-01-01T10:00:00.0000000+00:00" start="2025-01-01T10:00:00.0000000+00:00" finish="2025-01-01T10:00:12.5000000+00:00" />
+  <Results>
+    <UnitTestResult executionId="e1" testId="t1" testName="VaxCareApiTests.Tests.InventoryApiTests.GetInventory_ShouldReturnInventoryProducts" duration="00:00:01.5000000" outcome="Passed" />
+    <UnitTestResult executionId="e2" testName="VaxCareApiTests.Tests.PatientsClinicTests.GetClinic_ShouldReturnClinicData" duration="00:00:02.2500000" outcome="Failed">
+      <Output>
+        <StdOut>Request: GET /api/patients/clinic</StdOut>
+        <ErrorInfo>
+          <Message>System.Net.Http.HttpRequestException : Name or service not known (vhapistg.vaxcare.com:443)</Message>
+        </ErrorInfo>
+      </Output>
+    </UnitTestResult>
+    <UnitTestResult executionId="e3" testId="t3" testName="VaxCareApiTests.Tests.SetupCheckDataTests.GetCheckData_ShouldReturnCheckData" duration="00:00:00" outcome="Skipped" />
+  </Results>
+  <TestDefinitions>
+    <UnitTest id="t1" name="GetInventory_ShouldReturnInventoryProducts" />
+    <UnitTest id="t2" name="GetClinic_ShouldReturnClinicData" />
+    <UnitTest id="t3" name="GetCheckData_ShouldReturnCheckData" />
+  </TestDefinitions>
+  <TestEntries>
+    <TestEntry testId="t1" executionId="e1" />
+    <TestEntry testId="t2" executionId="e2" />
+    <TestEntry testId="t3" executionId="e3" />
+  </TestEntries>
+</TestRun>
+"""
+
+XUNIT = """<?xml version="1.0" encoding="utf-8"?>
+<assemblies>
+  <assembly name="VaxCareApiTests.dll" total="3" time="4.5">
+    <collection name="Test collection">
+      <test name="VaxCareApiTests.Tests.InventoryApiTests.GetInventory_ShouldReturnInventoryProducts" type="VaxCareApiTests.Tests.InventoryApiTests" method="GetInventory_ShouldReturnInventoryProducts" time="0.25" result="Pass" />
+      <test name="VaxCareApiTests.Tests.PatientsClinicTests.GetClinic_ShouldReturnClinicData" type="VaxCareApiTests.Tests.PatientsClinicTests" method="GetClinic_ShouldReturnClinicData" time="1.5" result="Fail">
+        <failure exception-type="System.Net.Http.HttpRequestException">
+          <message><![CDATA[System.Net.Http.HttpRequestException : Name or service not known (vhapistg.vaxcare.com:443)]]></message>
+        </failure>
+      </test>
+      <test name="VaxCareApiTests.Tests.SetupCheckDataTests.GetCheckData_ShouldReturnCheckData" type="VaxCareApiTests.Tests.SetupCheckDataTests" method="GetCheckData_ShouldReturnCheckData" time="0" result="Skip"><reason>skipped</reason></test>
+    </collection>
+  </assembly>
+</assemblies>
+"""
+
+def write_temp(directory, name, content):
+    path = os.path.join(directory, name)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    return path
+
+def check_records(summary):
+    passed, failed, skipped = summary.records
+    assert [record.outcome for record in summary.records] == [OUTCOME_PASSED, OUTCOME_FAILED, OUTCOME_SKIPPED]
+
+    assert passed.class_name == 'InventoryApiTests' and passed.name == 'GetInventory ShouldReturnInventoryProducts'
+    assert (passed.expected_result, passed.endpoint) == ('200 OK with inventory products data', 'GET /api/inventory')
+    assert not passed.failure_reason and not passed.failure_rule
+
+    assert failed.endpoint == 'GET /api/patients/clinic', failed.endpoint
+    assert failed.failure_rule == 'dns-unknown-host' and failed.actual_result == 'Network connectivity issue'
+    assert skipped.class_name == 'SetupCheckDataTests'
+
+def test_trx_stream_and_tree():
+    """Streaming and tree parsing give the same records, joined by testId or executionId"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = write_temp(directory, 'run.trx', TRX)
+        streamed = parse_results(path)
+        tree = parse_results(path, stream=False)
+
+        assert streamed.source_format == FORMAT_TRX
+        assert [record.to_list() for record in streamed.records] == [record.to_list() for record in tree.records]
+        check_records(streamed)
+        assert [record.duration for record in streamed.records] == [1.5, 2.25, 0.0]
+        assert streamed.total_runtime_seconds == 12.5
+
+def test_xunit():
+    """xUnit results map onto the same outcomes and fields; the assembly time is the runtime"""
+    with tempfile.TemporaryDirectory() as directory:
+        summary = parse_results(write_temp(directory, 'run.xml', XUNIT))
+        assert summary.source_format == FORMAT_XUNIT
+        check_records(summary)
+        assert summary.records[0].duration == 0.25 and summary.total_runtime_seconds == 4.5
+
+def test_runtime_without_times():
+    """With neither a run window nor a declared time the runtime is 0, not the sum of the test durations"""
+    with tempfile.TemporaryDirectory() as directory:
+        summary = parse_results(write_temp(directory, 'run.xml', XUNIT.replace(' time="4.5"', '')))
+        assert summary.total_duration_seconds == 1.75
+        assert summary.total_runtime_seconds == 0
+
+def test_counts_and_skipped():
+    """Skipped tests count in the total, not in the executed tests, report rows or success rate"""
+    with tempfile.TemporaryDirectory() as directory:
+        summary = parse_results(write_temp(directory, 'run.xml', XUNIT))
+        assert (summary.total_tests, summary.passed_tests, summary.failed_tests, summary.skipped_tests) == (3, 1, 1, 1)
+        assert summary.executed_tests == 2 and len(summary.reported_tests) == 2
+        assert summary.success_rate == 50.0
+        assert summary.pass_rate == 33.3
+        assert summary.failure_rule_counts == {'dns-unknown-host': 1}
+        assert RunSummary([], FORMAT_XUNIT).success_rate == 0
+
+def test_robust_report_total():
+    """The robust report's Total excludes skipped tests, like its table"""
+    with tempfile.TemporaryDirectory() as directory:
+        summary = parse_results(write_temp(directory, 'run.xml', XUNIT))
+        report = os.path.join(directory, 'report.html')
+        assert load_script(XML_REPORT_SCRIPT).generate_html_report(summary, report)
+        with open(report, 'r', encoding='utf-8') as f:
+            html = f.read()
+        assert '<div class="stat-number">2</div>' in html and '<div class="stat-number">3</div>' not in html
+        assert 'GetCheckData' not in html
+
+def test_test_info_overlay():
+    """TestInfo.json values win over inferred ones; missing keys keep the inferred value"""
+    with tempfile.TemporaryDirectory() as directory:
+        test_info = {
+            'VaxCareApiTests.Tests.InventoryApiTests.GetInventory_ShouldReturnInventoryProducts': {
+                'description': 'Lists inventory', 'testType': 'Smoke', 'endpoint': 'GET /api/v2/inventory'},
+            'VaxCareApiTests.Tests.Unknown.Test': {'description': 'not in the run'},
+        }
+        summary = parse_results(write_temp(directory, 'run.trx', TRX), test_info=test_info)
+        record = summary.records[0]
+        assert (record.description, record.test_type, record.endpoint) == ('Lists inventory', 'Smoke', 'GET /api/v2/inventory')
+        assert record.expected_result == '200 OK with inventory products data'
+        assert summary.records[1].description == ''
+        assert apply_test_info(summary, {}) is summary
+
+if __name__ == "__main__":
+    run_tests("Testing Results Model", [
+        test_trx_stream_and_tree,
+        test_xunit,
+        test_runtime_without_times,
+        test_counts_and_skipped,
+        test_robust_report_total,
+        test_test_info_overlay,
+    ])
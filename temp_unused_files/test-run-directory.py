@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Test script for run directories
+Checks that a run is invisible until published, that publishing records its artifacts and
+moves the latest pointer (symlink or pointer file), that runs with the same id don't clash
+and that a writer finishing after publishing can't touch the published run
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'TestRunner'))
+from script_test_runner import run_tests
+import run_directory
+from run_directory import RunDirectory, latest_run_dir, LATEST_POINTER
+from report_manifest import ReportManifest, ARTIFACT_TRX, ARTIFACT_HTML
+
+def write_file(path, text='x'):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    return path
+
+def test_hidden_until_published():
+    """Nothing of a run being written is listed; publishing moves it into place as a whole"""
+    with tempfile.TemporaryDirectory() as directory:
+        run = RunDirectory(directory, '2025-01-01_10-00-00', 'QA', partial=True).create()
+        trx = write_file(os.path.join(run.staging_path, 'TestResults_2025-01-01_10-00-00_rerun.trx'))
+        report = write_file(os.path.join(run.staging_path, 'EnhancedTestReport_x.html'))
+        run.add_counts(report, {'total': 2, 'passed': 1, 'failed': 1, 'skipped': 0})
+
+        assert latest_run_dir(directory) is None
+        assert ReportManifest(directory).entries() == []  # a scan skips the staging folder
+
+        path = run.publish(log=lambda line: None)
+        assert path == os.path.join(directory, 'runs', '2025-01-01_10-00-00') and not os.path.exists(run.staging_path)
+        assert os.path.samefile(latest_run_dir(directory), path)
+        assert run.published_path(trx) == os.path.join(path, os.path.basename(trx))
+        entries = {entry['type']: entry for entry in ReportManifest(directory).by_run('2025-01-01_10-00-00')}
+        assert entries[ARTIFACT_TRX]['partial'] and entries[ARTIFACT_TRX]['environment'] == 'QA'
+        assert entries[ARTIFACT_HTML]['counts']['failed'] == 1 and 'partial' not in entries[ARTIFACT_HTML]
+        assert run.publish(log=lambda line: None) == path  # only the first call acts
+
+def test_same_run_id():
+    """A second run with the same id is published next to the first, not over it"""
+    with tempfile.TemporaryDirectory() as directory:
+        first = RunDirectory(directory, '2025-01-01_10-00-00').create()
+        second = RunDirectory(directory, '2025-01-01_10-00-00')
+        write_file(os.path.join(first.staging_path, 'dotnet-test.log'))
+        first.publish(log=lambda line: None)
+        second.create()
+        log = write_file(os.path.join(second.staging_path, 'dotnet-test.log'))
+        predicted = second.published_path(log)
+        path = second.publish(log=lambda line: None)
+        assert path.endswith('2025-01-01_10-00-00-2'), path
+        assert predicted == os.path.join(path, 'dotnet-test.log') and os.path.isfile(predicted)
+        assert os.path.samefile(latest_run_dir(directory), path)
+        assert ReportManifest(directory).runs() == ['2025-01-01_10-00-00', '2025-01-01_10-00-00-2']
+
+def test_adopt_after_publish():
+    """Scratch files are moved in until the run is published; later ones are discarded"""
+    with tempfile.TemporaryDirectory() as directory:
+        run = RunDirectory(directory, '2025-01-03_10-00-00', 'QA').create()
+        scratch = run.scratch('html:QA')
+        report = run.adopt(write_file(os.path.join(scratch, 'EnhancedTestReport_x.html')), scratch, 'QA',
+                           {'total': 1, 'passed': 1, 'failed': 0, 'skipped': 0})
+        assert report == os.path.join(run.staging_path, 'QA', 'EnhancedTestReport_x.html')
+
+        late = run.scratch('pdf')
+        path = run.publish(log=lambda line: None)
+        assert not os.path.exists(late) and not os.path.exists(scratch)
+        assert run.adopt(write_file(os.path.join(late, 'EnhancedTestReport_x.pdf')), late) is None
+        assert not os.path.exists(late)
+        assert os.listdir(os.path.join(path, 'QA')) == ['EnhancedTestReport_x.html']
+        assert [entry['type'] for entry in ReportManifest(directory).by_run('2025-01-03_10-00-00')] == [ARTIFACT_HTML]
+
+def test_pointer_file_without_symlinks():
+    """Where symlinks can't be created (Windows) the latest run id goes into a pointer file"""
+    def no_symlinks(*args, **kwargs):
+        raise OSError("symbolic links are not available")
+    original = run_directory.os.symlink
+    run_directory.os.symlink = no_symlinks
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            run = RunDirectory(directory, '2025-01-02_10-00-00').create()
+            write_file(os.path.join(run.staging_path, 'dotnet-test.log'))
+            run.publish(log=lambda line: None)
+            with open(os.path.join(directory, 'runs', LATEST_POINTER), 'r', encoding='utf-8') as f:
+                assert f.read().strip() == '2025-01-02_10-00-00'
+            assert latest_run_dir(directory) == run.path
+    finally:
+        run_directory.os.symlink = original
+
+if __name__ == "__main__":
+    run_tests("Testing Run Directories", [
+        test_hidden_until_published,
+        test_same_run_id,
+        test_adopt_after_publish,
+        test_pointer_file_without_symlinks,
+    ])
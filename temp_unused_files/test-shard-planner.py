@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Test script for the shard planner
+Checks test discovery from C# sources, LPT balance and disjoint coverage, the duration
+history, minimal filters and that filters stay within the command line limit
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'TestRunner'))
+from script_test_runner import run_tests
+from shard_planner import (tests_in_source, plan_by_duration, plan_by_category, minimal_test_filter,
+                           estimate_durations, load_duration_history, discover_tests, MAX_FILTER_LENGTH,
+                           OTHER_SHARD)
+from report_manifest import ReportManifest, ARTIFACT_TRX
+
+SOURCE = """
+using Xunit;
+namespace VaxCareApiTests.Tests
+{
+    public class InventoryApiTests
+    {
+        [Fact]
+        public async Task GetInventory_ShouldReturnInventoryProducts() { }
+
+        [Theory]
+        [InlineData(1)]
+        public void GetLotNumbers_ShouldReturnLotNumbersData(int id) { }
+
+        public void Helper() { }
+    }
+
+    public class InventoryApiTestsWithReporting
+    {
+        [ReportingFact]
+        public async Task GetInventory_ShouldLogResponse() { }
+    }
+}
+"""
+
+TRX = """<?xml version="1.0" encoding="utf-8"?>
+<TestRun id="1" xmlns="http://microsoft.com/schemas/VisualStudio/TeamTest/2010">
+  <Results>
+{results}
+  </Results>
+</TestRun>
+"""
+
+def discovered_suite(classes=4, tests_per_class=5):
+    return {f'Suite.Class{c}': [f'Suite.Class{c}.Test{t}' for t in range(tests_per_class)] for c in range(classes)}
+
+def test_discovery():
+    """Test methods are found under any *Fact/*Theory attribute, grouped by their class"""
+    discovered = tests_in_source(SOURCE)
+    assert discovered == {
+        'VaxCareApiTests.Tests.InventoryApiTests': [
+            'VaxCareApiTests.Tests.InventoryApiTests.GetInventory_ShouldReturnInventoryProducts',
+            'VaxCareApiTests.Tests.InventoryApiTests.GetLotNumbers_ShouldReturnLotNumbersData'],
+        'VaxCareApiTests.Tests.InventoryApiTestsWithReporting': [
+            'VaxCareApiTests.Tests.InventoryApiTestsWithReporting.GetInventory_ShouldLogResponse'],
+    }, discovered
+
+def test_lpt_balance():
+    """Longest tests first onto the least loaded shard: every test once, loads balanced"""
+    durations = [7, 5, 4, 3, 3, 2]
+    discovered = {'Suite.A': [f'Suite.A.T{index}' for index in range(len(durations))]}
+    estimates = dict(zip(discovered['Suite.A'], durations))
+    shards = plan_by_duration(discovered, 2, estimates)
+    assert sorted(shard.estimate for shard in shards) == [12, 12], shards
+    assert sorted(test for shard in shards for test in shard.tests) == sorted(discovered['Suite.A'])
+
+    # More shards than tests: no empty shard
+    shards = plan_by_duration({'Suite.A': ['Suite.A.T0', 'Suite.A.T1']}, 4, {'Suite.A.T0': 1, 'Suite.A.T1': 1})
+    assert len(shards) == 2
+
+def test_filters_fit_the_command_line():
+    """A shard whose test list would be too long is planned by whole classes instead"""
+    discovered = discovered_suite(classes=4, tests_per_class=5)
+    estimates = {test: 1.0 for tests in discovered.values() for test in tests}
+    per_test = plan_by_duration(discovered, 2, estimates)
+    assert all(shard.tests for shard in per_test)
+    longest = max(len(shard.test_filter) for shard in per_test)
+
+    by_class = plan_by_duration(discovered, 2, estimates, max_filter_length=longest - 1)
+    assert all(shard.classes and not shard.tests for shard in by_class)
+    assert all(len(shard.test_filter) < longest for shard in by_class)
+    assert sorted(c for shard in by_class for c in shard.classes) == sorted(discovered)
+    assert [shard.estimate for shard in by_class] == [10.0, 10.0]
+
+    # The real suite's 2-shard plan stays per test and within the limit
+    real = discover_tests(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Tests'))
+    if real:
+        real_estimates, _, _ = estimate_durations(real, {})
+        assert all(len(shard.test_filter) <= MAX_FILTER_LENGTH for shard in plan_by_duration(real, 2, real_estimates))
+
+def test_minimal_filter():
+    """Complete classes become one term, theory cases one method term; a filter over the
+    limit widens to whole classes"""
+    discovered = discovered_suite(classes=2, tests_per_class=3)
+    selected = discovered['Suite.Class0'] + ['Suite.Class1.Test2(id: 1)', 'Suite.Class1.Test2(id: 2)']
+    assert minimal_test_filter(selected, discovered) == (
+        'FullyQualifiedName~Suite.Class0.|FullyQualifiedName=Suite.Class1.Test2')
+    assert minimal_test_filter(selected, discovered, max_length=40) == (
+        'FullyQualifiedName~Suite.Class0.|FullyQualifiedName~Suite.Class1.')
+    assert minimal_test_filter(['Gone.Class.Test'], discovered, max_length=1) == 'FullyQualifiedName=Gone.Class.Test'
+
+def test_category_plan():
+    """Each class goes to its most specific category; unmatched classes to 'other'"""
+    discovered = tests_in_source(SOURCE)
+    discovered['VaxCareApiTests.Tests.SetupCheckDataTests'] = ['VaxCareApiTests.Tests.SetupCheckDataTests.Get']
+    shards = {shard.name: shard for shard in plan_by_category(discovered, {
+        'inventory': 'FullyQualifiedName~InventoryApiTests',
+        'reporting': 'FullyQualifiedName~InventoryApiTestsWithReporting',
+    })}
+    assert shards['inventory'].classes == ['VaxCareApiTests.Tests.InventoryApiTests']
+    assert shards['reporting'].classes == ['VaxCareApiTests.Tests.InventoryApiTestsWithReporting']
+    assert shards[OTHER_SHARD].classes == ['VaxCareApiTests.Tests.SetupCheckDataTests']
+
+def test_duration_history():
+    """Median per method over the recorded TRX files; theory cases summed, skipped ignored,
+    unknown tests estimated at the median of the known ones"""
+    with tempfile.TemporaryDirectory() as directory:
+        manifest = ReportManifest(directory)
+        for run, (a, b) in enumerate(((1, 2), (3, 2), (5, 2))):
+            results = [
+                f'<UnitTestResult testName="Suite.A.One" duration="00:00:0{a}" outcome="Passed" />',
+                f'<UnitTestResult testName="Suite.A.Two(id: 1)" duration="00:00:0{b}" outcome="Failed" />',
+                f'<UnitTestResult testName="Suite.A.Two(id: 2)" duration="00:00:0{b}" outcome="Passed" />',
+                '<UnitTestResult testName="Suite.A.Three" duration="00:00:09" outcome="Skipped" />',
+            ]
+            path = os.path.join(directory, f'TestResults_{run}.trx')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(TRX.format(results='\n'.join(results)))
+            manifest.record(path, ARTIFACT_TRX, f'run-{run}')
+
+        history, files_read = load_duration_history(directory)
+        assert files_read == 3 and history == {'Suite.A.One': 3.0, 'Suite.A.Two': 4.0}, history
+        estimates, default, unknown = estimate_durations({'Suite.A': ['Suite.A.One', 'Suite.A.Two', 'Suite.A.Three']}, history)
+        assert (default, unknown, estimates['Suite.A.Three']) == (3.5, 1, 3.5)
+
+if __name__ == "__main__":
+    run_tests("Testing Shard Planner", [
+        test_discovery,
+        test_lpt_balance,
+        test_filters_fit_the_command_line,
+        test_minimal_filter,
+        test_category_plan,
+        test_duration_history,
+    ])
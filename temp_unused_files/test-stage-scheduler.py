@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Test script for the post-run stage scheduler
+Checks dependency order, concurrency of independent stages, failure/timeout propagation
+and graph validation
+"""
+
+import os
+import sys
+import time
+import threading
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'TestRunner'))
+from script_test_runner import run_tests
+from stage_scheduler import (Stage, StageScheduler, STATUS_OK, STATUS_FAILED,
+                             STATUS_TIMEOUT, STATUS_SKIPPED)
+
+def sleeper(seconds, value=True):
+    def run(values):
+        time.sleep(seconds)
+        return value
+    return run
+
+def test_dependencies_receive_values():
+    """A stage starts after its dependencies and gets their return values"""
+    seen = {}
+    def report(values):
+        seen.update(values)
+        return 'report.html'
+    scheduler = StageScheduler([
+        Stage('summary', lambda values: {'total': 3}),
+        Stage('html', report, ['summary']),
+        Stage('pdf', lambda values: values['html'].replace('.html', '.pdf'), ['html']),
+    ])
+    results = {result.name: result for result in scheduler.run()}
+    assert seen == {'summary': {'total': 3}}, seen
+    assert results['pdf'].value == 'report.pdf', results['pdf'].value
+    assert results['html'].started >= results['summary'].started
+
+def test_independent_stages_overlap():
+    """Two slow independent stages take about as long as one of them"""
+    scheduler = StageScheduler([Stage('teams', sleeper(0.3)), Stage('html', sleeper(0.3))])
+    started = time.monotonic()
+    scheduler.run()
+    elapsed = time.monotonic() - started
+    assert elapsed < 0.5, f"stages ran serially ({elapsed:.2f}s)"
+
+def test_failure_skips_dependents():
+    """A raising or False-returning stage skips its dependents only"""
+    def broken(values):
+        raise RuntimeError("generator crashed")
+    scheduler = StageScheduler([
+        Stage('summary', sleeper(0)),
+        Stage('html', broken, ['summary']),
+        Stage('open', sleeper(0), ['html']),
+        Stage('teams', sleeper(0, False), ['summary']),
+        Stage('archive', sleeper(0), ['summary']),
+    ])
+    results = {result.name: result for result in scheduler.run()}
+    assert results['html'].status == STATUS_FAILED and 'crashed' in results['html'].detail
+    assert results['open'].status == STATUS_SKIPPED
+    assert results['teams'].status == STATUS_FAILED
+    assert results['archive'].status == STATUS_OK
+
+def test_after_orders_only():
+    """An `after` stage waits for the stage whatever its outcome and gets its value if any"""
+    seen = []
+    scheduler = StageScheduler([
+        Stage('html', sleeper(0.1, 'report.html')),
+        Stage('pdf', sleeper(0.2, False)),
+        Stage('publish', lambda values: seen.append(sorted(values)) or True, after=['html', 'pdf']),
+    ])
+    results = {result.name: result for result in scheduler.run()}
+    assert results['publish'].status == STATUS_OK and seen == [['html']], seen
+    assert results['publish'].started >= results['pdf'].started + results['pdf'].elapsed
+
+def test_timeout_does_not_block():
+    """A hanging stage times out without holding up the others"""
+    release = threading.Event()
+    scheduler = StageScheduler([
+        Stage('pdf', lambda values: release.wait(5), timeout=0.2),
+        Stage('upload', sleeper(0), ['pdf']),
+        Stage('html', sleeper(0.1)),
+    ])
+    started = time.monotonic()
+    results = {result.name: result for result in scheduler.run()}
+    release.set()
+    assert time.monotonic() - started < 1.0
+    assert results['pdf'].status == STATUS_TIMEOUT
+    assert results['upload'].status == STATUS_SKIPPED
+    assert results['html'].status == STATUS_OK
+    assert any('pdf' in line and 'timeout' in line for line in scheduler.timing_table())
+
+def test_timed_out_stage_does_not_delay_exit():
+    """The process exits right after the scheduler returns, with the timed-out stage abandoned"""
+    script = (
+        "import sys, time\n"
+        f"sys.path.insert(0, {os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'TestRunner')!r})\n"
+        "from stage_scheduler import Stage, StageScheduler\n"
+        "results = StageScheduler([Stage('hang', lambda values: time.sleep(30), timeout=0.2)]).run()\n"
+        "print(results[0].status)\n"
+    )
+    started = time.monotonic()
+    process = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, timeout=20)
+    assert process.stdout.strip() == STATUS_TIMEOUT, process.stdout + process.stderr
+    assert time.monotonic() - started < 10, "interpreter exit waited for the abandoned stage"
+
+def test_invalid_graphs_rejected():
+    """Unknown dependencies and cycles are reported before anything runs"""
+    for stages in ([Stage('html', None, ['summary'])],
+                   [Stage('a', None, ['b']), Stage('b', None, ['a'])]):
+        try:
+            StageScheduler(stages)
+        except ValueError:
+            continue
+        raise AssertionError(f"accepted {[stage.name for stage in stages]}")
+
+if __name__ == "__main__":
+    run_tests("Testing Stage Scheduler", [
+        test_dependencies_receive_values,
+        test_independent_stages_overlap,
+        test_failure_skips_dependents,
+        test_after_orders_only,
+        test_timeout_does_not_block,
+        test_timed_out_stage_does_not_delay_exit,
+        test_invalid_graphs_rejected,
+    ])